@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmarks against a local HTTP server stand-in
+
+`download()` (the `api` mode) and `smart-dl` (the `cli` mode) are run over a
+matrix of server scenarios, file sizes, block sizes and connections. Every run
+happens in a fresh interpreter, which reports its wall time, CPU time, file
+I/O syscalls (read and write calls from `/proc/self/io`, where available) and
+peak RSS. The median of the runs of every case is reported. The `cli` mode
+includes the startup and the URL resolution of `smart-dl`.
+
+Results can be saved as a baseline, and a later run compared against it: the
+run fails if the throughput of a case drops, or its CPU time per byte grows,
+by more than the tolerance.
+
+Usage:
+
+    python benchmarks/run.py --sizes 1M,64M --block-sizes 64K,1M \\
+        --connections 1,4 --scenarios fast,flaky --save-baseline base.json
+    python benchmarks/run.py ... --baseline base.json --tolerance 0.2
+"""
+
+###############################################################################
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import statistics
+import subprocess
+import tempfile
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.server import BenchmarkServer  # noqa: E402
+from requests_downloader.utils import parse_size  # noqa: E402
+
+###############################################################################
+
+SCENARIOS = {
+    "fast": lambda size: {},
+    "latency": lambda size: {"latency": 0.05},
+    "no-ranges": lambda size: {"ranges": 0},
+    "throttled": lambda size: {"rate": 50 * 1024 * 1024},
+    "flaky": lambda size: {"disconnect": size // 2},
+}
+MODES = ["api", "cli"]
+
+###############################################################################
+
+
+def proc_io():
+    """Read and write syscalls (file I/O) of the process, if available"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(fields["syscr"]) + int(fields["syscw"])
+
+
+def child(case):
+    """Run a single download in this (fresh) interpreter"""
+    import resource
+
+    if case["mode"] == "api":
+        from requests_downloader import download
+
+        def run():
+            return bool(
+                download(
+                    case["url"],
+                    download_path=case["path"],
+                    block_size=case["block_size"],
+                    max_block_size=case["block_size"],
+                    connections=case["connections"],
+                    show_progress=False,
+                    resume=False,
+                )
+            )
+
+    else:
+        from requests_downloader.cli import main
+
+        def run():
+            sys.argv = [
+                "smart-dl",
+                case["url"],
+                "--download_path",
+                case["path"],
+                "--block",
+                str(case["block_size"]),
+                "--connections",
+                str(case["connections"]),
+                "--progress",
+            ]
+            return main() == 0
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    syscalls = proc_io()
+    started = time.perf_counter()
+    ok = run()
+    elapsed = time.perf_counter() - started
+    final_usage = resource.getrusage(resource.RUSAGE_SELF)
+    final_syscalls = proc_io()
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "ok": ok and os.path.getsize(case["path"]) == case["size"],
+        "elapsed": elapsed,
+        "cpu": (final_usage.ru_utime - usage.ru_utime)
+        + (final_usage.ru_stime - usage.ru_stime),
+        "io_syscalls": (
+            final_syscalls - syscalls if syscalls is not None else None
+        ),
+        "peak_rss": final_usage.ru_maxrss * rss_unit,
+    }
+
+
+def run_case(case, runs):
+    """Run a case in fresh interpreters, and summarize the runs"""
+    samples = []
+    for run in range(runs):
+        # a fresh URL, so that every run sees the scenario afresh
+        nonce = f"{os.path.basename(case['path'])}-{run}"
+        case = dict(case, url=f"{case['base_url']}&run={nonce}")
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", json.dumps(case)],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+        if os.path.exists(case["path"]):
+            os.remove(case["path"])
+
+    elapsed = statistics.median(s["elapsed"] for s in samples)
+    cpu = statistics.median(s["cpu"] for s in samples)
+    syscalls = [
+        s["io_syscalls"] for s in samples if s["io_syscalls"] is not None
+    ]
+    return {
+        "ok": all(s["ok"] for s in samples),
+        "mb_per_s": case["size"] / elapsed / 1e6,
+        "cpu_ns_per_byte": cpu * 1e9 / case["size"],
+        "io_syscalls": statistics.median(syscalls) if syscalls else None,
+        "peak_rss_mb": max(s["peak_rss"] for s in samples) / 1e6,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of the results with respect to the baseline"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        if result["mb_per_s"] < base["mb_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {result['mb_per_s']:.1f} MB/s "
+                f"(baseline: {base['mb_per_s']:.1f} MB/s)"
+            )
+        if result["cpu_ns_per_byte"] > base["cpu_ns_per_byte"] * (
+            1 + tolerance
+        ):
+            regressions.append(
+                f"{key}: {result['cpu_ns_per_byte']:.2f} ns/B CPU "
+                f"(baseline: {base['cpu_ns_per_byte']:.2f} ns/B)"
+            )
+    return regressions
+
+
+###############################################################################
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="run.py")
+    parser.add_argument(
+        "--sizes", help="File sizes (e.g. 1M,64M)", default="1M,32M"
+    )
+    parser.add_argument(
+        "--block-sizes", help="Block sizes (e.g. 64K,1M)", default="64K,1M"
+    )
+    parser.add_argument(
+        "--connections", help="Connections (e.g. 1,4)", default="1,4"
+    )
+    parser.add_argument(
+        "--scenarios",
+        help=f"Server scenarios ({', '.join(SCENARIOS)})",
+        default="fast",
+    )
+    parser.add_argument(
+        "--modes", help=f"Modes ({', '.join(MODES)})", default="api"
+    )
+    parser.add_argument("--runs", help="Runs per case", default=3)
+    parser.add_argument(
+        "--output", help="Save the results (JSON) to a file", default=None
+    )
+    parser.add_argument(
+        "--save-baseline",
+        help="Save the results as a baseline (JSON)",
+        default=None,
+    )
+    parser.add_argument(
+        "--baseline", help="Compare against a saved baseline", default=None
+    )
+    parser.add_argument(
+        "--tolerance",
+        help="Allowed relative regression against the baseline",
+        default=0.2,
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS, default=None)
+    args = vars(parser.parse_args(argv))
+
+    if args["child"] is not None:
+        print(json.dumps(child(json.loads(args["child"]))))
+        return 0
+
+    sizes = [parse_size(size) for size in args["sizes"].split(",")]
+    block_sizes = [parse_size(size) for size in args["block_sizes"].split(",")]
+    connections = [int(c) for c in args["connections"].split(",")]
+    scenarios = args["scenarios"].split(",")
+    modes = args["modes"].split(",")
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}'")
+
+    server = BenchmarkServer().start()
+    results = {}
+    print(
+        f"{'case':<40} {'MB/s':>9} {'CPU ns/B':>9} "
+        f"{'I/O calls':>9} {'RSS MB':>7}"
+    )
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, name, size, block_size, conns in itertools.product(
+                modes, scenarios, sizes, block_sizes, connections
+            ):
+                key = f"{mode}-{name}-{size}-{block_size}-c{conns}"
+                query = urlencode(SCENARIOS[name](size))
+                case = {
+                    "mode": mode,
+                    "base_url": f"{server.url}/{size}?{query}",
+                    "path": os.path.join(directory, key),
+                    "size": size,
+                    "block_size": block_size,
+                    "connections": conns,
+                }
+                result = run_case(case, int(args["runs"]))
+                results[key] = result
+                syscalls = result["io_syscalls"]
+                print(
+                    f"{key:<40} {result['mb_per_s']:>9.1f} "
+                    f"{result['cpu_ns_per_byte']:>9.2f} "
+                    f"{syscalls if syscalls is not None else '-':>9} "
+                    f"{result['peak_rss_mb']:>7.1f}"
+                    + ("" if result["ok"] else "  FAILED")
+                )
+    finally:
+        server.stop()
+
+    for path in (args["output"], args["save_baseline"]):
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+    failed = [key for key, result in results.items() if not result["ok"]]
+    if failed:
+        print(f"FAILED downloads: {', '.join(failed)}")
+    regressions = []
+    if args["baseline"] is not None:
+        with open(args["baseline"]) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, float(args["tolerance"]))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+    return 1 if failed or regressions else 0
+
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local HTTP server stand-in for the benchmarks
+
+Every path `/<size>` serves `size` bytes of deterministic content, and the
+query string configures the behaviour of the server:
+
+    latency     seconds to wait before responding (e.g. 0.05)
+    ranges      0, to ignore Range requests (default: 1)
+    rate        maximum rate per connection, in bytes per second
+    disconnect  close the connection after these many bytes, on the first
+                request for the URL (a mid-stream disconnect)
+
+Usage:
+
+    python benchmarks/server.py --port 8000
+    curl -o /dev/null 'http://127.0.0.1:8000/67108864?rate=10485760'
+"""
+
+###############################################################################
+
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+###############################################################################
+
+PATTERN_SIZE = 1024 * 1024
+PATTERN = (
+    random.Random(0)
+    .getrandbits(8 * PATTERN_SIZE)
+    .to_bytes(PATTERN_SIZE, "little")
+)
+PATTERN_VIEW = memoryview(PATTERN * 2)
+WRITE_SIZE = 64 * 1024
+
+###############################################################################
+
+
+def content(start, end):
+    """Yield the deterministic content from `start` to `end` (inclusive)"""
+    offset = start
+    while offset <= end:
+        size = min(WRITE_SIZE, end - offset + 1)
+        position = offset % PATTERN_SIZE
+        yield PATTERN_VIEW[position:][:size]
+        offset += size
+
+
+class BenchmarkHandler(BaseHTTPRequestHandler):
+    """Serve `/<size>` with the behaviour given in the query string"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, body):
+        parsed = urlparse(self.path)
+        if not parsed.path.strip("/").isdigit():
+            self.send_error(404)
+            return
+        size = int(parsed.path.strip("/"))
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        latency = float(query.get("latency", 0))
+        ranges = query.get("ranges", "1") != "0"
+        rate = float(query.get("rate", 0))
+        disconnect = None
+        if body and "disconnect" in query:
+            with self.server.lock:
+                if self.path not in self.server.disconnected:
+                    self.server.disconnected.add(self.path)
+                    disconnect = int(query["disconnect"])
+
+        if latency:
+            time.sleep(latency)
+
+        status, start, end = 200, 0, size - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if ranges and match:
+            status = 206
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+        if start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", f'"{size}"')
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+
+        sent = 0
+        started = time.perf_counter()
+        for data in content(start, end):
+            if disconnect is not None and sent + len(data) > disconnect:
+                cut = disconnect - sent
+                self.wfile.write(data[:cut])
+                self.close_connection = True
+                return
+            self.wfile.write(data)
+            sent += len(data)
+            if rate:
+                ahead = sent / rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+
+class BenchmarkServer(ThreadingHTTPServer):
+    """Threaded server, running in the background once started"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), BenchmarkHandler)
+        self.lock = threading.Lock()
+        self.disconnected = set()
+        self.url = f"http://{host}:{self.server_address[1]}"
+        self.thread = None
+
+    def handle_error(self, request, client_address):
+        # clients close connections midway (e.g. after their byte range)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+###############################################################################
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="server.py")
+    parser.add_argument(
+        "--host", help="Host to listen on", default="127.0.0.1"
+    )
+    parser.add_argument("--port", help="Port to listen on", default=8000)
+    args = vars(parser.parse_args(argv))
+
+    server = BenchmarkServer(args["host"], int(args["port"]))
+    print(f"Serving on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cold-start benchmark for `smart-dl`
+
+The CLI module is imported in fresh interpreters with `python -X importtime`,
+and the median cumulative import time (and the wall time of `smart-dl
+--version`) is reported. The run fails if the median exceeds `--max-ms`, or
+if any of the modules which should only be loaded on demand was imported.
+With `--module`, another module (e.g. the `requests_downloader.downloader`
+loaded by `smart-dl URL`) is measured instead, and only the modules of
+opt-in features are checked.
+
+Usage:
+
+    python benchmarks/startup.py --runs 20 --max-ms 50
+    python benchmarks/startup.py --module requests_downloader.downloader
+"""
+
+###############################################################################
+
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+###############################################################################
+
+MODULE = "requests_downloader.cli"
+LAZY_MODULES = [
+    "requests",
+    "tqdm",
+    "lxml",
+    "sqlite3",
+    "tarfile",
+    "urllib3",
+    "httpx",
+]
+# modules of opt-in features, not to be loaded by a plain download
+OPTIONAL_MODULES = [
+    "sqlite3",
+    "tarfile",
+    "httpx",
+    "requests_downloader.cache",
+    "requests_downloader.store",
+    "requests_downloader.extract",
+    "requests_downloader.jobs",
+]
+VERSION_COMMAND = (
+    "import sys; sys.argv = ['smart-dl', '--version']; "
+    "from requests_downloader.cli import main; main()"
+)
+
+###############################################################################
+
+
+def import_times(module=MODULE):
+    """Cumulative import times (in microseconds) of the modules, by name"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        check=True,
+        universal_newlines=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.partition(":")[2].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def version_time():
+    """Wall time (in seconds) of `smart-dl --version`"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", VERSION_COMMAND],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="startup.py")
+    parser.add_argument("--runs", help="Number of runs", default=10)
+    parser.add_argument(
+        "--module",
+        help=f"Module to import (default: {MODULE})",
+        default=MODULE,
+    )
+    parser.add_argument(
+        "--max-ms",
+        help="Maximum median import time of the CLI, in milliseconds",
+        default=None,
+    )
+    args = vars(parser.parse_args(argv))
+    module = args["module"]
+    lazy_modules = LAZY_MODULES if module == MODULE else OPTIONAL_MODULES
+
+    imports, walls, loaded = [], [], set()
+    for _ in range(int(args["runs"])):
+        times = import_times(module)
+        imports.append(times[module] / 1000)
+        loaded.update(name for name in lazy_modules if name in times)
+        walls.append(version_time() * 1000)
+
+    median = statistics.median(imports)
+    print(f"import {module}: {median:.1f} ms (median of {len(imports)})")
+    print(f"smart-dl --version: {statistics.median(walls):.1f} ms (wall)")
+
+    failed = False
+    if loaded:
+        print(f"FAILED: imported on startup: {', '.join(sorted(loaded))}")
+        failed = True
+    if args["max_ms"] is not None and median > float(args["max_ms"]):
+        print(f"FAILED: import time exceeds {args['max_ms']} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,6 +14,62 @@ __version__ = "0.4.1"
 
 ###############################################################################
 
-from .downloader import download  # noqa
-from .handlers import handle_url  # noqa
-from .utils import md5sum  # noqa
+import sys
+import importlib
+
+###############################################################################
+
+# public attributes are imported on first use (PEP 562), so that importing
+# the package (or starting `smart-dl`) does not load `requests` and `tqdm`
+LAZY_ATTRIBUTES = {
+    "download": "downloader",
+    "handle_url": "handlers",
+    "DownloadResult": "metrics",
+    "md5sum": "utils",
+}
+SUBMODULES = (
+    "async_downloader",
+    "cache",
+    "cli",
+    "downloader",
+    "extract",
+    "handlers",
+    "jobs",
+    "journal",
+    "metrics",
+    "mirrors",
+    "ratelimit",
+    "retry",
+    "store",
+    "streaming",
+    "transport",
+    "utils",
+    "verify",
+    "writers",
+)
+
+__all__ = list(LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{LAZY_ATTRIBUTES[name]}", __name__)
+        value = getattr(module, name)
+    elif name in SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_ATTRIBUTES) | set(SUBMODULES))
+
+
+if sys.version_info < (3, 7):
+    # module-level __getattr__ is not supported
+    from .downloader import download  # noqa
+    from .handlers import handle_url  # noqa
+    from .metrics import DownloadResult  # noqa
+    from .utils import md5sum  # noqa
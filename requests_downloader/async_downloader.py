@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asynchronous download functions
+
+Requires `aiohttp` (pip install requests_downloader[async])
+"""
+
+###############################################################################
+
+import os
+import asyncio
+import logging
+
+import aiohttp
+
+from .downloader import (
+    HEADERS,
+    get_content_length,
+    infer_filename,
+    is_html_content,
+    verify_download,
+)
+from .handlers import handle_url
+from .ratelimit import get_host, get_rate_limiter, host_semaphores
+from .streaming import WRITE_BUFFER_SIZE
+from .utils import file_hash, parse_checksum
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+
+def create_async_session(concurrency=100, per_host_limit=8, timeout=60):
+    """
+    Create an `aiohttp.ClientSession` with default headers
+
+    Must be called from within a running event loop.
+
+    Parameters
+    ----------
+    concurrency : int, optional
+        Maximum number of simultaneous connections.
+        The default is 100.
+    per_host_limit : int, optional
+        Maximum number of simultaneous connections to a single host.
+        The default is 8.
+    timeout : float, optional
+        Connect and read timeout, in seconds.
+        The default is 60.
+
+    Returns
+    -------
+    session : object
+        An `aiohttp.ClientSession` object.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=concurrency, limit_per_host=per_host_limit or 0
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=HEADERS,
+        timeout=aiohttp.ClientTimeout(
+            total=None, sock_connect=timeout, sock_read=timeout
+        ),
+    )
+
+
+async def async_download(
+    url,
+    download_dir="",
+    download_file=None,
+    download_path=None,
+    headers={},
+    session=None,
+    block_size=65536,
+    timeout=60,
+    resume=True,
+    checksum=None,
+    smart=True,
+    url_handler=None,
+    rate_limit=None,
+):
+    """
+    Download a file asynchronously
+
+    Network I/O happens on the event loop, while blocking operations
+    (file writes, URL handlers, checksum) are run in the default executor.
+
+    Parameters
+    ----------
+    url : str
+        URL to download.
+    download_dir : str, optional
+        Path of the directory to download the file in.
+        The default is '' (i.e. current directory).
+    download_file : str, optional
+        Name for the downloaded file.
+        If None, the function will infer it from URL and Content-Disposition
+        The default is None.
+    download_path : str, optional
+        Full path where the downloaded file should be saved.
+        If provided, `download_dir` and `download_file` arguments are ignored.
+        The default is None.
+    headers : dict, optional
+        Headers to be sent, in addition to the session headers.
+        The default is {}.
+    session : object, optional
+        A valid `aiohttp.ClientSession` object.
+        If None, a session is created for this download.
+        The default is None.
+    block_size : int, optional
+        Block size, in bytes, to stream the downloadable content.
+        The default is 65536.
+    timeout : float, optional
+        Timeout, in seconds, used if a session is created.
+        The default is 60.
+    resume : bool, optional
+        Try to resume download.
+        The default is True.
+    checksum : str, optional
+        Checksum of the file to be downloaded, as md5 hexdigest or
+        `algorithm:hexdigest`. The hash is computed while writing.
+        The default is None.
+    smart : bool, optional
+        Use url_handler for special case URLs
+        The default is True.
+    url_handler : function, optional
+        Handler function for special cases of download URLs
+        The function should return a list of (TAG, URL) pairs and default index
+    rate_limit : int or str or object, optional
+        Maximum download rate, in bytes per second, or a `RateLimiter`
+        object, which may be shared with other (threaded or async) downloads.
+        The default is None.
+
+    Returns
+    -------
+    download_path: str or bool
+        If download was successful, full `download_path`
+        otherwise, False
+    """
+    if session is None:
+        async with create_async_session(timeout=timeout) as session:
+            return await async_download(
+                url,
+                download_dir=download_dir,
+                download_file=download_file,
+                download_path=download_path,
+                headers=headers,
+                session=session,
+                block_size=block_size,
+                timeout=timeout,
+                resume=resume,
+                checksum=checksum,
+                smart=smart,
+                url_handler=url_handler,
+                rate_limit=rate_limit,
+            )
+
+    loop = asyncio.get_running_loop()
+    headers = dict(headers)
+    if checksum is not None:
+        algorithm = parse_checksum(checksum)[0]
+    if smart:
+        if url_handler is None:
+            url_handler = handle_url
+        urls, url_idx = await loop.run_in_executor(None, url_handler, url)
+        url = urls[url_idx][1]
+
+    LOGGER.debug(f"URL: {url}")
+
+    host = get_host(url)
+    rate_limit = get_rate_limiter(rate_limit)
+
+    async def throttle_request():
+        if rate_limit is not None:
+            delay = rate_limit.reserve_request(host)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    r = None
+    try:
+        await throttle_request()
+        r = await session.get(url, headers=headers)
+        LOGGER.debug(r.headers)
+        if r.status >= 400:
+            LOGGER.error(f"HTTP Error: {r.status} {r.reason}")
+            LOGGER.error(f"Download from {url} aborted.")
+            return False
+
+        content_length = get_content_length(r.headers)
+        if is_html_content(r.headers):
+            LOGGER.error("HTML content detected.")
+            LOGGER.error(f"Download from {url} aborted.")
+            return False
+
+        if not download_file:
+            download_file = infer_filename(r.headers, r.url)
+
+        if not download_file:
+            LOGGER.error("Download location could not be inferred.")
+            LOGGER.error(f"Download from {url} aborted.")
+            return False
+
+        if not download_path:
+            download_path = os.path.join(download_dir, download_file)
+        else:
+            download_file = os.path.basename(download_path)
+
+        LOGGER.info(
+            f"Downloading '{download_file}' ... " f"({content_length} bytes)"
+        )
+
+        position = 0
+        if os.path.isfile(download_path):
+            position = os.stat(download_path).st_size
+        LOGGER.debug(f"Current Position: {position}")
+        if position and position == content_length:
+            LOGGER.info(f"File '{download_file}' is already downloaded!")
+            return download_path
+
+        resume_supported = (
+            r.status == 206 or r.headers.get("accept-ranges") == "bytes"
+        )
+        LOGGER.debug(f"Resume Supported: {resume_supported}")
+        if position and resume and resume_supported:
+            r.release()
+            headers["Range"] = f"bytes={position}-"
+            LOGGER.info(f"Resuming '{download_file}' from {position} bytes")
+            await throttle_request()
+            r = await session.get(url, headers=headers)
+            if r.status == 416 and get_content_length(r.headers) == position:
+                LOGGER.info(f"File '{download_file}' is already downloaded!")
+                return download_path
+            if r.status not in (200, 206):
+                # e.g. the file is longer than the remote one, or an error:
+                # download it again, without touching it until it succeeds
+                LOGGER.info(f"Resume failed ({r.status} {r.reason}).")
+                r.release()
+                position = 0
+                headers["Range"] = "bytes=0-"
+                await throttle_request()
+                r = await session.get(url, headers=headers)
+                if r.status >= 400:
+                    LOGGER.error(f"HTTP Error: {r.status} {r.reason}")
+                    LOGGER.error(f"Download from {url} aborted.")
+                    return False
+                if is_html_content(r.headers):
+                    LOGGER.error("HTML content detected.")
+                    LOGGER.error(f"Download from {url} aborted.")
+                    return False
+                content_length = get_content_length(r.headers)
+            elif r.status != 206:
+                position = 0
+        else:
+            position = 0
+
+        wrote = 0
+        hasher = None
+        if checksum is not None:
+            hasher = await loop.run_in_executor(
+                None, file_hash, download_path, algorithm, 1048576, position
+            )
+        f = await loop.run_in_executor(
+            None, open, download_path, "ab" if position else "wb"
+        )
+
+        def write(data):
+            if hasher is not None:
+                hasher.update(data)
+            return f.write(data)
+
+        # chunks are written in batches, to save executor round-trips
+        buffer = bytearray()
+        try:
+            async for data in r.content.iter_chunked(block_size):
+                buffer += data
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    wrote += await loop.run_in_executor(
+                        None, write, bytes(buffer)
+                    )
+                    buffer.clear()
+                if rate_limit is not None:
+                    delay = rate_limit.reserve(host, len(data))
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+        finally:
+            if buffer:
+                wrote += await loop.run_in_executor(None, write, bytes(buffer))
+            await loop.run_in_executor(None, f.close)
+    except aiohttp.ClientError as e:
+        LOGGER.error(f"Error in download from '{url}': {e}")
+        return False
+    finally:
+        if r is not None:
+            r.release()
+
+    LOGGER.debug(f"Wrote: {wrote}")
+
+    success = await loop.run_in_executor(
+        None,
+        verify_download,
+        download_path,
+        content_length,
+        position + wrote,
+        checksum,
+        hasher.hexdigest() if hasher is not None else None,
+    )
+
+    if success:
+        LOGGER.info(f"Successfully downloaded '{download_file}' from '{url}'.")
+        return download_path
+    else:
+        LOGGER.info(
+            f"An error occurred in downloading '{download_file}' from '{url}'."
+        )
+        return False
+
+
+async def async_download_many(
+    urls,
+    concurrency=100,
+    per_host_limit=8,
+    session=None,
+    timeout=60,
+    **download_kwargs,
+):
+    """
+    Download several files concurrently on the event loop
+
+    Parameters
+    ----------
+    urls : list
+        URLs to download.
+    concurrency : int, optional
+        Maximum number of simultaneous downloads.
+        The default is 100.
+    per_host_limit : int, optional
+        Maximum number of simultaneous downloads from a single host.
+        If None, only `concurrency` limits the downloads.
+        The default is 8.
+    session : object, optional
+        A valid `aiohttp.ClientSession` object to be shared by the downloads.
+        If None, a session is created with matching connection limits.
+        The default is None.
+    timeout : float, optional
+        Timeout, in seconds, used if a session is created.
+        The default is 60.
+    **download_kwargs
+        Other keyword arguments are passed on to `async_download()`.
+
+    Returns
+    -------
+    results : list
+        Return values of `async_download()`, in the same order as `urls`.
+    """
+    if session is None:
+        async with create_async_session(
+            concurrency=concurrency,
+            per_host_limit=per_host_limit,
+            timeout=timeout,
+        ) as session:
+            return await async_download_many(
+                urls,
+                concurrency=concurrency,
+                per_host_limit=per_host_limit,
+                session=session,
+                **download_kwargs,
+            )
+
+    urls = list(urls)
+    # a single limiter, so that the downloads share the bandwidth
+    download_kwargs["rate_limit"] = get_rate_limiter(
+        download_kwargs.get("rate_limit")
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    host_semaphore = host_semaphores(
+        per_host_limit or concurrency, asyncio.Semaphore
+    )
+
+    async def worker(url):
+        async with semaphore, host_semaphore(url):
+            try:
+                return await async_download(
+                    url, session=session, **download_kwargs
+                )
+            except Exception as e:
+                LOGGER.error(f"Download from '{url}' failed: {e}")
+                return False
+
+    results = await asyncio.gather(*[worker(url) for url in urls])
+    LOGGER.info(
+        f"Downloaded {sum(1 for r in results if r)} out of {len(urls)} files."
+    )
+    return results
+
+
+###############################################################################
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metadata cache for conditional re-downloads
+
+For every successfully downloaded URL, the cache records the validators
+(ETag, Last-Modified) sent by the server along with the size, digest and
+location of the file. A later download of the same URL sends a conditional
+request, and the transfer is skipped if the server replies with
+`304 Not Modified`.
+"""
+
+###############################################################################
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+FIELDS = ["etag", "last_modified", "size", "digest", "path"]
+
+###############################################################################
+
+
+class MetadataCache:
+    """
+    SQLite-backed cache of download metadata, keyed by URL
+
+    The cache can be shared by threads and processes.
+
+    Parameters
+    ----------
+    path : str
+        Path of the cache database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "size INTEGER, digest TEXT, path TEXT, updated REAL)"
+            )
+
+    def get(self, url):
+        """
+        Get the metadata recorded for a URL
+
+        Parameters
+        ----------
+        url : str
+            URL of the download.
+
+        Returns
+        -------
+        entry : dict or None
+            Recorded metadata with the keys `FIELDS`, if any.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT {', '.join(FIELDS)} FROM metadata WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(FIELDS, row))
+
+    def set(
+        self, url, path, size, etag=None, last_modified=None, digest=None
+    ):
+        """
+        Record the metadata of a completed download
+
+        Parameters
+        ----------
+        url : str
+            URL of the download.
+        path : str
+            Path of the downloaded file.
+        size : int
+            Size of the downloaded file.
+        etag : str, optional
+            ETag sent by the server.
+        last_modified : str, optional
+            Last-Modified sent by the server.
+        digest : str, optional
+            Checksum of the file, as `algorithm:hexdigest`.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    etag,
+                    last_modified,
+                    size,
+                    digest,
+                    os.path.abspath(path),
+                    time.time(),
+                ),
+            )
+
+    def remove(self, url):
+        """Remove the metadata recorded for a URL"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM metadata WHERE url = ?", (url,)
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def conditional_headers(entry):
+    """Headers for a conditional request based on a cache entry"""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+###############################################################################
@@ -11,8 +11,6 @@ import logging
 import argparse
 
 from . import __version__
-from .downloader import download
-from .handlers import handle_url
 
 ###############################################################################
 
@@ -26,8 +24,33 @@ ROOT_LOGGER.setLevel(logging.WARNING)
 
 def main():
     """CLI for requests_downloader"""
+    # modules are imported as needed, to keep the startup fast
+    if sys.argv[1:2] == ["verify"]:
+        from . import verify
+
+        return verify.main(sys.argv[2:])
+    if sys.argv[1:2] == ["queue"]:
+        from . import jobs
+
+        return jobs.main(sys.argv[2:])
+
     parser = argparse.ArgumentParser()
-    parser.add_argument("url", help="Download URL")
+    parser.add_argument("url", help="Download URL", nargs="?")
+    parser.add_argument(
+        "--input-file",
+        help="Download URLs listed in a file (one per line)",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of simultaneous downloads (with --input-file)",
+        default=8,
+    )
+    parser.add_argument(
+        "--per-host-limit",
+        help="Simultaneous downloads per host (with --input-file)",
+        default=4,
+    )
     parser.add_argument(
         "--download_dir", help="Specify downloads directory", default=""
     )
@@ -41,10 +64,31 @@ def main():
     )
     parser.add_argument(
         "--block",
-        help="Block size while writing the file, in bytes",
-        default=1024,
+        help="Initial block size while writing the file, in bytes",
+        default=65536,
     )
     parser.add_argument("--timeout", help="Timeout in seconds", default=60)
+    parser.add_argument(
+        "--connections",
+        help="Number of parallel connections, if supported",
+        default=1,
+    )
+    parser.add_argument(
+        "--transport",
+        help="HTTP transport (requests, or http2 to multiplex over HTTP/2)",
+        default=None,
+    )
+    parser.add_argument(
+        "--mirror",
+        help="Another URL of the same file (repeat for more mirrors)",
+        action="append",
+        default=None,
+    )
+    parser.add_argument(
+        "--probe",
+        help="Send a HEAD request before downloading",
+        action="store_true",
+    )
     parser.add_argument(
         "--resume",
         help="Try to resume the download, if supported",
@@ -55,7 +99,67 @@ def main():
     )
     parser.add_argument(
         "--checksum",
-        help="Checksum to verify integrity of the download",
+        help=(
+            "Checksum to verify integrity of the download "
+            "(md5 or ALGORITHM:HEXDIGEST)"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--extract",
+        help=(
+            "Decompress or extract downloaded archives "
+            "(while downloading, except .zip)"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--keep-archive",
+        help="Keep the archives after extracting them",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Metadata cache to skip downloads of unmodified files",
+        default=None,
+    )
+    parser.add_argument(
+        "--store",
+        help="Content-addressed store to link duplicate downloads from",
+        default=None,
+    )
+    parser.add_argument(
+        "--store-size",
+        help="Maximum size of the store (e.g. 50G), evicting LRU files",
+        default=None,
+    )
+    parser.add_argument(
+        "--store-link",
+        help=(
+            "Methods to link files from the store with, in order "
+            "(default: reflink,copy; hardlinks must not be edited in place)"
+        ),
+        default="reflink,copy",
+    )
+    parser.add_argument(
+        "--retries",
+        help="Number of retries for failed requests and interrupted transfers",
+        default=5,
+    )
+    parser.add_argument(
+        "--limit-rate",
+        help=(
+            "Maximum download rate in bytes per second, shared by all "
+            "downloads (e.g. 500K, 20M)"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--metrics",
+        help=(
+            "Write transfer metrics to a file "
+            "(Prometheus text format for *.prom, JSON lines otherwise)"
+        ),
         default=None,
     )
     parser.add_argument(
@@ -69,11 +173,68 @@ def main():
     )
     args = vars(parser.parse_args())
 
+    from .downloader import download, download_many
+    from .handlers import handle_url
+    from .metrics import JSONLinesExporter, PrometheusExporter
+
     if args["verbose"]:
         ROOT_LOGGER.setLevel(logging.INFO)
     if args["debug"]:
         ROOT_LOGGER.setLevel(logging.DEBUG)
 
+    download_kwargs = {
+        "download_dir": args["download_dir"],
+        "block_size": int(args["block"]),
+        "timeout": float(args["timeout"]),
+        "resume": args["resume"],
+        "show_progress": args["progress"],
+        "connections": int(args["connections"]),
+        "probe": args["probe"],
+        "cache": args["cache"],
+        "rate_limit": args["limit_rate"],
+        "retry": int(args["retries"]),
+        "extract": args["extract"],
+        "keep_archive": args["keep_archive"],
+        "transport": args["transport"],
+    }
+    if args["store"] is not None:
+        from .store import ContentStore
+
+        download_kwargs["store"] = ContentStore(
+            args["store"],
+            max_size=args["store_size"],
+            link=args["store_link"].split(","),
+        )
+    if args["metrics"] is not None:
+        if args["metrics"].endswith(".prom"):
+            exporter = PrometheusExporter(args["metrics"])
+        else:
+            exporter = JSONLinesExporter(args["metrics"])
+        download_kwargs["hooks"] = exporter
+
+    if args["input_file"] is not None:
+        with open(args["input_file"]) as f:
+            input_urls = [
+                line.strip()
+                for line in f
+                if line.strip() and not line.startswith("#")
+            ]
+        results = download_many(
+            input_urls,
+            workers=int(args["workers"]),
+            per_host_limit=int(args["per_host_limit"]),
+            **download_kwargs,
+        )
+        for input_url, result in zip(input_urls, results):
+            if result:
+                print(f"File saved to '{result}'.")
+            else:
+                print(f"Download from '{input_url}' failed ({result.error}).")
+        return 0 if all(results) else 1
+
+    if args["url"] is None:
+        parser.error("either url or --input-file is required")
+
     urls, url_idx = handle_url(args["url"])
     if len(urls) > 1:
         options = [
@@ -100,20 +261,21 @@ def main():
         response = url_idx
 
     url = urls[response][1]
-    location = download(
-        url,
-        download_dir=args["download_dir"],
+    result = download(
+        args["url"],
         download_file=args["download_file"],
         download_path=args["download_path"],
-        block_size=int(args["block"]),
-        timeout=float(args["timeout"]),
-        resume=args["resume"],
-        show_progress=args["progress"],
-        smart=False,
+        # the chosen URL, still confirmed by the handlers if required
+        url_handler=lambda _: ([urls[response]], 0),
         checksum=args["checksum"],
+        mirrors=args["mirror"],
+        **download_kwargs,
     )
-    print(f"File saved to '{location}'.")
+    if not result:
+        print(f"Download from '{url}' failed ({result.error}).")
+        return 1
 
+    print(f"File saved to '{result}'.")
     return 0
 
 
@@ -9,13 +9,22 @@ Main module containing download function
 import os
 import logging
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote
 
 import requests
 from tqdm import tqdm
 
-from .handlers import handle_url
-from .utils import md5sum
+from .handlers import confirm_url, handle_url, normalize_url, resolve_many
+from .journal import Journal, part_path
+from .metrics import DownloadResult, instrument
+from .mirrors import MirrorScheduler
+from .ratelimit import get_host, get_rate_limiter, host_semaphores
+from .retry import get_retry_policy
+from .streaming import MAX_BLOCK_SIZE, ThrottledProgress, iter_blocks
+from .transport import get_transport
+from .utils import file_hash, parse_checksum
+from .writers import DEFAULT_WRITER, SeekWriter, free_space, preallocate_file
 
 ###############################################################################
 
@@ -34,9 +43,851 @@ HEADERS = {
     "Keep-Alive": "timeout=10, max=100",
 }
 
+DEFAULT_POOLSIZE = requests.adapters.DEFAULT_POOLSIZE
+MAX_CONFIRMATIONS = 3
+
 ###############################################################################
 
 
+def create_session(
+    pool_connections=DEFAULT_POOLSIZE,
+    pool_maxsize=DEFAULT_POOLSIZE,
+    transport=None,
+):
+    """
+    Create a `requests.Session` with default headers and pooled connections
+
+    Parameters
+    ----------
+    pool_connections : int, optional
+        Number of hosts for which connection pools are cached.
+        The default is `requests.adapters.DEFAULT_POOLSIZE`.
+    pool_maxsize : int, optional
+        Maximum number of connections kept open per host.
+        The default is `requests.adapters.DEFAULT_POOLSIZE`.
+    transport : str or function, optional
+        Name of a transport (from `requests_downloader.transport`), e.g.
+        'http2', or a session factory, to create the session with instead.
+        If None, a `requests.Session` is created.
+        The default is None.
+
+    Returns
+    -------
+    session : object
+        A `requests.Session` object (or a session of the transport).
+    """
+    session = get_transport(transport)(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize
+    )
+    session.headers.update(HEADERS)
+    return session
+
+
+def get_response(
+    session,
+    url,
+    headers={},
+    timeout=60,
+    retry=None,
+    rate_limit=None,
+    metrics=None,
+):
+    """
+    Send a streaming GET request, retrying the failed attempts
+
+    Parameters
+    ----------
+    session : object
+        A valid `requests.Session` object.
+    url : str
+        URL to request.
+    headers : dict, optional
+        Headers to be sent.
+        The default is {}.
+    timeout : float, optional
+        Timeout, in seconds
+        The default is 60.
+    retry : object, optional
+        A `RetryPolicy` for connection errors and retryable status codes.
+        If None, the request is not retried.
+        The default is None.
+    rate_limit : object, optional
+        A `RateLimiter` object, to throttle the requests.
+        The default is None.
+    metrics : object, optional
+        A `TransferMetrics` object, to record the response and retries in.
+        The default is None.
+
+    Returns
+    -------
+    r : object
+        A `requests.Response` object, from the last attempt.
+    """
+    retry = get_retry_policy(retry)
+    host = get_host(url)
+    attempt = 1
+    while True:
+        if rate_limit is not None:
+            rate_limit.throttle_request(host)
+        try:
+            r = session.get(url, headers=headers, timeout=timeout, stream=True)
+        except requests.exceptions.RequestException as e:
+            if not retry.retryable(attempt, error=e):
+                raise
+            LOGGER.warning(f"Error in request to '{url}': {e}")
+            retry.sleep(attempt)
+        else:
+            if metrics is not None:
+                metrics.response(r)
+            if not retry.retryable(attempt, response=r):
+                return r
+            r.close()
+            LOGGER.warning(f"HTTP Error: {r.status_code} {r.reason}")
+            retry.sleep(attempt, response=r)
+        if metrics is not None:
+            metrics.retries += 1
+        attempt += 1
+
+
+def split_ranges(content_length, parts):
+    """
+    Split a content of given length into (almost) equal byte ranges
+
+    Parameters
+    ----------
+    content_length : int
+        Total length of the content, in bytes.
+    parts : int
+        Number of ranges.
+
+    Returns
+    -------
+    ranges : list
+        List of inclusive (start, end) byte offsets.
+    """
+    parts = max(1, min(parts, content_length))
+    part_size = -(-content_length // parts)
+    return [
+        (start, min(start + part_size, content_length) - 1)
+        for start in range(0, content_length, part_size)
+    ]
+
+
+def download_segment(
+    url,
+    download_path,
+    start,
+    end,
+    session,
+    headers={},
+    block_size=65536,
+    timeout=60,
+    progress=None,
+    response=None,
+    max_block_size=MAX_BLOCK_SIZE,
+    journal=None,
+    rate_limit=None,
+    retry=None,
+    metrics=None,
+    writer=None,
+):
+    """
+    Download a byte range of a file and write it at its offset
+
+    The file at `download_path` must already exist.
+
+    Parameters
+    ----------
+    url : str
+        URL to download.
+    download_path : str
+        Path of the (preallocated) file to write to.
+    start : int
+        First byte of the range.
+    end : int
+        Last byte of the range (inclusive).
+    session : object
+        A valid `requests.Session` object.
+    headers : dict, optional
+        Headers to be sent.
+        The default is {}.
+    block_size : int, optional
+        Initial block size, in bytes, to stream the downloadable content.
+        The default is 65536.
+    timeout : float, optional
+        Timeout, in seconds
+        The default is 60.
+    progress : function, optional
+        Function to be called with the number of bytes after every write.
+        The default is None.
+    response : object, optional
+        An open streaming response whose body starts at `start`.
+        If provided, it is read (and closed) instead of making a new request.
+        The default is None.
+    max_block_size : int, optional
+        Maximum block size, in bytes, for the adaptive block sizing.
+        The default is `MAX_BLOCK_SIZE`.
+    journal : object, optional
+        A `Journal` object, to checkpoint the progress of the range.
+        The default is None.
+    rate_limit : object, optional
+        A `RateLimiter` object, to throttle the request and the transfer.
+        The default is None.
+    retry : object, optional
+        A `RetryPolicy`. An interrupted transfer is resumed from the last
+        byte written.
+        If None, failures are not retried.
+        The default is None.
+    metrics : object, optional
+        A `TransferMetrics` object, to record the responses and retries in.
+        The default is None.
+    writer : object, optional
+        A `Writer` for the file, which may be shared by several ranges.
+        If None, a `SeekWriter` is opened for `download_path`.
+        The default is None.
+
+    Returns
+    -------
+    wrote : int
+        Number of bytes written.
+    """
+    expected = end - start + 1
+    wrote = 0
+    host = get_host(url)
+    retry = get_retry_policy(retry)
+    headers = dict(headers)
+    attempt = 0
+    while wrote < expected:
+        if response is None:
+            headers["Range"] = f"bytes={start + wrote}-{end}"
+            response = get_response(
+                session, url, headers, timeout, retry, rate_limit, metrics
+            )
+
+        with response as r:
+            response = None
+            # a complete response is acceptable for the first range
+            if r.status_code != 206 and (
+                start + wrote or r.status_code != 200
+            ):
+                LOGGER.warning(
+                    f"Range {start + wrote}-{end} not served "
+                    f"(status: {r.status_code})."
+                )
+                break
+
+            error = None
+            f = writer or SeekWriter(download_path)
+            synced = wrote
+            try:
+                for data in iter_blocks(
+                    r, block_size, max_block_size, limit=expected - wrote
+                ):
+                    wrote += f.write_at(start + wrote, data)
+                    if progress is not None:
+                        progress(len(data))
+                    if rate_limit is not None:
+                        rate_limit.throttle(host, len(data))
+                    if journal is not None and journal.due():
+                        journal.checkpoint(f, start + synced, start + wrote)
+                        synced = wrote
+            except requests.exceptions.RequestException as e:
+                error = e
+            finally:
+                if journal is not None:
+                    journal.checkpoint(f, start + synced, start + wrote)
+                if writer is None:
+                    f.close()
+
+        if wrote < expected:
+            attempt += 1
+            if not retry.retryable(attempt, error=error):
+                if error is not None:
+                    raise error
+                break
+            LOGGER.warning(
+                f"Range {start}-{end} interrupted after {wrote} bytes "
+                f"({error})."
+            )
+            retry.sleep(attempt)
+            if metrics is not None:
+                metrics.retries += 1
+                metrics.resumes += 1
+
+    LOGGER.debug(f"Range {start}-{end}: Wrote {wrote} bytes")
+    return wrote
+
+
+def download_segments(
+    url,
+    download_path,
+    content_length,
+    session,
+    headers={},
+    connections=4,
+    block_size=65536,
+    timeout=60,
+    progress=None,
+    response=None,
+    max_block_size=MAX_BLOCK_SIZE,
+    ranges=None,
+    journal=None,
+    rate_limit=None,
+    retry=None,
+    metrics=None,
+    on_data=None,
+    writer=None,
+):
+    """
+    Download a file over multiple simultaneous connections
+
+    The file is preallocated and the ranges to be downloaded are split into
+    (about) `connections` byte ranges, which are fetched in separate threads.
+
+    Parameters
+    ----------
+    url : str
+        URL to download.
+    download_path : str
+        Path where the file should be saved.
+    content_length : int
+        Total size of the file, in bytes.
+    session : object
+        A valid `requests.Session` object.
+    headers : dict, optional
+        Headers to be sent.
+        The default is {}.
+    connections : int, optional
+        Number of parallel connections.
+        The default is 4.
+    block_size : int, optional
+        Initial block size, in bytes, to stream the downloadable content.
+        The default is 65536.
+    timeout : float, optional
+        Timeout, in seconds
+        The default is 60.
+    progress : object, optional
+        A `tqdm` instance to be updated as the data is written.
+        The default is None.
+    response : object, optional
+        An open streaming response for the content starting at the first
+        byte of the first range. If provided, it is used for that range.
+        The default is None.
+    max_block_size : int, optional
+        Maximum block size, in bytes, for the adaptive block sizing.
+        The default is `MAX_BLOCK_SIZE`.
+    ranges : list, optional
+        Inclusive (start, end) byte ranges to download.
+        If None, the complete file is downloaded.
+        The default is None.
+    journal : object, optional
+        A `Journal` object, to checkpoint the progress of every range.
+        The default is None.
+    rate_limit : object, optional
+        A `RateLimiter` object, shared by all the connections.
+        The default is None.
+    retry : object, optional
+        A `RetryPolicy` for every range.
+        The default is None.
+    metrics : object, optional
+        A `TransferMetrics` object, to record the responses and retries in.
+        The default is None.
+    on_data : function, optional
+        Function to be called with the number of bytes after every write.
+        It is called from the worker threads.
+        The default is None.
+    writer : type, optional
+        `Writer` class, a single instance of which is shared by the threads.
+        The default is `DEFAULT_WRITER` (`os.pwrite`, where available).
+
+    Returns
+    -------
+    wrote : int
+        Total number of bytes written.
+    """
+    if ranges is None:
+        ranges = [(0, content_length - 1)]
+
+    if get_filesize(download_path) != content_length:
+        preallocate_file(download_path, content_length, sparse=True)
+
+    throttled_progress = None
+    if progress is not None:
+        throttled_progress = ThrottledProgress(progress)
+
+    def update(nbytes):
+        if throttled_progress is not None:
+            throttled_progress.update(nbytes)
+        if on_data is not None:
+            on_data(nbytes)
+
+    remaining = sum(end - start + 1 for start, end in ranges)
+    ranges = [
+        (start + part_start, start + part_end)
+        for start, end in ranges
+        for part_start, part_end in split_ranges(
+            end - start + 1,
+            max(1, round(connections * (end - start + 1) / remaining)),
+        )
+    ]
+    LOGGER.debug(f"Ranges: {ranges}")
+    first_start = ranges[0][0] if ranges else None
+    if writer is None:
+        writer = DEFAULT_WRITER
+    with writer(download_path) as shared_writer, ThreadPoolExecutor(
+        max_workers=max(1, min(connections, len(ranges)))
+    ) as executor:
+        futures = [
+            executor.submit(
+                download_segment,
+                url,
+                download_path,
+                start,
+                end,
+                session=session,
+                headers=headers,
+                block_size=block_size,
+                timeout=timeout,
+                progress=update,
+                response=response if start == first_start else None,
+                max_block_size=max_block_size,
+                journal=journal,
+                rate_limit=rate_limit,
+                retry=retry,
+                metrics=metrics,
+                writer=shared_writer,
+            )
+            for start, end in ranges
+        ]
+        wrote = 0
+        for future in futures:
+            try:
+                wrote += future.result()
+            except requests.exceptions.RequestException as e:
+                LOGGER.warning(f"Error in segmented download: {e}")
+
+    if response is not None and first_start is None:
+        response.close()
+    if throttled_progress is not None:
+        throttled_progress.flush()
+    return wrote
+
+
+def probe_mirror(
+    url,
+    session,
+    headers={},
+    timeout=60,
+    retry=None,
+    rate_limit=None,
+    metrics=None,
+):
+    """
+    Check if a mirror serves byte ranges, and get its validators
+
+    Only the first byte of the content is requested.
+
+    Returns
+    -------
+    validators : tuple or None
+        (content_length, etag) of the content on the mirror, or None if the
+        mirror could not be reached or does not serve byte ranges.
+    """
+    headers = dict(headers)
+    headers["Range"] = "bytes=0-0"
+    try:
+        r = get_response(
+            session, url, headers, timeout, retry, rate_limit, metrics
+        )
+    except requests.exceptions.RequestException as e:
+        LOGGER.warning(f"Mirror '{url}' could not be reached: {e}")
+        return None
+    with r:
+        if r.status_code != 206:
+            LOGGER.warning(
+                f"Mirror '{url}' does not serve byte ranges "
+                f"(status: {r.status_code})."
+            )
+            return None
+        return get_content_length(r.headers), r.headers.get("etag")
+
+
+def download_mirrored(
+    urls,
+    download_path,
+    content_length,
+    session,
+    headers={},
+    connections=4,
+    block_size=65536,
+    timeout=60,
+    progress=None,
+    response=None,
+    max_block_size=MAX_BLOCK_SIZE,
+    ranges=None,
+    journal=None,
+    rate_limit=None,
+    retry=None,
+    metrics=None,
+    on_data=None,
+    writer=None,
+    etag=None,
+    chunk_size=None,
+):
+    """
+    Download a file from several mirrors simultaneously
+
+    The other mirrors are validated against the first one: the size of the
+    content must match, and so must the ETags, if both are strong. The
+    content is split into chunks, which are downloaded from the mirrors in
+    proportion to their measured speed. Slow or failing mirrors are dropped
+    on the way (see `MirrorScheduler`).
+
+    Parameters
+    ----------
+    urls : list
+        URLs of the file on the mirrors. The first one must already be known
+        to serve byte ranges of `content_length` bytes.
+    download_path : str
+        Path where the file should be saved.
+    content_length : int
+        Total size of the file, in bytes.
+    session : object
+        A valid `requests.Session` object.
+    connections : int, optional
+        Total number of parallel connections. At least one connection is
+        made to every mirror.
+        The default is 4.
+    response : object, optional
+        An open streaming response from the first mirror for the content
+        starting at the first byte of the first range.
+        The default is None.
+    etag : str, optional
+        ETag of the content on the first mirror.
+        The default is None.
+    chunk_size : int, optional
+        Size of the chunks, in bytes.
+        If None, it is derived from the size of the file and `connections`.
+        The default is None.
+
+    Other parameters are the same as those of `download_segments()`.
+
+    Returns
+    -------
+    wrote : int
+        Total number of bytes written.
+    """
+    if ranges is None:
+        ranges = [(0, content_length - 1)]
+
+    def validated(url):
+        validators = probe_mirror(
+            url, session, headers, timeout, retry, rate_limit, metrics
+        )
+        if validators is None:
+            return False
+        mirror_length, mirror_etag = validators
+        if mirror_length != content_length:
+            LOGGER.warning(
+                f"Ignoring mirror '{url}': {mirror_length} bytes instead of "
+                f"{content_length} bytes."
+            )
+            return False
+        strong = [
+            tag
+            for tag in (etag, mirror_etag)
+            if tag and not tag.startswith("W/")
+        ]
+        if len(strong) == 2 and strong[0] != strong[1]:
+            LOGGER.warning(f"Ignoring mirror '{url}': ETag does not match.")
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=max(1, len(urls) - 1)) as executor:
+        checks = list(executor.map(validated, urls[1:]))
+    urls = urls[:1] + [url for url, ok in zip(urls[1:], checks) if ok]
+    LOGGER.debug(f"Mirrors: {urls}")
+
+    if get_filesize(download_path) != content_length:
+        preallocate_file(download_path, content_length, sparse=True)
+
+    throttled_progress = None
+    if progress is not None:
+        throttled_progress = ThrottledProgress(progress)
+
+    def update(nbytes):
+        if throttled_progress is not None:
+            throttled_progress.update(nbytes)
+        if on_data is not None:
+            on_data(nbytes)
+
+    connections = max(connections, len(urls))
+    scheduler = MirrorScheduler(
+        urls, ranges, chunk_size=chunk_size, connections=connections
+    )
+    first_chunk = scheduler.chunks[0] if scheduler.chunks else None
+    responses = [response] if response is not None else []
+
+    def fetch(url, start, end):
+        first = url == urls[0] and (start, end) == first_chunk and responses
+        return download_segment(
+            url,
+            download_path,
+            start,
+            end,
+            session=session,
+            headers=headers,
+            block_size=block_size,
+            timeout=timeout,
+            progress=update,
+            response=responses.pop() if first else None,
+            max_block_size=max_block_size,
+            journal=journal,
+            rate_limit=rate_limit,
+            # failed chunks are moved to the other mirrors instead
+            retry=retry if len(scheduler.active) == 1 else None,
+            metrics=metrics,
+            writer=shared_writer,
+        )
+
+    if writer is None:
+        writer = DEFAULT_WRITER
+    with writer(download_path) as shared_writer, ThreadPoolExecutor(
+        max_workers=connections
+    ) as executor:
+        futures = [
+            executor.submit(scheduler.run, index, fetch)
+            for index in range(connections)
+        ]
+        wrote = sum(future.result() for future in futures)
+
+    for mirror in scheduler.mirrors:
+        LOGGER.debug(mirror)
+    for r in responses:
+        r.close()
+    if throttled_progress is not None:
+        throttled_progress.flush()
+    return wrote
+
+
+###############################################################################
+
+
+def get_content_length(headers):
+    """
+    Infer the total length of the content from the response headers
+
+    For partial responses, the complete length from Content-Range is used.
+
+    Parameters
+    ----------
+    headers : dict
+        Response headers (case-insensitive mapping).
+
+    Returns
+    -------
+    content_length : int
+        Total length of the content, in bytes. 0, if it could not be inferred.
+    """
+    content_length = int(headers.get("content-length", 0))
+    LOGGER.debug(f"Content-Length: {content_length}")
+
+    content_range = headers.get("content-range", "")
+    _content_range_part = content_range.split("/")[-1].strip()
+    LOGGER.debug(f"Content-Range: {content_range}")
+
+    if _content_range_part.isdigit():
+        content_length = int(_content_range_part)
+        LOGGER.debug(f"Content-Length (from Range): {content_length}")
+
+    return content_length
+
+
+def get_filesize(path):
+    """Size of the file at `path`, in bytes. 0, if it does not exist."""
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def is_html_content(headers):
+    """Check if the response headers indicate an HTML page"""
+    content_type = headers.get("content-type")
+    html_content = content_type == "text/html; charset=utf-8"
+    LOGGER.debug(f"Content-Type: {content_type}")
+    LOGGER.debug(f"HTML Content: {html_content}")
+    return html_content
+
+
+def infer_filename(headers, url):
+    """
+    Infer the name of the file being downloaded
+
+    The name provided in Content-Disposition is preferred.
+    Otherwise, the last component of the URL is used.
+
+    Parameters
+    ----------
+    headers : dict
+        Response headers (case-insensitive mapping).
+    url : str
+        Final URL of the response (i.e. after redirects)
+
+    Returns
+    -------
+    filename : str
+        Inferred name of the file.
+    """
+    content_type = headers.get("content-type")
+    extension_guess = (
+        mimetypes.guess_extension(content_type.split(";")[0])
+        if content_type
+        else None
+    )
+    LOGGER.debug(f"Extension Guess: {extension_guess}")
+
+    visible_name = str(url).split("/")[-1]
+    if extension_guess and not visible_name.endswith(extension_guess):
+        visible_name += extension_guess
+    visible_name = unquote(visible_name, "UTF-8")
+    LOGGER.debug(f"Visible Name: {visible_name}")
+
+    provided_name = None
+    cd = headers.get("content-disposition", None)
+    LOGGER.debug(f"Content-Disposition: {cd}")
+    if cd is not None:
+        cd_fields = {}
+        for part in cd.split(";"):
+            _kv = part.split("=")
+            if "=" in part:
+                _k = _kv[0].strip(" \t\n\"'")
+                _v = _kv[1].strip(" \t\n\"'")
+                cd_fields[_k] = _v
+
+        LOGGER.debug(cd_fields)
+        provided_names = [v for k, v in cd_fields.items() if k == "filename"]
+        provided_encoded_names = [
+            v for k, v in cd_fields.items() if k == "filename*"
+        ]
+
+        LOGGER.debug(f"Filenames: {provided_names}")
+        LOGGER.debug(f"Filenames*: {provided_encoded_names}")
+
+        if provided_names:
+            provided_name = provided_names[0]
+
+        if provided_encoded_names:
+            encoding, name = provided_encoded_names[0].split("''")
+            LOGGER.debug(f"Encoding: '{encoding}', Name: '{name}'")
+            provided_name = unquote(name, encoding=encoding)
+
+        LOGGER.debug(f"Final Provided Name: {provided_name}")
+
+    return provided_name if provided_name else visible_name
+
+
+def get_progress_description(
+    show_progress_desc, download_file, max_desc_length=35
+):
+    """
+    Description to be shown to the left of the progressbar
+
+    Parameters
+    ----------
+    show_progress_desc : str or bool
+        If False or None, no description is shown.
+        If True, the name of file being downloaded is shown.
+        Otherwise, the `str()` of the provided value is shown.
+    download_file : str
+        Name of the file being downloaded.
+    max_desc_length : int, optional
+        If length of the description is more, abbreviate it by showing the
+        first and last parts connected by three dots.
+        The default is 35.
+
+    Returns
+    -------
+    desc : str or None
+        Description.
+    """
+    if not show_progress_desc:
+        return None
+
+    if show_progress_desc is True:
+        desc = download_file
+    else:
+        desc = str(show_progress_desc)
+    if len(desc) > max_desc_length:
+        prefix_length = (max_desc_length - 3) // 2
+        suffix_length = prefix_length
+        desc = f"{desc[:prefix_length]}...{desc[-suffix_length:]}"
+    return desc
+
+
+def verify_download(
+    download_path, content_length, filesize, checksum=None, digest=None
+):
+    """
+    Verify the integrity of a downloaded file
+
+    Parameters
+    ----------
+    download_path : str
+        Path of the downloaded file.
+    content_length : int
+        Expected length of the file. 0, if unknown.
+    filesize : int
+        Number of bytes in the file after the download.
+    checksum : str, optional
+        Expected checksum of the file, as md5 hexdigest or
+        `algorithm:hexdigest`.
+        The default is None.
+    digest : str, optional
+        Hexdigest computed while downloading, with the same algorithm.
+        If None, the file is read to compute it.
+        The default is None.
+
+    Returns
+    -------
+    success : bool
+        True, if the file passed all the checks.
+    """
+    success = True
+    download_file = os.path.basename(download_path)
+    if content_length == 0:
+        filesize = os.stat(download_path).st_size
+        LOGGER.debug(f"Filesize: {filesize}")
+        if not filesize:
+            os.unlink(download_path)
+            LOGGER.warning(
+                f"Downloaded file '{download_file}' was empty and was removed."
+            )
+            return False
+        else:
+            LOGGER.warning(
+                f"Integrity of '{download_file}' could not verified."
+            )
+    elif filesize != content_length:
+        success = False
+        LOGGER.warning(f"Inconsistency in download of '{download_file}'.")
+        LOGGER.debug(f"Wrote {filesize} bytes out of {content_length}.")
+
+    if checksum is not None:
+        algorithm, expected_digest = parse_checksum(checksum)
+        if digest is None:
+            digest = file_hash(download_path, algorithm).hexdigest()
+        if digest != expected_digest:
+            success = False
+            LOGGER.warning("Invalid checksum.")
+            LOGGER.debug(
+                f"{algorithm}({download_file}) = {digest} != {expected_digest}"
+            )
+
+    return success
+
+
+@instrument
 def download(
     url,
     download_dir="",
@@ -44,7 +895,7 @@ def download(
     download_path=None,
     headers={},
     session=None,
-    block_size=1024,
+    block_size=65536,
     timeout=60,
     resume=True,
     show_progress=True,
@@ -53,6 +904,22 @@ def download(
     checksum=None,
     smart=True,
     url_handler=None,
+    connections=1,
+    probe=False,
+    max_block_size=MAX_BLOCK_SIZE,
+    cache=None,
+    rate_limit=None,
+    retry=True,
+    hooks=None,
+    metrics=None,
+    legacy=False,
+    preallocate=True,
+    writer=None,
+    mirrors=None,
+    extract=False,
+    keep_archive=False,
+    store=None,
+    transport=None,
 ):
     """
     Download a file
@@ -86,8 +953,8 @@ def download(
         In such a case, authentication can be handled independently in session.
         The default is None.
     block_size : int, optional
-        Block size, in bytes, to stream the downloadable content.
-        The default is 1024.
+        Initial block size, in bytes, to stream the downloadable content.
+        The default is 65536.
     timeout : float, optional
         Timeout, in seconds
         The default is 60.
@@ -108,8 +975,11 @@ def download(
         first and last parts connected by three dots.
         The default is 35.
     checksum : str, optional
-        Value of md5 checksum of the file to be downloaded.
+        Checksum of the file to be downloaded.
+        Either an md5 hexdigest or `algorithm:hexdigest`, where algorithm is
+        any `hashlib` algorithm, such as sha1, sha256 or blake2b.
         If provided, the downloaded file will be verified using the checksum.
+        The hash is computed while the data is being written.
         The default is None.
     smart : bool, optional
         Use url_handler for special case URLs
@@ -117,196 +987,771 @@ def download(
     url_handler : function, optional
         Handler function for special cases of download URLs
         The function should return a list of (TAG, URL) pairs and default index
+    connections : int, optional
+        Number of parallel connections to use.
+        If more than 1, the file is split into as many byte ranges, which are
+        fetched simultaneously and written at their offsets.
+        Falls back to a single stream if the server does not support ranges.
+        The default is 1.
+    probe : bool, optional
+        Send a HEAD request to infer the filename before the download.
+        By default, all the information is obtained from a single (ranged)
+        GET request, which is faster. Use this for servers which do not
+        send the same headers with a GET request.
+        The default is False.
+    max_block_size : int, optional
+        Maximum block size, in bytes.
+        The block size grows from `block_size` upto `max_block_size` based on
+        the measured throughput. Set it equal to `block_size` to use a fixed
+        block size.
+        The default is `MAX_BLOCK_SIZE` (4 MiB).
+    cache : str or object, optional
+        Path of a metadata cache, or a `MetadataCache` object.
+        If provided, the ETag and Last-Modified of every download are
+        recorded, and a file which is already present is re-validated with a
+        conditional request instead of being downloaded again.
+        The default is None.
+    rate_limit : int or str or object, optional
+        Maximum download rate, in bytes per second (e.g. 20971520 or '20M'),
+        or a `RateLimiter` object, which can be shared by several downloads
+        to cap their aggregate bandwidth and limit the rate per host.
+        The default is None.
+    retry : bool or int or object, optional
+        Retry failed requests (connection errors, 429 and 5xx responses,
+        honouring `Retry-After`) with an exponential backoff. A transfer
+        interrupted midway is resumed with a `Range` request from the last
+        byte written, if the server supports it.
+        Either a bool, the maximum number of retries or a `RetryPolicy`.
+        The default is True (5 retries).
+    hooks : dict or object or list, optional
+        Functions to be called with the `TransferMetrics` of the download
+        `on_start`, `on_chunk` (with the number of bytes), `on_complete` and
+        `on_error` (with the exception, if any). Either a dict mapping these
+        names to functions, an object with such methods (e.g. an exporter
+        from `requests_downloader.metrics`) or a list of these.
+        The default is None.
+    metrics : object, optional
+        A `TransferMetrics` object to record the transfer in, e.g. to inspect
+        it afterwards. If None, one is created for the hooks.
+        The default is None.
+    legacy : bool, optional
+        Return the path of the file or False, as in the older versions,
+        instead of a `DownloadResult`.
+        The default is False.
+    preallocate : bool or str, optional
+        Preallocate the file, if its size is known, so that it is not
+        fragmented on disk. Use 'sparse' to only set the size of the file.
+        In either case, the free disk space is checked before the transfer.
+        The default is True.
+    writer : type, optional
+        `Writer` class (from `requests_downloader.writers`) to write the
+        content with. If None, a buffered `SeekWriter` is used for a single
+        stream, and `DEFAULT_WRITER` (`os.pwrite`) for segmented downloads.
+        The default is None.
+    mirrors : list, optional
+        Other URLs of the same file. If provided, byte ranges are downloaded
+        from all the mirrors (whose size and ETag match) simultaneously, in
+        proportion to their speed, and slow mirrors are dropped on the way.
+        `connections` is raised to the number of mirrors, if needed.
+        The default is None.
+    extract : bool or str, optional
+        Decompress (.gz, .bz2, .xz) or extract (.tar, .tar.*, .zip) the
+        downloaded archive. Single-stream downloads (other than .zip) are
+        decompressed while the content arrives, without reading the archive
+        back from the disk; zip archives are extracted once downloaded.
+        The extracted content is only moved to its destination once the
+        download has been verified. An archive which is already downloaded
+        (or not modified) is extracted as well.
+        If True, the content is extracted to the path of the archive without
+        its suffix. Otherwise, the path to extract the content to.
+        The path of the extracted content is returned instead.
+        The default is False.
+    keep_archive : bool, optional
+        Keep the downloaded archive after it has been extracted.
+        The default is False.
+    store : str or object, optional
+        Path of a content-addressed store, or a `ContentStore` object.
+        If provided, every download is added to the store, and a file whose
+        checksum, or whose URL and validators, match a stored file is
+        materialized from the store (as a reflink, hardlink or copy) instead
+        of being downloaded. Not used with `extract`.
+        The default is None.
+    transport : str or function, optional
+        Transport to create the session with, if `session` is None, e.g.
+        'http2' to multiplex the requests to a host over a single HTTP/2
+        connection (requires `httpx`). See `create_session()`.
+        The default is None.
 
     Returns
     -------
-    download_path: str or None
-        If download was successful, full `download_path`
-        otherwise, None
+    result : object
+        A `DownloadResult`, which is truthy and usable as the path of the
+        file if the download was successful. With `legacy=True`, the full
+        `download_path` if the download was successful, otherwise False.
     """
-    success = True
+    headers = dict(headers)
+    if checksum is not None:
+        algorithm = parse_checksum(checksum)[0]
+
+    if session is None:
+        session = create_session(
+            pool_maxsize=max(connections, DEFAULT_POOLSIZE),
+            transport=transport,
+        )
+
     if smart:
         if url_handler is None:
-            url_handler = handle_url
-        urls, url_idx = url_handler(url)
+            urls, url_idx = handle_url(url, session=session, timeout=timeout)
+        else:
+            urls, url_idx = url_handler(url)
         url = urls[url_idx][1]
 
     LOGGER.debug(f"URL: {url}")
-
-    if session is None:
-        session = requests.Session()
-        session.headers.update(HEADERS)
+    metrics.url = url
 
     LOGGER.debug(session.headers)
-    r = session.head(url, headers=headers, timeout=timeout)
 
-    resume_supported = r.headers.get("accept-ranges") == "bytes"
-    file_mode = "ab" if resume_supported else "wb"
-    LOGGER.debug(f"Resume Supported: {resume_supported}")
+    host = get_host(url)
+    rate_limit = get_rate_limiter(rate_limit)
+    retry = get_retry_policy(retry)
+    if rate_limit is not None:
+        limit = rate_limit.max_block_size(host)
+        if limit is not None:
+            # small blocks keep the throttled transfer smooth
+            max_block_size = max(1, min(max_block_size, limit))
+            block_size = min(block_size, max_block_size)
 
-    r = session.get(url, headers=headers, timeout=timeout, stream=True)
-    LOGGER.debug(r.headers)
+    def request(position, journal=None, cached=None):
+        request_headers = dict(headers)
+        if cached is not None:
+            request_headers.update(conditional_headers(cached))
+        if resume or position:
+            request_headers["Range"] = f"bytes={position}-"
+            if position and journal is not None and journal.validator:
+                request_headers["If-Range"] = journal.validator
+        r = get_response(
+            session, url, request_headers, timeout, retry, rate_limit, metrics
+        )
+        LOGGER.debug(f"Status: {r.status_code}")
+        LOGGER.debug(r.headers)
+        return r
 
-    content_length = int(r.headers.get("content-length", 0))
-    LOGGER.debug(f"Content-Length: {content_length}")
+    def usable(r):
+        if not r.ok:
+            r.close()
+            LOGGER.error(f"HTTP Error: {r.status_code} {r.reason}")
+            LOGGER.error(f"Download from {url} aborted.")
+            metrics.fail(f"HTTP Error: {r.status_code} {r.reason}")
+            return False
+        if is_html_content(r.headers):
+            r.close()
+            LOGGER.error("HTML content detected.")
+            LOGGER.error(f"Download from {url} aborted.")
+            metrics.fail("HTML content detected")
+            return False
+        return True
 
-    content_range = r.headers.get("content-range", "")
-    _content_range_part = content_range.split("/")[-1].strip()
-    LOGGER.debug(f"Content-Range: {content_range}")
+    if download_path:
+        download_file = os.path.basename(download_path)
+    elif download_file:
+        download_path = os.path.join(download_dir, download_file)
+    elif probe:
+        if rate_limit is not None:
+            rate_limit.throttle_request(host)
+        with session.head(
+            url, headers=headers, timeout=timeout, allow_redirects=True
+        ) as r:
+            LOGGER.debug(r.headers)
+            if r.ok and not is_html_content(r.headers):
+                download_file = infer_filename(r.headers, r.url)
+        if download_file:
+            download_path = os.path.join(download_dir, download_file)
 
-    if content_length == 0 and _content_range_part:
-        content_length = int(_content_range_part)
-        LOGGER.debug(f"Content-Length (from Range): {content_length}")
+    if extract or store is None:
+        store = None
+    else:
+        # imported here, as the store (and sqlite3) is opt-in
+        from .store import DEFAULT_ALGORITHM, ContentStore
 
-    content_type = r.headers.get("content-type")
-    html_content = content_type == "text/html; charset=utf-8"
-    LOGGER.debug(f"Content-Type: {content_type}")
-    LOGGER.debug(f"HTML Content: {html_content}")
+        if isinstance(store, str):
+            store = ContentStore(store)
 
-    if html_content:
-        LOGGER.error("HTML content detected.")
-        LOGGER.error(f"Download from {url} aborted.")
-        return False
+    def skip(path):
+        # the file is already complete (or not modified)
+        metrics.path = path
+        metrics.skipped = True
+        if not extract:
+            return path
+        from .extract import ExtractionError, archive_format, extract_file
 
-    extension_guess = mimetypes.guess_extension(content_type)
-    LOGGER.debug(f"Extension Guess: {extension_guess}")
+        if archive_format(os.path.basename(path))[0] is None:
+            LOGGER.warning(f"'{path}' is not a supported archive.")
+            return path
+        try:
+            extract_path = extract_file(
+                path, None if extract is True else extract
+            )
+        except ExtractionError as e:
+            LOGGER.error(f"Extraction of '{path}' failed: {e}")
+            metrics.fail(f"Extraction failed: {e}")
+            return False
+        if not keep_archive:
+            os.remove(path)
+        LOGGER.info(f"Extracted '{path}' to '{extract_path}'.")
+        metrics.path = extract_path
+        return extract_path
 
-    visible_name = r.url.split("/")[-1]
-    if extension_guess and not visible_name.endswith(extension_guess):
-        visible_name += f".{extension_guess}"
-    visible_name = unquote(visible_name, "UTF-8")
-    LOGGER.debug(f"Visible Name: {visible_name}")
+    def materialize(digest):
+        if store is None or digest is None:
+            return False
+        if store.materialize(digest, download_path) is None:
+            return False
+        metrics.path = download_path
+        metrics.digest = digest
+        metrics.skipped = True
+        return True
 
-    provided_name = None
-    cd = r.headers.get("content-disposition", None)
-    LOGGER.debug(f"Content-Disposition: {cd}")
-    if cd is not None:
-        cd_fields = {}
-        for part in cd.split(";"):
-            _kv = part.split("=")
-            if "=" in part:
-                _k = _kv[0].strip(" \t\n\"'")
-                _v = _kv[1].strip(" \t\n\"'")
-                cd_fields[_k] = _v
+    if download_path and checksum is not None:
+        # the expected content may be in the store already
+        if materialize(":".join(parse_checksum(checksum))):
+            return download_path
 
-        LOGGER.debug(cd_fields)
-        provided_names = [v for k, v in cd_fields.items() if k == "filename"]
-        provided_encoded_names = [
-            v for k, v in cd_fields.items() if k == "filename*"
-        ]
+    cached = None
+    if cache is not None:
+        # imported here, as the cache (and sqlite3) is opt-in
+        from .cache import MetadataCache, conditional_headers
 
-        # provided_names = re.findall('filename="(.+)"', cd)
-        LOGGER.debug(f"Filenames: {provided_names}")
-        LOGGER.debug(f"Filenames*: {provided_encoded_names}")
+        if isinstance(cache, str):
+            cache = MetadataCache(cache)
+        entry = cache.get(url)
+        if entry is not None:
+            cached_path = download_path or os.path.join(
+                download_dir, os.path.basename(entry["path"])
+            )
+            if entry["size"] and get_filesize(cached_path) == entry["size"]:
+                cached = entry
+                LOGGER.debug(f"Cached: {cached}")
 
-        if provided_names:
-            provided_name = provided_names[0]
+    journal = None
+    existing = get_filesize(download_path) if download_path else 0
+    if cached is not None:
+        # validated by the conditional request instead
+        existing = position = 0
+    elif existing:
+        # request the bytes after the existing file to check if it is complete
+        position = existing if resume else 0
+    elif download_path and resume:
+        journal = Journal.load(download_path)
+        position = journal.offset if journal is not None else 0
+    else:
+        position = 0
+    LOGGER.debug(f"Current Position: {position}")
 
-        if provided_encoded_names:
-            encoding, name = provided_encoded_names[0].split("''")
-            LOGGER.debug(f"Encoding: '{encoding}', Name: '{name}'")
-            provided_name = unquote(name, encoding=encoding)
+    r = request(position, journal, cached)
+    if cached is not None:
+        etag = r.headers.get("etag")
+        if r.status_code == 304 or (
+            etag and not etag.startswith("W/") and etag == cached["etag"]
+        ):
+            r.close()
+            LOGGER.info(f"File '{cached_path}' is not modified.")
+            return skip(cached_path)
 
-        LOGGER.debug(f"Final Provided Name: {provided_name}")
+    if r.status_code == 416:
+        r.close()
+        if existing and existing == get_content_length(r.headers):
+            LOGGER.info(f"File '{download_file}' is already downloaded!")
+            return skip(download_path)
+        existing = position = 0
+        journal = None
+        r = request(position)
 
-    if not download_file:
-        download_file = provided_name if provided_name else visible_name
+    # e.g. the virus-scan warning of Google Drive for large files, or an
+    # expired confirmation, which sends us back to the warning
+    confirmations = 0
+    while (
+        smart
+        and confirmations < MAX_CONFIRMATIONS
+        and (not r.ok or is_html_content(r.headers))
+    ):
+        confirmed_url = confirm_url(url, r, session=session, timeout=timeout)
+        if confirmed_url is None:
+            break
+        r.close()
+        confirmations += 1
+        url = confirmed_url
+        LOGGER.debug(f"Confirmed URL: {url}")
+        metrics.url = url
+        host = get_host(url)
+        r = request(position, journal)
 
-    if not download_file:
-        LOGGER.error("Download location could not be inferred.")
-        LOGGER.error(f"Download from {url} aborted.")
+    if not usable(r):
         return False
 
+    content_length = get_content_length(r.headers)
+    etag = r.headers.get("etag")
+    last_modified = r.headers.get("last-modified")
+    resume_supported = (
+        r.status_code == 206 or r.headers.get("accept-ranges") == "bytes"
+    )
+    LOGGER.debug(f"Resume Supported: {resume_supported}")
+
     if not download_path:
+        download_file = infer_filename(r.headers, r.url)
+        if not download_file:
+            r.close()
+            LOGGER.error("Download location could not be inferred.")
+            LOGGER.error(f"Download from {url} aborted.")
+            metrics.fail("Download location could not be inferred")
+            return False
+
         download_path = os.path.join(download_dir, download_file)
-    else:
-        download_file = os.path.basename(download_path)
+        existing = get_filesize(download_path) if cached is None else 0
+        if resume and resume_supported and existing != content_length:
+            journal = Journal.load(download_path)
+            if journal is not None and journal.offset:
+                r.close()
+                position = journal.offset
+                r = request(position, journal)
+                if not usable(r):
+                    return False
+            elif journal is None and 0 < existing < content_length:
+                r.close()
+                position = existing
+                r = request(position)
+                if not usable(r):
+                    return False
+    if journal is None and existing and position and r.status_code == 206:
+        # adopt a partial file left without a journal (e.g. by an older
+        # version), as the response already continues from its end
+        os.replace(download_path, part_path(download_path))
+        journal = Journal(
+            download_path,
+            url=url,
+            content_length=content_length,
+            etag=etag,
+            last_modified=last_modified,
+            ranges=[[0, existing]],
+        )
+        existing = 0
+
+    if store is not None and not position:
+        if checksum is not None:
+            digest = ":".join(parse_checksum(checksum))
+        else:
+            digest = store.find_url(url, content_length, etag, last_modified)
+        if materialize(digest):
+            r.close()
+            return download_path
+
+    if (
+        existing
+        and existing == content_length
+        and (not position or r.status_code == 200)
+    ):
+        # a server ignoring the range sends the whole (same sized) file
+        r.close()
+        LOGGER.info(f"File '{download_file}' is already downloaded!")
+        return skip(download_path)
+
+    if position and r.status_code != 206:
+        LOGGER.info("Server did not honour the range request.")
+        position = 0
+        journal = None
+    if journal is not None and not journal.matches(
+        content_length, etag, last_modified
+    ):
+        r.close()
+        LOGGER.info("Remote file has changed since the partial download.")
+        position = 0
+        journal = None
+        r = request(position)
+        if not usable(r):
+            return False
+        content_length = get_content_length(r.headers)
+        etag = r.headers.get("etag")
+        last_modified = r.headers.get("last-modified")
+    if position:
+        LOGGER.info(f"Resuming '{download_file}' from {position} bytes")
+    if journal is None and resume_supported:
+        journal = Journal(download_path)
+    if journal is not None:
+        journal.url = url
+        journal.content_length = content_length
+        journal.etag = etag
+        journal.last_modified = last_modified
 
     LOGGER.info(
         f"Downloading '{download_file}' ... " f"({content_length} bytes)"
     )
 
-    with open(download_path, "ab") as f:
-        position = f.tell()
-        LOGGER.debug(f"Current Position: {position}")
-        if position and position == content_length:
-            LOGGER.info(f"File '{download_file}' is already downloaded!")
-            return download_path
-
+    temp_path = part_path(download_path)
     wrote = 0
-    with open(download_path, file_mode) as f:
-        position = f.tell()
-        if resume and resume_supported:
-            if position:
-                headers["Range"] = f"bytes={position}-"
-                LOGGER.info(
-                    f"Resuming '{download_file}' from {position} bytes"
-                )
+    hasher = None
+    segmented = (
+        (connections > 1 or bool(mirrors))
+        and resume_supported
+        and content_length > 0
+    )
+    if (connections > 1 or mirrors) and not segmented:
+        LOGGER.info("Segmented download not possible, using a single stream.")
 
-            r = session.get(url, headers=headers, timeout=timeout, stream=True)
+    desc = get_progress_description(
+        show_progress_desc, download_file, max_desc_length
+    )
 
-        if show_progress_desc:
-            if show_progress_desc is True:
-                desc = download_file
-            else:
-                desc = str(show_progress_desc)
-            if len(desc) > max_desc_length:
-                prefix_length = (max_desc_length - 3) // 2
-                suffix_length = prefix_length
-                desc = f"{desc[:prefix_length]}...{desc[-suffix_length:]}"
-        else:
-            desc = None
+    metrics.path = download_path
+    metrics.size = content_length
+
+    extractor = None
+    if extract:
+        # imported here, as archives (tarfile, zipfile, lzma) are opt-in
+        from .extract import (
+            ExtractionError,
+            archive_format,
+            extract_file,
+            get_extractor,
+        )
+
+        if archive_format(download_file)[0] is None:
+            LOGGER.warning(f"'{download_file}' is not a supported archive.")
+            extract = False
+    extract_path = None if extract is True else extract
+
+    if content_length:
+        needed = content_length - (
+            journal.completed if journal is not None else position
+        )
+        available = free_space(temp_path)
+        if needed > available:
+            r.close()
+            LOGGER.error(
+                f"Insufficient disk space for '{download_file}' "
+                f"({needed} bytes required, {available} bytes available)."
+            )
+            metrics.fail("Insufficient disk space")
+            return False
+        if preallocate:
+            preallocate_file(
+                temp_path, content_length, sparse=preallocate == "sparse"
+            )
+    if not (segmented or position or (content_length and preallocate)):
+        # start afresh, discarding any stale content
+        open(temp_path, "wb").close()
+
+    def on_data(nbytes):
+        metrics.chunk(nbytes)
+        hooks.dispatch("on_chunk", metrics, nbytes)
+
+    if segmented:
+        ranges = journal.missing()
+        metrics.resumed = content_length - sum(e - s + 1 for s, e in ranges)
         with tqdm(
-            initial=position,
+            initial=content_length - sum(e - s + 1 for s, e in ranges),
             desc=desc,
             total=content_length,
             unit="B",
             unit_scale=True,
             disable=not show_progress,
         ) as t:
-            for data in r.iter_content(block_size):
-                wrote += f.write(data)
-                t.update(len(data))
-
-    LOGGER.debug(f"Wrote: {wrote}")
-
-    if content_length == 0:
-        filesize = os.stat(download_path).st_size
-        LOGGER.debug(f"Filesize: {filesize}")
-        if not filesize:
-            os.unlink(download_path)
-            LOGGER.warning(
-                f"Downloaded file '{download_file}' was empty and was removed."
+            segments_kwargs = dict(
+                headers=headers,
+                connections=connections,
+                block_size=block_size,
+                timeout=timeout,
+                progress=t,
+                response=r,
+                max_block_size=max_block_size,
+                ranges=ranges,
+                journal=journal,
+                rate_limit=rate_limit,
+                retry=retry,
+                metrics=metrics,
+                on_data=on_data,
+                writer=writer,
             )
-            success = False
-        else:
-            LOGGER.warning(
-                f"Integrity of '{download_file}' could not verified."
-            )
-    elif (position + wrote) != content_length:
-        success = False
-        LOGGER.warning(f"Inconsistency in download from '{url}'.")
-        LOGGER.debug(
-            f"Wrote {wrote} bytes out of {content_length - position}."
+            if mirrors:
+                wrote = download_mirrored(
+                    [url] + list(mirrors),
+                    temp_path,
+                    content_length,
+                    session,
+                    etag=etag,
+                    **segments_kwargs,
+                )
+            else:
+                wrote = download_segments(
+                    url, temp_path, content_length, session, **segments_kwargs
+                )
+        filesize = content_length - sum(
+            e - s + 1 for s, e in journal.missing()
         )
+    else:
+        if journal is not None and not position:
+            journal.ranges = []
+        if checksum is None and store is not None:
+            # the digest to add the file to the store with
+            algorithm = DEFAULT_ALGORITHM
+        if checksum is not None or store is not None:
+            # seed the hash with the bytes already on disk
+            hasher = file_hash(temp_path, algorithm, size=position)
+        if extract and not position:
+            extractor = get_extractor(download_path, extract_path)
+        metrics.resumed = position
+        t = tqdm(
+            initial=position,
+            desc=desc,
+            total=content_length,
+            unit="B",
+            unit_scale=True,
+            disable=not show_progress,
+        )
+        f = (writer or SeekWriter)(temp_path)
+        with f, t, ThrottledProgress(t) as progress:
+            synced = position
+            attempt = 0
+            while True:
+                error = None
+                try:
+                    with r:
+                        for data in iter_blocks(r, block_size, max_block_size):
+                            wrote += f.write_at(position + wrote, data)
+                            if hasher is not None:
+                                hasher.update(data)
+                            if extractor is not None:
+                                extractor.write(data)
+                            progress.update(len(data))
+                            on_data(len(data))
+                            if rate_limit is not None:
+                                rate_limit.throttle(host, len(data))
+                            if journal is not None and journal.due():
+                                journal.checkpoint(f, synced, position + wrote)
+                                synced = position + wrote
+                except requests.exceptions.RequestException as e:
+                    error = e
+                    LOGGER.warning(f"Error in download from '{url}': {e}")
+                finally:
+                    if journal is not None:
+                        journal.checkpoint(f, synced, position + wrote)
+                        synced = position + wrote
+                if error is None and (
+                    not content_length or position + wrote >= content_length
+                ):
+                    break
 
-    if checksum is not None:
-        download_checksum = md5sum(download_path)
-        if download_checksum != checksum:
-            success = False
-            LOGGER.warning("Invalid checksum.")
-            LOGGER.debug(
-                f"md5sum({download_file}) = {download_checksum} != {checksum})"
-            )
+                # resume the interrupted transfer from the last byte written
+                attempt += 1
+                if not resume_supported or not retry.retryable(
+                    attempt, error=error
+                ):
+                    break
+                retry.sleep(attempt)
+                metrics.retries += 1
+                try:
+                    r = request(position + wrote, journal)
+                except requests.exceptions.RequestException as e:
+                    LOGGER.warning(f"Error in download from '{url}': {e}")
+                    break
+                if r.status_code != 206:
+                    r.close()
+                    LOGGER.warning(
+                        "Interrupted download could not be resumed."
+                    )
+                    break
+                LOGGER.info(f"Resumed '{download_file}' at {position + wrote}")
+                metrics.resumes += 1
+        filesize = position + wrote
+
+    LOGGER.debug(f"Wrote: {wrote}")
+
+    success = verify_download(
+        temp_path,
+        content_length,
+        filesize,
+        checksum,
+        digest=hasher.hexdigest() if hasher is not None else None,
+    )
 
     if success:
+        os.replace(temp_path, download_path)
+        if journal is not None:
+            journal.remove()
+        if checksum is not None:
+            metrics.digest = ":".join(parse_checksum(checksum))
+        elif store is not None and hasher is not None:
+            metrics.digest = f"{algorithm}:{hasher.hexdigest()}"
+        if cache is not None:
+            cache.set(
+                url,
+                download_path,
+                filesize,
+                etag=etag,
+                last_modified=last_modified,
+                digest=metrics.digest,
+            )
+        if store is not None:
+            try:
+                metrics.digest = store.add(
+                    download_path,
+                    metrics.digest,
+                    url=url,
+                    etag=etag,
+                    last_modified=last_modified,
+                )
+            except OSError as e:
+                LOGGER.warning(f"Could not store '{download_file}': {e}")
         LOGGER.info(f"Successfully downloaded '{download_file}' from '{url}'.")
-        return download_path
+        if not extract:
+            return download_path
+
+        try:
+            if extractor is None:
+                extract_path = extract_file(download_path, extract_path)
+            else:
+                extractor.close()
+                extract_path = extractor.destination
+        except ExtractionError as e:
+            LOGGER.error(f"Extraction of '{download_file}' failed: {e}")
+            metrics.fail(f"Extraction failed: {e}")
+            return False
+        if not keep_archive:
+            os.remove(download_path)
+        LOGGER.info(f"Extracted '{download_file}' to '{extract_path}'.")
+        metrics.path = extract_path
+        return extract_path
     else:
+        if extractor is not None:
+            extractor.abort()
+        if journal is not None and filesize == content_length:
+            # complete, but corrupt: do not resume from it
+            journal.remove()
+        metrics.fail(
+            "Checksum mismatch"
+            if filesize == content_length
+            else f"Incomplete download ({filesize} of {content_length} bytes)"
+        )
         LOGGER.info(
             f"An error occurred in downloading '{download_file}' from '{url}'."
         )
         return False
 
 
+def download_many(
+    urls,
+    workers=8,
+    per_host_limit=4,
+    session=None,
+    resolve_workers=8,
+    **download_kwargs,
+):
+    """
+    Download several files concurrently
+
+    All the downloads share a single session, so that connections to the
+    same host are pooled and reused across files.
+
+    With `smart` downloads (the default), the URLs are resolved concurrently
+    by `resolve_many()`, and every file is queued for download as soon as its
+    URL is resolved. Duplicate URLs are downloaded only once.
+
+    Parameters
+    ----------
+    urls : list
+        URLs to download.
+    workers : int, optional
+        Maximum number of simultaneous downloads.
+        The default is 8.
+    per_host_limit : int, optional
+        Maximum number of simultaneous downloads from a single host.
+        If None, only `workers` limits the concurrency.
+        The default is 4.
+    session : object, optional
+        A valid `requests.Session` object to be shared by the downloads.
+        If None, a session with pooled connections is created.
+        The default is None.
+    resolve_workers : int, optional
+        Maximum number of simultaneous URL resolutions.
+        The default is 8.
+    **download_kwargs
+        Other keyword arguments are passed on to `download()`.
+        Arguments specifying a single file (`download_file`, `download_path`)
+        should not be used.
+
+    Returns
+    -------
+    results : list
+        Return values of `download()`, in the same order as `urls`.
+    """
+    urls = list(urls)
+    if isinstance(download_kwargs.get("cache"), str):
+        from .cache import MetadataCache
+
+        download_kwargs["cache"] = MetadataCache(download_kwargs["cache"])
+    if isinstance(download_kwargs.get("store"), str):
+        from .store import ContentStore
+
+        download_kwargs["store"] = ContentStore(download_kwargs["store"])
+    # a single limiter, so that the downloads share the bandwidth
+    download_kwargs["rate_limit"] = get_rate_limiter(
+        download_kwargs.get("rate_limit")
+    )
+    connections = download_kwargs.get("connections", 1)
+    host_limit = per_host_limit or workers
+    if session is None:
+        session = create_session(
+            pool_connections=max(workers, DEFAULT_POOLSIZE),
+            pool_maxsize=max(host_limit * connections, DEFAULT_POOLSIZE),
+            transport=download_kwargs.get("transport"),
+        )
+
+    host_semaphore = host_semaphores(host_limit)
+
+    def worker(url, resolved=None):
+        kwargs = download_kwargs
+        if resolved is not None and not isinstance(resolved, Exception):
+            kwargs = dict(download_kwargs, url_handler=lambda _: resolved)
+            # the limit applies to the host the content is downloaded from
+            resolved_urls, url_idx = resolved
+            host_url = resolved_urls[url_idx][1]
+        else:
+            host_url = url
+        with host_semaphore(host_url):
+            try:
+                if isinstance(resolved, Exception):
+                    raise resolved
+                return download(url, session=session, **kwargs)
+            except Exception as e:
+                LOGGER.error(f"Download from '{url}' failed: {e}")
+                if download_kwargs.get("legacy"):
+                    return False
+                return DownloadResult(url=url, error=str(e))
+
+    resolve = download_kwargs.get("smart", True) and (
+        download_kwargs.get("url_handler") is None
+    )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        if resolve:
+            for url, resolved in resolve_many(
+                urls,
+                workers=resolve_workers,
+                per_host_limit=per_host_limit,
+                session=session,
+                timeout=download_kwargs.get("timeout", 60),
+            ):
+                futures[normalize_url(url)] = executor.submit(
+                    worker, url, resolved
+                )
+        else:
+            for url in urls:
+                if normalize_url(url) not in futures:
+                    futures[normalize_url(url)] = executor.submit(worker, url)
+        results = [futures[normalize_url(url)].result() for url in urls]
+
+    LOGGER.info(
+        f"Downloaded {sum(1 for r in results if r)} out of {len(urls)} files."
+    )
+    return results
+
+
 ###############################################################################
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming decompression and extraction of downloaded archives
+
+An extractor is fed the content of an archive block by block, as it is being
+downloaded, so that the archive does not have to be read back from the disk
+once the download is complete. Compressed files (.gz, .bz2, .xz) are
+decompressed on the fly, and tarballs (optionally compressed) are extracted
+member by member. Zip archives keep their index at the end of the file, so
+they are extracted once the download is complete.
+"""
+
+###############################################################################
+
+import os
+import bz2
+import lzma
+import zlib
+import queue
+import logging
+import tarfile
+import shutil
+import zipfile
+import threading
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+ARCHIVE_SUFFIXES = [
+    (".tar.gz", "tar"),
+    (".tar.bz2", "tar"),
+    (".tar.xz", "tar"),
+    (".tgz", "tar"),
+    (".tbz2", "tar"),
+    (".txz", "tar"),
+    (".tar", "tar"),
+    (".zip", "zip"),
+    (".gz", "gz"),
+    (".bz2", "bz2"),
+    (".xz", "xz"),
+]
+DECOMPRESSORS = {
+    "gz": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    "bz2": bz2.BZ2Decompressor,
+    "xz": lzma.LZMADecompressor,
+}
+QUEUE_SIZE = 64
+EXTRACT_BLOCK_SIZE = 1024 * 1024
+
+###############################################################################
+
+
+class ExtractionError(Exception):
+    """Error in decompressing or extracting an archive"""
+
+
+def archive_format(filename):
+    """
+    Infer the format of an archive from its filename
+
+    Returns
+    -------
+    archive_format : str or None
+        One of 'tar', 'zip', 'gz', 'bz2' or 'xz', or None if the file is
+        not a supported archive.
+    suffix : str or None
+        The matched suffix.
+    """
+    name = filename.lower()
+    for suffix, fmt in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return fmt, suffix
+    return None, None
+
+
+def default_destination(path):
+    """Destination of the extracted content: the path without its suffix"""
+    fmt, suffix = archive_format(os.path.basename(path))
+    if fmt is None:
+        return None
+    return path[: -len(suffix)]
+
+
+def safe_members(members, destination):
+    """Skip the tar members which would be written outside `destination`"""
+    root = os.path.realpath(destination)
+    for member in members:
+        target = os.path.realpath(os.path.join(root, member.name))
+        unsafe = os.path.commonpath([root, target]) != root
+        if member.issym() or member.islnk():
+            link = os.path.join(os.path.dirname(target), member.linkname)
+            if member.islnk():
+                link = os.path.join(root, member.linkname)
+            unsafe = unsafe or (
+                os.path.commonpath([root, os.path.realpath(link)]) != root
+            )
+        if unsafe or member.isdev():
+            LOGGER.warning(f"Skipping unsafe archive member '{member.name}'.")
+            continue
+        yield member
+
+
+def move_contents(source, destination):
+    """Move the contents of a directory into another, replacing entries"""
+    os.makedirs(destination, exist_ok=True)
+    for name in os.listdir(source):
+        source_path = os.path.join(source, name)
+        target = os.path.join(destination, name)
+        if os.path.isdir(source_path) and not os.path.islink(source_path):
+            if os.path.isdir(target) and not os.path.islink(target):
+                move_contents(source_path, target)
+                continue
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        elif os.path.lexists(target) and os.path.isdir(source_path):
+            os.remove(target)
+        os.replace(source_path, target)
+    os.rmdir(source)
+
+
+###############################################################################
+
+
+class Extractor:
+    """
+    Decompress or extract an archive as its content arrives
+
+    `write()` never raises: the first error stops the extraction, and is
+    raised (as an `ExtractionError`) by `close()`.
+
+    Parameters
+    ----------
+    destination : str
+        Path of the decompressed file, or of the directory to extract an
+        archive in.
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.error = None
+
+    def write(self, data):
+        """Feed the next block of the archive"""
+        raise NotImplementedError
+
+    def close(self):
+        """Complete the extraction, once the whole archive has been fed"""
+        raise NotImplementedError
+
+    def abort(self):
+        """Stop the extraction, discarding partial output where possible"""
+        raise NotImplementedError
+
+
+class StreamDecompressor(Extractor):
+    """
+    Decompress a .gz, .bz2 or .xz file on the fly
+
+    The content is written to `<destination>.part`, which is renamed once the
+    end of the (last) compressed stream is reached.
+    """
+
+    def __init__(self, destination, fmt):
+        super().__init__(destination)
+        self.new_decompressor = DECOMPRESSORS[fmt]
+        self.decompressor = self.new_decompressor()
+        self.started = False
+        self.pending = False
+        self.temp_path = f"{destination}.part"
+        self.file = open(self.temp_path, "wb")
+
+    def write(self, data):
+        if self.error is not None:
+            return
+        try:
+            while data:
+                self.file.write(self.decompressor.decompress(data))
+                self.started = True
+                self.pending = not self.decompressor.eof
+                if self.pending:
+                    break
+                # concatenated streams (e.g. multi-member gzip)
+                data = self.decompressor.unused_data
+                self.decompressor = self.new_decompressor()
+        except (OSError, EOFError, zlib.error, lzma.LZMAError) as e:
+            self.error = e
+
+    def close(self):
+        self.file.close()
+        if self.error is None and (self.pending or not self.started):
+            self.error = EOFError("Compressed stream ended prematurely")
+        if self.error is not None:
+            os.remove(self.temp_path)
+            raise ExtractionError(str(self.error)) from self.error
+        os.replace(self.temp_path, self.destination)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.temp_path)
+
+
+class ChunkReader:
+    """File-like reader of the blocks put in a bounded queue"""
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.buffer = bytearray()
+        self.closed = False
+
+    def read(self, size=-1):
+        while not self.closed and (size < 0 or len(self.buffer) < size):
+            data = self.queue.get()
+            if data is None:
+                self.closed = True
+            else:
+                self.buffer += data
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class StreamTarExtractor(Extractor):
+    """
+    Extract a (compressed) tarball on the fly
+
+    The members are extracted in a background thread, in the order in which
+    they appear in the archive, to `<destination>.part`. Its contents are
+    moved into `destination` on `close()`, i.e. once the download has been
+    verified, and discarded on `abort()`. Members which would be written
+    outside the directory are skipped.
+    """
+
+    def __init__(self, destination):
+        super().__init__(destination)
+        self.temp_path = f"{destination}.part"
+        shutil.rmtree(self.temp_path, ignore_errors=True)
+        os.makedirs(self.temp_path)
+        self.reader = ChunkReader()
+        self.thread = threading.Thread(target=self.extract, daemon=True)
+        self.thread.start()
+
+    def extract(self):
+        try:
+            with tarfile.open(fileobj=self.reader, mode="r|*") as tar:
+                members = safe_members(tar, self.temp_path)
+                if hasattr(tarfile, "data_filter"):
+                    tar.extractall(
+                        self.temp_path, members=members, filter="data"
+                    )
+                else:
+                    tar.extractall(self.temp_path, members=members)
+        except (OSError, EOFError, tarfile.TarError) as e:
+            self.error = e
+        # drain the remaining blocks, so that the writer never blocks
+        while not self.reader.closed:
+            self.reader.read(EXTRACT_BLOCK_SIZE)
+
+    def write(self, data):
+        if self.error is None:
+            self.reader.queue.put(bytes(data))
+
+    def close(self):
+        self.reader.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            shutil.rmtree(self.temp_path, ignore_errors=True)
+            raise ExtractionError(str(self.error)) from self.error
+        move_contents(self.temp_path, self.destination)
+
+    def abort(self):
+        self.error = self.error or ExtractionError("Aborted")
+        self.reader.queue.put(None)
+        self.thread.join()
+        shutil.rmtree(self.temp_path, ignore_errors=True)
+        LOGGER.warning(f"Extraction to '{self.destination}' aborted.")
+
+
+def get_extractor(path, destination=None):
+    """
+    Get a streaming extractor for the archive to be downloaded at `path`
+
+    Parameters
+    ----------
+    path : str
+        Path of the archive. Its suffix determines the format.
+    destination : str, optional
+        Path of the decompressed file, or directory to extract the archive in.
+        If None, the path of the archive without the suffix is used.
+        The default is None.
+
+    Returns
+    -------
+    extractor : object or None
+        An `Extractor`, or None if the format does not support streaming.
+    """
+    fmt, _ = archive_format(os.path.basename(path))
+    if fmt not in DECOMPRESSORS and fmt != "tar":
+        return None
+    if destination is None:
+        destination = default_destination(path)
+    if fmt == "tar":
+        return StreamTarExtractor(destination)
+    return StreamDecompressor(destination, fmt)
+
+
+def extract_file(path, destination=None):
+    """
+    Extract a (completely downloaded) archive
+
+    Parameters
+    ----------
+    path : str
+        Path of the archive.
+    destination : str, optional
+        Path of the decompressed file, or directory to extract the archive in.
+        If None, the path of the archive without the suffix is used.
+        The default is None.
+
+    Returns
+    -------
+    destination : str
+        Path of the extracted content.
+    """
+    fmt, _ = archive_format(os.path.basename(path))
+    if fmt is None:
+        raise ExtractionError(f"Unsupported archive: '{path}'")
+    if destination is None:
+        destination = default_destination(path)
+    if fmt == "zip":
+        try:
+            with zipfile.ZipFile(path) as archive:
+                archive.extractall(destination)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ExtractionError(str(e)) from e
+        return destination
+
+    extractor = get_extractor(path, destination)
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(EXTRACT_BLOCK_SIZE), b""):
+            extractor.write(data)
+    extractor.close()
+    return destination
+
+
+###############################################################################
@@ -7,10 +7,15 @@ Special URL Handlers
 
 import re
 import logging
-from urllib.parse import urlparse, urlunparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse, urlunparse
 
 import requests
-from bs4 import BeautifulSoup
+
+from .ratelimit import host_semaphores
+from .utils import TTLCache
 
 ###############################################################################
 
@@ -18,55 +23,398 @@ LOGGER = logging.getLogger(__name__)
 
 ###############################################################################
 
+RESOLUTION_CACHE = TTLCache(maxsize=1024, ttl=3600)
+
+###############################################################################
 
-def handle_url(url):
+
+def normalize_url(url):
+    """Normalize a URL (case of scheme and host, fragment) for use as a key"""
+    parse_result = urlparse(url.strip())
+    return urlunparse(
+        parse_result._replace(
+            scheme=parse_result.scheme.lower(),
+            netloc=parse_result.netloc.lower(),
+            fragment="",
+        )
+    )
+
+
+class DirectoryListingParser(HTMLParser):
     """
-    Infer the actual download URLs by handling various special cases
+    Collect the links in the directory listing of an archive.org item
+
+    Only the `<div class="download-directory-listing">` is considered, and no
+    document tree is built.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.depth = 0
+        self.href = None
+        self.text = []
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            if self.depth:
+                self.depth += 1
+            elif "download-directory-listing" in (
+                dict(attrs).get("class") or ""
+            ).split():
+                self.depth = 1
+        elif tag == "a" and self.depth:
+            self.href = dict(attrs).get("href")
+            self.text = []
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self.depth:
+            self.depth -= 1
+        elif tag == "a" and self.href is not None:
+            self.links.append([self.href, "".join(self.text)])
+            self.href = None
+
+    def handle_data(self, data):
+        if self.href is not None:
+            self.text.append(data)
+
+
+def parse_directory_listing(content):
+    """
+    Extract the links from the directory listing of an archive.org item
+
+    Uses `lxml`, if available, and a targeted `html.parser` scanner otherwise.
 
     Parameters
     ----------
-    url : str
-        Provided download URL.
+    content : str
+        HTML of the directory listing page.
 
     Returns
     -------
-    urls : list
-        List of inferred download URLs from the provided URL.
-    default_idx: int
-        Index of default URL to download.
+    links : list
+        List of [href, text] pairs.
     """
-    default_idx = 0
-    drive = "https://drive.google.com"
-    drive_pattern_1 = rf"{drive}/file/d/([^\/]*)/.*"
-    drive_match_1 = re.match(drive_pattern_1, url)
-    if drive_match_1:
-        LOGGER.debug("Google Drive pattern-1 matched.")
-        file_id = drive_match_1.group(1)
-        dl_url = f"{drive}/u/0/uc?id={file_id}&export=download"
-        return [("drive", dl_url)], default_idx
+    try:
+        # imported here, as it is only needed for archive.org
+        import lxml.html
+    except ImportError:
+        lxml = None
+
+    if lxml is not None:
+        tree = lxml.html.fromstring(content)
+        return [
+            [a.get("href"), a.text_content()]
+            for a in tree.xpath(
+                "//div[contains(concat(' ', normalize-space(@class), ' '), "
+                "' download-directory-listing ')]//a[@href]"
+            )
+        ]
+
+    parser = DirectoryListingParser()
+    parser.feed(content)
+    parser.close()
+    return parser.links
+
+
+class DriveConfirmParser(HTMLParser):
+    """
+    Find the download form (or confirm link) of a Google Drive warning page
+
+    Drive serves such a page, instead of the content, for files which are too
+    large to be scanned for viruses.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.in_form = False
+        self.action = None
+        self.fields = {}
+        self.href = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and "download" in (attrs.get("action") or ""):
+            self.in_form = self.action is None
+            if self.in_form:
+                self.action = attrs["action"]
+        elif tag == "input" and self.in_form and attrs.get("name"):
+            self.fields[attrs["name"]] = attrs.get("value") or ""
+        elif tag == "a" and self.href is None:
+            href = attrs.get("href") or ""
+            if "confirm=" in href and "export=download" in href:
+                self.href = href
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self.in_form = False
+
+
+def fetch_directory_listing(listing_url, session=None, timeout=60, cache=None):
+    """
+    Fetch (and cache) the links in the directory listing of an archive.org item
+
+    Parameters
+    ----------
+    listing_url : str
+        URL of the directory listing.
+    session : object, optional
+        A valid `requests.Session` object to be used for the request.
+        The default is None.
+    timeout : float, optional
+        Timeout, in seconds.
+        The default is 60.
+    cache : object, optional
+        A `TTLCache` to memoize the listings in.
+        If None, the module-level `RESOLUTION_CACHE` is used.
+        The default is None.
+
+    Returns
+    -------
+    links : list
+        List of [href, text] pairs.
+    """
+    if cache is None:
+        cache = RESOLUTION_CACHE
+    key = normalize_url(listing_url)
+    links = cache.get(key)
+    if links is not None:
+        LOGGER.debug(f"Directory listing of '{listing_url}' found in cache.")
+        return links
+
+    r = (session or requests).get(listing_url, timeout=timeout)
+    r.raise_for_status()
+    links = parse_directory_listing(r.text)
+    cache.set(key, links)
+    return links
+
+
+class Handler:
+    """
+    Base class for special URL handlers
+
+    Subclasses declare the `hosts` they handle and a `pattern` (compiled once,
+    at registration) to be matched against the URL, and implement `resolve()`.
+    A handler registered for a host also handles its subdomains.
+    """
+
+    name = None
+    hosts = ()
+    pattern = None
+
+    def match(self, url):
+        """Match the URL against the pattern of the handler"""
+        if self.pattern is None:
+            return True
+        return self.pattern.match(url)
+
+    def confirm(self, url, response, session=None, timeout=60, cache=None):
+        """
+        Get past an HTML (interstitial) page, or an error, served instead of
+        the content
+
+        Parameters
+        ----------
+        url : str
+            The URL which was requested.
+        response : object
+            The `requests.Response` with the HTML page (or the error).
+        session : object, optional
+            The `requests.Session` object of the download.
+        timeout : float, optional
+            Timeout, in seconds, for the requests made by the handler.
+        cache : object, optional
+            A `TTLCache` to memoize the confirmed URL in.
+
+        Returns
+        -------
+        url : str or None
+            The URL to download the content from, if the page was understood.
+        """
+        return None
+
+    def resolve(self, url, match, session=None, timeout=60, cache=None):
+        """
+        Infer the download URLs
+
+        Parameters
+        ----------
+        url : str
+            Provided (normalized) download URL.
+        match : object
+            Result of `match()` for the URL.
+        session : object, optional
+            A valid `requests.Session` object.
+        timeout : float, optional
+            Timeout, in seconds, for the requests made by the handler.
+        cache : object, optional
+            A `TTLCache` to memoize network-bound resolutions in.
+
+        Returns
+        -------
+        urls : list
+            List of (TAG, URL) pairs.
+        default_idx: int
+            Index of default URL to download.
+        """
+        raise NotImplementedError
+
+
+HANDLERS = {}
+ENTRY_POINT_GROUP = "requests_downloader.handlers"
+_entry_points_loaded = False
+_entry_points_lock = threading.Lock()
+
+
+def register_handler(handler_class):
+    """
+    Register a `Handler` subclass for its hosts
+
+    Can be used as a class decorator. Handlers registered later take
+    precedence over the earlier ones for the same host.
+    """
+    if isinstance(handler_class.pattern, str):
+        handler_class.pattern = re.compile(handler_class.pattern)
+    handler = handler_class()
+    for host in handler_class.hosts:
+        HANDLERS.setdefault(host.lower(), []).insert(0, handler)
+    return handler_class
+
+
+def load_entry_point_handlers():
+    """Register the handlers advertised by installed packages"""
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    # concurrent callers wait till the handlers are registered
+    with _entry_points_lock:
+        if _entry_points_loaded:
+            return
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # Python < 3.8
+            eps = []
+        else:
+            eps = entry_points()
+            if hasattr(eps, "select"):
+                eps = eps.select(group=ENTRY_POINT_GROUP)
+            else:
+                eps = eps.get(ENTRY_POINT_GROUP, [])
+        for ep in eps:
+            try:
+                register_handler(ep.load())
+                LOGGER.debug(
+                    f"Loaded handler '{ep.name}' from '{ep.value}'."
+                )
+            except Exception as e:
+                LOGGER.warning(f"Could not load handler '{ep.name}' ({e}).")
+        _entry_points_loaded = True
 
-    drive_pattern_2 = rf"{drive}/open\?id=([^\/&]*).*"
-    drive_match_2 = re.match(drive_pattern_2, url)
-    if drive_match_2:
-        LOGGER.debug("Google Drive pattern-2 matched.")
-        file_id = drive_match_2.group(1)
+
+def get_handlers(host):
+    """Handlers registered for a host or any of its parent domains"""
+    load_entry_point_handlers()
+    parts = host.lower().split(".")
+    handlers = []
+    for idx in range(len(parts) - 1):
+        handlers.extend(HANDLERS.get(".".join(parts[idx:]), []))
+    return handlers
+
+
+###############################################################################
+
+
+@register_handler
+class DriveHandler(Handler):
+    name = "drive"
+    # confirmed downloads are served from drive.usercontent.google.com
+    hosts = ("drive.google.com", "drive.usercontent.google.com")
+    pattern = (
+        r"https://drive\.google\.com/"
+        r"(?:file/d/([^\/]*)/.*|open\?id=([^\/&]*).*"
+        r"|(?:u/\d+/)?uc\?(?:.*&)?id=([^\/&]*).*)"
+    )
+
+    @staticmethod
+    def cache_key(file_id):
+        return f"drive-confirm:{file_id}"
+
+    def resolve(self, url, match, session=None, timeout=60, cache=None):
+        LOGGER.debug("Google Drive pattern matched.")
+        file_id = match.group(1) or match.group(2) or match.group(3)
+        if cache is None:
+            cache = RESOLUTION_CACHE
+        # large files, which were confirmed recently, are streamed directly
+        confirmed = cache.get(self.cache_key(file_id))
+        if confirmed is not None:
+            LOGGER.debug(f"Confirmed URL of '{file_id}' found in cache.")
+            return [("drive", confirmed[1])], 0
+        drive = "https://drive.google.com"
         dl_url = f"{drive}/u/0/uc?id={file_id}&export=download"
-        return [("drive", dl_url)], default_idx
+        return [("drive", dl_url)], 0
+
+    def confirm(self, url, response, session=None, timeout=60, cache=None):
+        file_id = parse_qs(urlparse(url).query).get("id", [None])[0]
+        if cache is None:
+            cache = RESOLUTION_CACHE
+        if file_id is not None:
+            confirmed = cache.get(self.cache_key(file_id))
+            if confirmed is not None and confirmed[1] == url:
+                # the confirmation (uuid or token) has expired: start afresh
+                LOGGER.info(f"Confirmed URL of '{file_id}' has expired.")
+                cache.delete(self.cache_key(file_id))
+                return confirmed[0]
+        if "html" not in response.headers.get("content-type", ""):
+            return None
 
-    docs = "https://docs.google.com"
+        parser = DriveConfirmParser()
+        parser.feed(response.text)
+        parser.close()
+
+        confirmed_url = None
+        if parser.action is not None:
+            # the current flow: a form with the confirmation (and a uuid)
+            action = urljoin(response.url, parser.action)
+            confirmed_url = f"{action}?{urlencode(parser.fields)}"
+        elif parser.href is not None:
+            confirmed_url = urljoin(response.url, parser.href)
+        else:
+            # the older flow: a token in a cookie (kept by the session)
+            for name, value in response.cookies.items():
+                if name.startswith("download_warning"):
+                    confirmed_url = f"{url}&confirm={value}"
+                    break
+        if confirmed_url is None:
+            LOGGER.warning("Google Drive warning page was not understood.")
+            return None
+
+        LOGGER.info(f"Confirmed the download of Google Drive file {file_id}.")
+        if file_id is not None:
+            cache.set(self.cache_key(file_id), (url, confirmed_url))
+        return confirmed_url
+
+
+@register_handler
+class DocsHandler(Handler):
+    name = "docs"
+    hosts = ("docs.google.com",)
+    pattern = (
+        r"https://docs\.google\.com/"
+        r"(spreadsheets|document|presentation)/d/([^\/]*)/.*"
+    )
     preference = {
         "spreadsheets": ["xlsx", "ods", "pdf"],
         "document": ["docx", "odt", "pdf"],
         "presentation": ["pptx", "odp", "pdf"],
     }
-    doc_pattern = rf"{docs}/(spreadsheets|document|presentation)/d/([^\/]*)/.*"
-    doc_match = re.match(doc_pattern, url)
-    if doc_match:
+
+    def resolve(self, url, match, session=None, timeout=60, cache=None):
         LOGGER.debug("Google Docs pattern matched.")
-        doc_type = doc_match.group(1)
-        doc_id = doc_match.group(2)
+        docs = "https://docs.google.com"
+        doc_type = match.group(1)
+        doc_id = match.group(2)
         LOGGER.debug(f"Type: {doc_type}, ID: {doc_id}")
-        dl_types = preference[doc_type]
+        dl_types = self.preference[doc_type]
         dl_urls = [
             (
                 dl_type,
@@ -85,38 +433,44 @@ def handle_url(url):
             )
             for dl_type in dl_types
         ]
-        return dl_urls, default_idx
+        return dl_urls, 0
+
+
+@register_handler
+class ArchiveHandler(Handler):
+    name = "archive"
+    hosts = ("archive.org",)
+    pattern = (
+        r"https://(?:www\.)?archive\.org/(details|download)/([^\/]*).*"
+    )
+    preference_order = ["pdf", "mp3", "all"]
 
-    archive = "https://archive.org"
-    archive_pattern = rf"{archive}/(details|download)/([^\/]*).*"
-    archive_match = re.match(archive_pattern, url)
-    if archive_match:
+    def resolve(self, url, match, session=None, timeout=60, cache=None):
         LOGGER.debug("Archive.org pattern matched.")
-        content_name = archive_match.group(2)
+        archive = "https://archive.org"
+        content_name = match.group(2)
         archive_url = f"{archive}/download/{content_name}"
         dl_url = f"{archive}/compress/{content_name}"
         dl_urls = [("all", dl_url)]
         default_idx = 0
 
-        r = requests.get(archive_url)
-        soup = BeautifulSoup(r.content, "html.parser")
-        div = soup.find("div", class_="download-directory-listing")
-        urls = div.find_all("a")
+        links = fetch_directory_listing(
+            archive_url, session=session, timeout=timeout, cache=cache
+        )
         dl_urls += [
             (
-                url["href"].split(".")[-1],
-                f"{archive}/download/{content_name}/{url['href']}",
+                href.split(".")[-1],
+                f"{archive}/download/{content_name}/{href}",
             )
-            for url in urls
+            for href, text in links
             if (
-                not url["href"].endswith(content_name)
-                and not url["href"].endswith("/")
-                and url.get_text().find("View Contents") == -1
+                not href.endswith(content_name)
+                and not href.endswith("/")
+                and text.find("View Contents") == -1
             )
         ]
-        preference_order = ["pdf", "mp3", "all"]
-        for preference in preference_order:
-            for idx, (tag, url) in enumerate(dl_urls):
+        for preference in self.preference_order:
+            for idx, (tag, _) in enumerate(dl_urls):
                 if tag == preference:
                     default_idx = idx
                     break
@@ -126,9 +480,13 @@ def handle_url(url):
 
         return dl_urls, default_idx
 
-    dropbox_pattern = "dropbox.com"
-    dropbox_match = dropbox_pattern in url
-    if dropbox_match:
+
+@register_handler
+class DropboxHandler(Handler):
+    name = "dropbox"
+    hosts = ("dropbox.com",)
+
+    def resolve(self, url, match, session=None, timeout=60, cache=None):
         parse_result = urlparse(url)
         query = dict(
             p.split("=") for p in parse_result.query.split("&") if "=" in p
@@ -136,7 +494,164 @@ def handle_url(url):
         query["dl"] = 1
         query_string = "&".join([f"{k}={v}" for k, v in query.items()])
         parse_result = parse_result._replace(query=query_string)
-        return [("dropbox", urlunparse(parse_result))], default_idx
+        return [("dropbox", urlunparse(parse_result))], 0
+
+
+###############################################################################
+
+
+def handle_url(url, session=None, timeout=60, cache=None):
+    """
+    Infer the actual download URLs by handling various special cases
+
+    The URL is dispatched on its host to the registered handlers (see
+    `register_handler()`), whose patterns are then tried in order.
+
+    Parameters
+    ----------
+    url : str
+        Provided download URL.
+    session : object, optional
+        A valid `requests.Session` object, used if a handler needs to make
+        requests (e.g. archive.org).
+        The default is None.
+    timeout : float, optional
+        Timeout, in seconds, for the requests made by handlers.
+        The default is 60.
+    cache : object, optional
+        A `TTLCache` to memoize the network-bound resolutions in.
+        If None, the module-level `RESOLUTION_CACHE` is used.
+        The default is None.
+
+    Returns
+    -------
+    urls : list
+        List of inferred download URLs from the provided URL.
+    default_idx: int
+        Index of default URL to download.
+    """
+    normalized_url = normalize_url(url)
+    host = urlparse(normalized_url).hostname or ""
+    for handler in get_handlers(host):
+        match = handler.match(normalized_url)
+        if match:
+            return handler.resolve(
+                normalized_url,
+                match,
+                session=session,
+                timeout=timeout,
+                cache=cache,
+            )
 
     LOGGER.debug("No specific pattern matched.")
-    return [("direct", url)], default_idx
+    return [("direct", url)], 0
+
+
+def confirm_url(url, response, session=None, timeout=60, cache=None):
+    """
+    Get past an HTML page (or an error) served instead of the content of a
+    special URL
+
+    E.g. the virus-scan warning of Google Drive for large files, or an expired
+    confirmation of such a download.
+
+    Parameters
+    ----------
+    url : str
+        The URL which was requested.
+    response : object
+        The `requests.Response` with the HTML page (or the error). It may be
+        read, but is not closed.
+    session : object, optional
+        The `requests.Session` object of the download.
+        The default is None.
+    timeout : float, optional
+        Timeout, in seconds, for the requests made by handlers.
+        The default is 60.
+    cache : object, optional
+        A `TTLCache` to memoize the confirmed URLs in.
+        If None, the module-level `RESOLUTION_CACHE` is used.
+        The default is None.
+
+    Returns
+    -------
+    url : str or None
+        The URL to download the content from, if a handler understood the
+        page.
+    """
+    host = urlparse(url).hostname or ""
+    for handler in get_handlers(host):
+        confirmed_url = handler.confirm(
+            url, response, session=session, timeout=timeout, cache=cache
+        )
+        if confirmed_url is not None:
+            return confirmed_url
+    return None
+
+
+def resolve_many(
+    urls, workers=8, per_host_limit=4, session=None, timeout=60, cache=None
+):
+    """
+    Resolve several URLs concurrently, yielding them as they are resolved
+
+    The URLs are de-duplicated (after normalization), and resolved with
+    `handle_url()` in a thread pool, so that the network-bound handlers (e.g.
+    archive.org) do not wait for one another. Since the results are yielded
+    as soon as they are available, the resolved URLs can be downloaded while
+    the rest are still being resolved.
+
+    Parameters
+    ----------
+    urls : list
+        Provided download URLs.
+    workers : int, optional
+        Maximum number of simultaneous resolutions.
+        The default is 8.
+    per_host_limit : int, optional
+        Maximum number of simultaneous resolutions for a single host.
+        If None, only `workers` limits the concurrency.
+        The default is 4.
+    session : object, optional
+        A valid `requests.Session` object, used if a handler needs to make
+        requests.
+        The default is None.
+    timeout : float, optional
+        Timeout, in seconds, for the requests made by handlers.
+        The default is 60.
+    cache : object, optional
+        A `TTLCache` to memoize the network-bound resolutions in.
+        If None, the module-level `RESOLUTION_CACHE` is used.
+        The default is None.
+
+    Yields
+    ------
+    url : str
+        Provided URL (the first one, in case of duplicates).
+    result : tuple or Exception
+        Return value of `handle_url()`, i.e. (urls, default_idx), or the
+        exception raised by it.
+    """
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(normalize_url(url), url)
+
+    host_semaphore = host_semaphores(per_host_limit or workers)
+
+    def resolve(url):
+        with host_semaphore(url):
+            try:
+                return handle_url(
+                    url, session=session, timeout=timeout, cache=cache
+                )
+            except Exception as e:
+                LOGGER.error(f"Resolution of '{url}' failed: {e}")
+                return e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(resolve, url): url
+            for url in unique_urls.values()
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
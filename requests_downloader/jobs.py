@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent download queue
+
+Jobs (URL, destination, checksum and priority) are stored in an SQLite
+database. Workers claim the pending jobs in order of priority and record
+their outcome, so a batch can be stopped and resumed at any time without
+re-planning it: jobs claimed by a worker which never finished them are
+re-queued, and partially downloaded files are resumed from their journals.
+Failed jobs are re-queued with an exponential backoff, and marked as failed
+after `max_attempts`.
+"""
+
+###############################################################################
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .downloader import DEFAULT_POOLSIZE, create_session, download
+from .ratelimit import host_semaphores
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+STATES = [PENDING, RUNNING, DONE, FAILED]
+
+FIELDS = [
+    "id",
+    "url",
+    "download_dir",
+    "download_path",
+    "checksum",
+    "priority",
+    "state",
+    "attempts",
+    "next_attempt",
+    "path",
+    "error",
+]
+
+###############################################################################
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of download jobs
+
+    The queue can be shared by threads and processes.
+
+    Parameters
+    ----------
+    path : str
+        Path of the queue database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, "
+                "download_dir TEXT NOT NULL DEFAULT '', "
+                "download_path TEXT NOT NULL DEFAULT '', checksum TEXT, "
+                "priority INTEGER NOT NULL DEFAULT 0, "
+                f"state TEXT NOT NULL DEFAULT '{PENDING}', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL DEFAULT 0, "
+                "claimed REAL, path TEXT, error TEXT, updated REAL, "
+                "UNIQUE (url, download_dir, download_path))"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_queue "
+                "ON jobs (state, priority DESC, id)"
+            )
+
+    def transaction(self, sql, parameters, many=False):
+        """
+        Execute a statement in a write transaction
+
+        Returns the number of rows changed by the statement.
+        """
+        with self.lock:
+            changes = self.connection.total_changes
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if many:
+                    cursor.executemany(sql, parameters)
+                else:
+                    cursor.execute(sql, parameters)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return self.connection.total_changes - changes
+
+    def add(
+        self,
+        url,
+        download_dir="",
+        download_path=None,
+        checksum=None,
+        priority=0,
+    ):
+        """
+        Add a job to the queue
+
+        A job for the same URL and destination is only added once.
+
+        Parameters
+        ----------
+        url : str
+            URL to download.
+        download_dir : str, optional
+            Directory to download the file in.
+            The default is ''.
+        download_path : str, optional
+            Full path of the downloaded file.
+            The default is None.
+        checksum : str, optional
+            Checksum to verify the download with.
+            The default is None.
+        priority : int, optional
+            Jobs with a higher priority are claimed first.
+            The default is 0.
+        """
+        self.add_many(
+            [
+                {
+                    "url": url,
+                    "download_dir": download_dir,
+                    "download_path": download_path,
+                    "checksum": checksum,
+                    "priority": priority,
+                }
+            ]
+        )
+
+    def add_many(self, jobs):
+        """
+        Add several jobs to the queue, in a single transaction
+
+        Parameters
+        ----------
+        jobs : list
+            Dicts with the keyword arguments of `add()`.
+
+        Returns
+        -------
+        added : int
+            Number of jobs added.
+        """
+        now = time.time()
+        rows = [
+            (
+                job["url"],
+                job.get("download_dir") or "",
+                job.get("download_path") or "",
+                job.get("checksum"),
+                job.get("priority") or 0,
+                now,
+            )
+            for job in jobs
+        ]
+        return self.transaction(
+            "INSERT OR IGNORE INTO jobs (url, download_dir, download_path, "
+            "checksum, priority, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+            many=True,
+        )
+
+    def claim(self):
+        """
+        Claim the next pending job, marking it as running
+
+        Returns
+        -------
+        job : dict or None
+            The claimed job with the keys `FIELDS`, if any job was due.
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute(
+                    f"SELECT {', '.join(FIELDS)} FROM jobs "
+                    "WHERE state = ? AND next_attempt <= ? "
+                    "ORDER BY priority DESC, id LIMIT 1",
+                    (PENDING, now),
+                ).fetchone()
+                if row is not None:
+                    cursor.execute(
+                        "UPDATE jobs SET state = ?, claimed = ?, updated = ? "
+                        "WHERE id = ?",
+                        (RUNNING, now, now, row[0]),
+                    )
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+        if row is None:
+            return None
+        job = dict(zip(FIELDS, row))
+        job["state"] = RUNNING
+        return job
+
+    def complete(self, job_id, path):
+        """Mark a job as done"""
+        self.transaction(
+            "UPDATE jobs SET state = ?, path = ?, error = NULL, updated = ? "
+            "WHERE id = ?",
+            (DONE, os.path.abspath(path), time.time(), job_id),
+        )
+
+    def fail(self, job_id, error=None, max_attempts=5, backoff=30):
+        """
+        Record a failed attempt of a job
+
+        The job is re-queued after `backoff * 2 ** (attempts - 1)` seconds,
+        or marked as failed once it has been attempted `max_attempts` times.
+        """
+        now = time.time()
+        self.transaction(
+            "UPDATE jobs SET attempts = attempts + 1, error = ?, updated = ?, "
+            "state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END, "
+            "next_attempt = ? + ? * (1 << MIN(attempts, 20)) WHERE id = ?",
+            (error, now, max_attempts, FAILED, PENDING, now, backoff, job_id),
+        )
+
+    def requeue(self, state=RUNNING, older_than=0):
+        """
+        Re-queue the jobs in `state`
+
+        Jobs left running by a worker which has crashed are re-queued with
+        the default `state`. Use `FAILED` to retry the failed jobs.
+
+        Parameters
+        ----------
+        state : str, optional
+            State of the jobs to re-queue.
+            The default is `RUNNING`.
+        older_than : float, optional
+            Only re-queue the jobs which were updated more than these many
+            seconds ago.
+            The default is 0.
+
+        Returns
+        -------
+        requeued : int
+            Number of jobs re-queued.
+        """
+        now = time.time()
+        return self.transaction(
+            "UPDATE jobs SET state = ?, next_attempt = 0, "
+            "attempts = CASE WHEN state = ? THEN 0 ELSE attempts END, "
+            "updated = ? WHERE state = ? AND updated <= ?",
+            (PENDING, FAILED, now, state, now - older_than),
+        )
+
+    def status(self):
+        """Number of jobs in every state"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(rows)
+        return counts
+
+    def failures(self, limit=None):
+        """Failed jobs, with their errors"""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(FIELDS)} FROM jobs WHERE state = ? "
+                "ORDER BY id LIMIT ?",
+                (FAILED, -1 if limit is None else limit),
+            ).fetchall()
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def next_due(self):
+        """Seconds till the next pending job is due, or None if none is"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT MIN(next_attempt) FROM jobs WHERE state = ?",
+                (PENDING,),
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def close(self):
+        self.connection.close()
+
+
+###############################################################################
+
+
+def run_queue(
+    queue,
+    workers=8,
+    per_host_limit=4,
+    max_attempts=5,
+    backoff=30,
+    session=None,
+    stop_when_idle=True,
+    **download_kwargs,
+):
+    """
+    Download the jobs in a queue
+
+    Parameters
+    ----------
+    queue : str or object
+        Path of the queue database, or a `JobQueue` object.
+    workers : int, optional
+        Maximum number of simultaneous downloads.
+        The default is 8.
+    per_host_limit : int, optional
+        Maximum number of simultaneous downloads from a single host.
+        If None, only `workers` limits the concurrency.
+        The default is 4.
+    max_attempts : int, optional
+        Number of attempts after which a job is marked as failed.
+        The default is 5.
+    backoff : float, optional
+        Delay, in seconds, before a failed job is attempted again. The delay
+        is doubled after every failed attempt.
+        The default is 30.
+    session : object, optional
+        A valid `requests.Session` object to be shared by the downloads.
+        If None, a session with pooled connections is created.
+        The default is None.
+    stop_when_idle : bool, optional
+        Return once there are no pending jobs. If False, wait for new jobs.
+        The default is True.
+    **download_kwargs
+        Other keyword arguments are passed on to `download()`.
+
+    Returns
+    -------
+    status : dict
+        Number of jobs in every state, after the run.
+    """
+    if isinstance(queue, str):
+        queue = JobQueue(queue)
+    connections = download_kwargs.get("connections", 1)
+    host_limit = per_host_limit or workers
+    if session is None:
+        session = create_session(
+            pool_connections=max(workers, DEFAULT_POOLSIZE),
+            pool_maxsize=max(host_limit * connections, DEFAULT_POOLSIZE),
+            transport=download_kwargs.get("transport"),
+        )
+
+    # jobs left running by an interrupted run
+    # (a queue is meant to be run by a single process at a time)
+    requeued = queue.requeue()
+    if requeued:
+        LOGGER.info(f"Re-queued {requeued} interrupted jobs.")
+
+    host_semaphore = host_semaphores(host_limit)
+    lock = threading.Lock()
+    active = [0]
+
+    def run_job(job):
+        try:
+            if job["download_dir"]:
+                os.makedirs(job["download_dir"], exist_ok=True)
+            with host_semaphore(job["url"]):
+                result = download(
+                    job["url"],
+                    download_dir=job["download_dir"],
+                    download_path=job["download_path"] or None,
+                    checksum=job["checksum"],
+                    session=session,
+                    **download_kwargs,
+                )
+            # with legacy=True, a failed download returns a bare False
+            error = getattr(result, "error", None) or "Download failed"
+        except Exception as e:
+            result, error = None, str(e)
+        if result:
+            queue.complete(job["id"], os.fspath(result))
+        else:
+            LOGGER.warning(f"Download from '{job['url']}' failed: {error}")
+            queue.fail(job["id"], error, max_attempts, backoff)
+
+    def worker():
+        while True:
+            job = queue.claim()
+            if job is None:
+                wait = queue.next_due()
+                with lock:
+                    idle = not active[0]
+                if wait is None and idle and stop_when_idle:
+                    return
+                time.sleep(min(wait if wait is not None else 1.0, 1.0))
+                continue
+            with lock:
+                active[0] += 1
+            try:
+                run_job(job)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(worker) for _ in range(workers)]:
+            future.result()
+
+    return queue.status()
+
+
+###############################################################################
+
+
+def main(argv=None):
+    """CLI to manage a download queue (`smart-dl queue`)"""
+    parser = argparse.ArgumentParser(prog="smart-dl queue")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    add_parser = subparsers.add_parser("add", help="Add jobs to a queue")
+    add_parser.add_argument("queue", help="Queue database")
+    add_parser.add_argument("urls", help="Download URLs", nargs="*")
+    add_parser.add_argument(
+        "--input-file",
+        help="Add the jobs listed in a file ('URL [CHECKSUM]' per line)",
+        default=None,
+    )
+    add_parser.add_argument(
+        "--download_dir", help="Specify downloads directory", default=""
+    )
+    add_parser.add_argument(
+        "--checksum", help="Checksum (for a single URL)", default=None
+    )
+    add_parser.add_argument(
+        "--priority", help="Priority of the jobs", default=0
+    )
+
+    run_parser = subparsers.add_parser("run", help="Download the jobs")
+    run_parser.add_argument("queue", help="Queue database")
+    run_parser.add_argument(
+        "--workers", help="Number of simultaneous downloads", default=8
+    )
+    run_parser.add_argument(
+        "--per-host-limit", help="Simultaneous downloads per host", default=4
+    )
+    run_parser.add_argument(
+        "--max-attempts",
+        help="Attempts after which a job is marked as failed",
+        default=5,
+    )
+    run_parser.add_argument(
+        "--connections",
+        help="Number of parallel connections, if supported",
+        default=1,
+    )
+    run_parser.add_argument(
+        "--progress", help="Show download progressbars", action="store_true"
+    )
+
+    status_parser = subparsers.add_parser("status", help="Show the status")
+    status_parser.add_argument("queue", help="Queue database")
+    status_parser.add_argument(
+        "--failures", help="List the failed jobs", action="store_true"
+    )
+
+    retry_parser = subparsers.add_parser(
+        "retry", help="Re-queue the failed jobs"
+    )
+    retry_parser.add_argument("queue", help="Queue database")
+
+    args = vars(parser.parse_args(argv))
+    queue = JobQueue(args["queue"])
+
+    if args["command"] == "add":
+        jobs = [
+            {
+                "url": url,
+                "download_dir": args["download_dir"],
+                "checksum": args["checksum"],
+                "priority": int(args["priority"]),
+            }
+            for url in args["urls"]
+        ]
+        if args["input_file"] is not None:
+            with open(args["input_file"]) as f:
+                for line in f:
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    url, _, checksum = line.strip().partition(" ")
+                    jobs.append(
+                        {
+                            "url": url,
+                            "download_dir": args["download_dir"],
+                            "checksum": checksum.strip() or None,
+                            "priority": int(args["priority"]),
+                        }
+                    )
+        print(f"Added {queue.add_many(jobs)} of {len(jobs)} jobs.")
+    elif args["command"] == "run":
+        status = run_queue(
+            queue,
+            workers=int(args["workers"]),
+            per_host_limit=int(args["per_host_limit"]),
+            max_attempts=int(args["max_attempts"]),
+            connections=int(args["connections"]),
+            show_progress=args["progress"],
+        )
+        print(", ".join(f"{k}: {v}" for k, v in status.items()))
+        return 1 if status[FAILED] else 0
+    elif args["command"] == "status":
+        status = queue.status()
+        print(", ".join(f"{k}: {v}" for k, v in status.items()))
+        if args["failures"]:
+            for job in queue.failures():
+                print(f"{job['url']}: {job['error']}")
+    elif args["command"] == "retry":
+        print(f"Re-queued {queue.requeue(FAILED)} failed jobs.")
+
+    return 0
+
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    sys.exit(main())
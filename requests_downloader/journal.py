@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resume journal for partially downloaded files
+
+A download is written to `<download_path>.part`, and its progress is recorded
+in a small JSON sidecar `<download_path>.part.json`. Only the byte ranges that
+have been flushed and fsynced to the `.part` file are recorded, so the journal
+never claims more than what is actually on disk.
+"""
+
+###############################################################################
+
+import os
+import json
+import time
+import logging
+import threading
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+PART_SUFFIX = ".part"
+JOURNAL_SUFFIX = ".part.json"
+SYNC_INTERVAL = 1.0
+
+###############################################################################
+
+
+def part_path(download_path):
+    """Path of the partial file for `download_path`"""
+    return f"{download_path}{PART_SUFFIX}"
+
+
+def journal_path(download_path):
+    """Path of the journal for `download_path`"""
+    return f"{download_path}{JOURNAL_SUFFIX}"
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or adjacent half-open [start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+###############################################################################
+
+
+class Journal:
+    """
+    Progress of a download, persisted next to its `.part` file
+
+    Parameters
+    ----------
+    download_path : str
+        Final path of the file being downloaded.
+    url : str, optional
+        URL of the download.
+    content_length : int, optional
+        Total size of the file. 0, if unknown.
+    etag : str, optional
+        ETag validator sent by the server.
+    last_modified : str, optional
+        Last-Modified validator sent by the server.
+    ranges : list, optional
+        Completed half-open [start, end) byte ranges.
+    interval : float, optional
+        Minimum interval, in seconds, between two checkpoints.
+        The default is `SYNC_INTERVAL`.
+    """
+
+    def __init__(
+        self,
+        download_path,
+        url=None,
+        content_length=0,
+        etag=None,
+        last_modified=None,
+        ranges=(),
+        interval=SYNC_INTERVAL,
+    ):
+        self.download_path = download_path
+        self.path = journal_path(download_path)
+        self.url = url
+        self.content_length = content_length
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ranges = merge_ranges(ranges)
+        self.interval = interval
+        self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, download_path):
+        """
+        Load the journal for `download_path`
+
+        Returns None if there is no (valid) journal, or if the `.part` file
+        it refers to is missing.
+        """
+        path = journal_path(download_path)
+        if not os.path.isfile(part_path(download_path)):
+            return None
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            return cls(
+                download_path,
+                url=state["url"],
+                content_length=state["content_length"],
+                etag=state.get("etag"),
+                last_modified=state.get("last_modified"),
+                ranges=state["ranges"],
+            )
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            LOGGER.warning(f"Ignoring invalid journal '{path}' ({e}).")
+            return None
+
+    def matches(self, content_length, etag=None, last_modified=None):
+        """Check if the journal refers to the same version of the content"""
+        if self.content_length != content_length:
+            return False
+        if self.etag and etag and self.etag != etag:
+            return False
+        if (
+            self.last_modified
+            and last_modified
+            and self.last_modified != last_modified
+        ):
+            return False
+        return True
+
+    @property
+    def validator(self):
+        """Validator suitable for an `If-Range` header"""
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    @property
+    def offset(self):
+        """End of the completed range starting at byte 0"""
+        if self.ranges and self.ranges[0][0] == 0:
+            return self.ranges[0][1]
+        return 0
+
+    @property
+    def completed(self):
+        """Number of completed bytes"""
+        return sum(end - start for start, end in self.ranges)
+
+    def missing(self):
+        """Missing byte ranges, as inclusive (start, end) pairs"""
+        missing = []
+        position = 0
+        for start, end in self.ranges:
+            if start > position:
+                missing.append((position, start - 1))
+            position = max(position, end)
+        if position < self.content_length:
+            missing.append((position, self.content_length - 1))
+        return missing
+
+    def due(self):
+        """Check if a checkpoint is due"""
+        return time.monotonic() - self.last_sync >= self.interval
+
+    def checkpoint(self, f, start, end):
+        """
+        Flush `f` to disk and record [start, end) as completed
+
+        Parameters
+        ----------
+        f : object
+            File object of the `.part` file, to which the range was written.
+        start : int
+            First byte of the completed range.
+        end : int
+            Byte after the last byte of the completed range.
+        """
+        f.flush()
+        os.fsync(f.fileno())
+        with self.lock:
+            if end > start:
+                self.ranges = merge_ranges(self.ranges + [[start, end]])
+            self.save()
+
+    def save(self):
+        """Atomically write the journal to disk"""
+        state = {
+            "url": self.url,
+            "content_length": self.content_length,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "ranges": self.ranges,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.last_sync = time.monotonic()
+
+    def remove(self):
+        """Remove the journal from disk"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+###############################################################################
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transfer metrics and instrumentation hooks
+
+Every download fills a `TransferMetrics` object, which is passed to the
+hooks registered for the download:
+
+* `on_start(metrics)`
+* `on_chunk(metrics, nbytes)`, after every block written
+* `on_complete(metrics)`, after a successful download
+* `on_error(metrics, error)`, after a failed download (`error` is None, if
+  the download failed without an exception)
+
+The exporters are hooks too, writing the metrics as JSON lines or
+aggregating them in the Prometheus text format.
+
+Once finished, a download returns a `DownloadResult` built from its metrics.
+"""
+
+###############################################################################
+
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+HOOK_NAMES = ["on_start", "on_chunk", "on_complete", "on_error"]
+SAMPLE_INTERVAL = 1.0
+
+###############################################################################
+
+
+class TransferMetrics:
+    """
+    Metrics of a single transfer
+
+    Timings are in seconds. The DNS, connect and TLS timings are not exposed
+    by `requests`, so `ttfb` (from sending the first request to receiving
+    its headers) includes them.
+
+    Parameters
+    ----------
+    url : str
+        URL of the download.
+    sample_interval : float, optional
+        Minimum interval, in seconds, between two throughput samples.
+        The default is `SAMPLE_INTERVAL`.
+    """
+
+    def __init__(self, url, sample_interval=SAMPLE_INTERVAL):
+        self.url = url
+        self.path = None
+        self.status = None
+        self.size = None
+        self.started = time.time()
+        self.ttfb = None
+        self.duration = None
+        self.downloaded = 0
+        self.resumed = 0
+        self.retries = 0
+        self.resumes = 0
+        self.skipped = False
+        self.digest = None
+        self.success = None
+        self.error = None
+        self.samples = []
+        self.sample_interval = sample_interval
+        self.start_time = time.monotonic()
+        self.last_sample = self.start_time
+        self.lock = threading.Lock()
+
+    @property
+    def host(self):
+        return (urlparse(self.url).hostname or "").lower()
+
+    @property
+    def elapsed(self):
+        """Seconds since the start (or the duration, once finished)"""
+        if self.duration is not None:
+            return self.duration
+        return time.monotonic() - self.start_time
+
+    @property
+    def throughput(self):
+        """Average download rate, in bytes per second"""
+        elapsed = self.elapsed
+        return self.downloaded / elapsed if elapsed else 0.0
+
+    def response(self, r):
+        """Record a response (status code and time-to-first-byte)"""
+        self.status = r.status_code
+        if self.ttfb is None:
+            self.ttfb = r.elapsed.total_seconds()
+
+    def chunk(self, nbytes):
+        """Record `nbytes` downloaded, sampling the throughput periodically"""
+        with self.lock:
+            self.downloaded += nbytes
+            now = time.monotonic()
+            if now - self.last_sample >= self.sample_interval:
+                self.samples.append(
+                    (round(now - self.start_time, 3), self.downloaded)
+                )
+                self.last_sample = now
+
+    def fail(self, reason):
+        """Record the reason of a failure"""
+        self.error = reason
+
+    def finish(self, success, error=None):
+        self.duration = time.monotonic() - self.start_time
+        self.success = bool(success)
+        if error is not None:
+            self.error = error
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "path": self.path,
+            "status": self.status,
+            "size": self.size,
+            "started": self.started,
+            "ttfb": self.ttfb,
+            "duration": self.duration,
+            "downloaded": self.downloaded,
+            "resumed": self.resumed,
+            "throughput": self.throughput,
+            "retries": self.retries,
+            "resumes": self.resumes,
+            "skipped": self.skipped,
+            "digest": self.digest,
+            "success": self.success,
+            "error": str(self.error) if self.error is not None else None,
+            "samples": self.samples,
+        }
+
+
+###############################################################################
+
+
+class Hooks:
+    """
+    Dispatch the events of a transfer to the registered hooks
+
+    Parameters
+    ----------
+    hooks : dict or object or list, optional
+        A dict mapping hook names (`HOOK_NAMES`) to a callable or a list of
+        callables, an object (such as an exporter) with methods named after
+        the hooks, or a list of these.
+        The default is None.
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = {name: [] for name in HOOK_NAMES}
+        self.register(hooks)
+
+    def register(self, hooks):
+        if hooks is None:
+            return
+        if isinstance(hooks, Hooks):
+            for name, functions in hooks.hooks.items():
+                self.hooks[name].extend(functions)
+        elif isinstance(hooks, dict):
+            for name, functions in hooks.items():
+                if name not in self.hooks:
+                    raise ValueError(f"Unknown hook '{name}'.")
+                if callable(functions):
+                    functions = [functions]
+                self.hooks[name].extend(functions)
+        elif isinstance(hooks, (list, tuple)):
+            for item in hooks:
+                self.register(item)
+        else:
+            for name in HOOK_NAMES:
+                function = getattr(hooks, name, None)
+                if function is not None:
+                    self.hooks[name].append(function)
+
+    def dispatch(self, name, *args):
+        """Call the hooks registered for `name`, logging their errors"""
+        for function in self.hooks[name]:
+            try:
+                function(*args)
+            except Exception as e:
+                LOGGER.warning(f"Error in '{name}' hook {function}: {e}")
+
+    def __bool__(self):
+        return any(self.hooks.values())
+
+
+class DownloadResult:
+    """
+    Outcome of a download
+
+    A result is truthy only if the download succeeded, and can be used in
+    place of the path of the downloaded file (`os.fspath()`, `str()` and
+    comparison with paths).
+
+    Attributes
+    ----------
+    path : str
+        Final path of the file, or None if the download failed.
+    url : str
+        Resolved URL of the download.
+    status : int
+        HTTP status code of the last response.
+    size : int
+        Size of the file, as reported by the server.
+    transferred : int
+        Number of bytes transferred by this download.
+    resumed_from : int
+        Number of bytes reused from an earlier partial download.
+    elapsed : float
+        Duration of the download, in seconds.
+    throughput : float
+        Average transfer rate, in bytes per second.
+    digest : str
+        Verified checksum of the file, as `algorithm:hexdigest`.
+    skipped : bool
+        True, if the file was already downloaded (or not modified, or
+        materialized from a content store).
+    error : str
+        Reason of the failure.
+    """
+
+    __slots__ = [
+        "path",
+        "url",
+        "status",
+        "size",
+        "transferred",
+        "resumed_from",
+        "elapsed",
+        "throughput",
+        "digest",
+        "skipped",
+        "error",
+    ]
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise TypeError(f"Unexpected fields: {', '.join(kwargs)}")
+
+    @classmethod
+    def from_metrics(cls, metrics):
+        return cls(
+            path=(
+                os.fspath(metrics.path)
+                if metrics.success and metrics.path is not None
+                else None
+            ),
+            url=metrics.url,
+            status=metrics.status,
+            size=metrics.size,
+            transferred=metrics.downloaded,
+            resumed_from=metrics.resumed,
+            elapsed=metrics.elapsed,
+            throughput=metrics.throughput,
+            digest=metrics.digest,
+            skipped=metrics.skipped,
+            error=str(metrics.error) if metrics.error is not None else None,
+        )
+
+    def __bool__(self):
+        return self.path is not None
+
+    def __fspath__(self):
+        if self.path is None:
+            raise ValueError(f"Download from '{self.url}' failed.")
+        return self.path
+
+    def __str__(self):
+        return self.path or ""
+
+    def __eq__(self, other):
+        if isinstance(other, (str, os.PathLike)):
+            return self.path == os.fspath(other)
+        if isinstance(other, DownloadResult):
+            return all(
+                getattr(self, name) == getattr(other, name)
+                for name in self.__slots__
+            )
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__slots__
+        )
+        return f"DownloadResult({fields})"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def instrument(func):
+    """
+    Report the metrics of a download function to its hooks
+
+    The decorated function must accept `hooks` and `metrics` keyword
+    arguments, which it receives as `Hooks` and `TransferMetrics` objects.
+    It returns a `DownloadResult`, or the return value of the function
+    itself (path or False) if it is called with `legacy=True`.
+    """
+
+    @functools.wraps(func)
+    def wrapper(url, *args, **kwargs):
+        hooks = Hooks(kwargs.get("hooks"))
+        metrics = kwargs.get("metrics") or TransferMetrics(url)
+        kwargs.update(hooks=hooks, metrics=metrics)
+        hooks.dispatch("on_start", metrics)
+        try:
+            result = func(url, *args, **kwargs)
+        except Exception as e:
+            metrics.finish(False, e)
+            hooks.dispatch("on_error", metrics, e)
+            raise
+        metrics.finish(result)
+        if result:
+            hooks.dispatch("on_complete", metrics)
+        else:
+            hooks.dispatch("on_error", metrics, None)
+        if kwargs.get("legacy"):
+            return result
+        return DownloadResult.from_metrics(metrics)
+
+    return wrapper
+
+
+###############################################################################
+
+
+class JSONLinesExporter:
+    """
+    Write the metrics of every finished transfer as a line of JSON
+
+    Parameters
+    ----------
+    file : str or object
+        Path of the file to append to, or a writable text file object.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.lock = threading.Lock()
+
+    def write(self, metrics):
+        line = json.dumps(metrics.to_dict()) + "\n"
+        with self.lock:
+            if isinstance(self.file, str):
+                with open(self.file, "a") as f:
+                    f.write(line)
+            else:
+                self.file.write(line)
+                self.file.flush()
+
+    def on_complete(self, metrics):
+        self.write(metrics)
+
+    def on_error(self, metrics, error):
+        self.write(metrics)
+
+
+class PrometheusExporter:
+    """
+    Aggregate the metrics of finished transfers, per host
+
+    The aggregate is rendered in the Prometheus text exposition format by
+    `render()`, and can be written for the node exporter textfile collector
+    by `save()`.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the file to save the metrics to after every transfer.
+        The default is None.
+    prefix : str, optional
+        Prefix for the metric names.
+        The default is 'requests_downloader'.
+    """
+
+    METRICS = [
+        ("downloads_total", "counter", "Finished downloads"),
+        ("downloaded_bytes_total", "counter", "Bytes downloaded"),
+        ("resumed_bytes_total", "counter", "Bytes saved by resuming"),
+        ("retries_total", "counter", "Retried requests and transfers"),
+        ("resumes_total", "counter", "Transfers resumed after interruption"),
+        ("transfer_seconds_total", "counter", "Time spent in downloads"),
+        ("ttfb_seconds", "summary", "Time to first byte"),
+    ]
+
+    def __init__(self, path=None, prefix="requests_downloader"):
+        self.path = path
+        self.prefix = prefix
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def record(self, metrics):
+        host = metrics.host
+        result = "success" if metrics.success else "failure"
+        with self.lock:
+            self.values["downloads_total", host, result] += 1
+            self.values["downloaded_bytes_total", host] += metrics.downloaded
+            self.values["resumed_bytes_total", host] += metrics.resumed
+            self.values["retries_total", host] += metrics.retries
+            self.values["resumes_total", host] += metrics.resumes
+            self.values["transfer_seconds_total", host] += metrics.elapsed
+            if metrics.ttfb is not None:
+                self.values["ttfb_seconds_sum", host] += metrics.ttfb
+                self.values["ttfb_seconds_count", host] += 1
+        if self.path is not None:
+            self.save()
+
+    def on_complete(self, metrics):
+        self.record(metrics)
+
+    def on_error(self, metrics, error):
+        self.record(metrics)
+
+    def render(self):
+        """Render the metrics in the Prometheus text format"""
+        with self.lock:
+            values = sorted(self.values.items())
+        lines = []
+        for name, kind, description in self.METRICS:
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for key, value in values:
+                if key[0] != name and not key[0].startswith(f"{name}_"):
+                    continue
+                labels = f'host="{key[1]}"'
+                if len(key) > 2:
+                    labels += f',result="{key[2]}"'
+                lines.append(f"{self.prefix}_{key[0]}{{{labels}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path=None):
+        """Atomically write the metrics to `path`"""
+        path = path or self.path
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+###############################################################################
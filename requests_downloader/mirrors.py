@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scheduling of multi-source (mirrored) downloads
+
+The content to be downloaded is split into chunks, which the connections
+take one at a time from a shared queue. A connection is bound to a mirror,
+so faster mirrors complete (and take) more chunks, and the byte ranges are
+spread across the mirrors in proportion to their measured speed. A mirror
+which is much slower than the fastest one, or which keeps failing, is
+dropped, and its connections move to the fastest remaining mirror.
+"""
+
+###############################################################################
+
+import time
+import logging
+import threading
+from collections import deque
+
+from .ratelimit import get_host
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+MIN_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+CHUNKS_PER_CONNECTION = 4
+
+###############################################################################
+
+
+class Mirror:
+    """
+    A source of the content, with its measured speed
+
+    Parameters
+    ----------
+    url : str
+        URL of the content on the mirror.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.host = get_host(url)
+        self.downloaded = 0
+        self.busy = 0.0
+        self.chunks = 0
+        self.failures = 0
+        self.active = True
+
+    @property
+    def speed(self):
+        """Throughput, in bytes per second per connection"""
+        return self.downloaded / self.busy if self.busy else 0.0
+
+    def __repr__(self):
+        return (
+            f"Mirror({self.url!r}, speed={self.speed:.0f}, "
+            f"chunks={self.chunks}, active={self.active})"
+        )
+
+
+class MirrorScheduler:
+    """
+    Thread-safe queue of chunks shared by the connections to the mirrors
+
+    Parameters
+    ----------
+    urls : list
+        URLs of the (validated) mirrors.
+    ranges : list
+        Inclusive (start, end) byte ranges to download.
+    chunk_size : int, optional
+        Size of a chunk, in bytes.
+        If None, it is derived from the size of the ranges and `connections`.
+        The default is None.
+    connections : int, optional
+        Total number of connections.
+        The default is 1.
+    drop_ratio : float, optional
+        A mirror slower than `drop_ratio` times the fastest mirror is dropped,
+        once it has completed `min_chunks` chunks.
+        The default is 0.25.
+    min_chunks : int, optional
+        Number of chunks a mirror must complete before it can be dropped for
+        being slow.
+        The default is 2.
+    max_failures : int, optional
+        A mirror is dropped after these many consecutive failures.
+        The default is 3.
+    """
+
+    def __init__(
+        self,
+        urls,
+        ranges,
+        chunk_size=None,
+        connections=1,
+        drop_ratio=0.25,
+        min_chunks=2,
+        max_failures=3,
+    ):
+        self.mirrors = [Mirror(url) for url in urls]
+        self.drop_ratio = drop_ratio
+        self.min_chunks = min_chunks
+        self.max_failures = max_failures
+        self.lock = threading.Lock()
+
+        if chunk_size is None:
+            remaining = sum(end - start + 1 for start, end in ranges)
+            chunk_size = remaining // (
+                max(1, connections) * CHUNKS_PER_CONNECTION
+            )
+            chunk_size = max(MIN_CHUNK_SIZE, min(chunk_size, MAX_CHUNK_SIZE))
+        self.chunk_size = chunk_size
+        self.chunks = deque(
+            (offset, min(offset + chunk_size, end + 1) - 1)
+            for start, end in ranges
+            for offset in range(start, end + 1, chunk_size)
+        )
+
+    @property
+    def active(self):
+        """Mirrors which have not been dropped"""
+        return [mirror for mirror in self.mirrors if mirror.active]
+
+    def assign(self, index):
+        """Mirror for the `index`-th connection (round-robin)"""
+        return self.mirrors[index % len(self.mirrors)]
+
+    def fastest(self):
+        """The fastest active mirror, or None if all were dropped"""
+        with self.lock:
+            active = self.active
+        if not active:
+            return None
+        # mirrors without measurements yet rank last
+        return max(
+            active, key=lambda mirror: mirror.speed if mirror.chunks else 0
+        )
+
+    def next_chunk(self):
+        """Next (start, end) chunk to download, or None if none is left"""
+        with self.lock:
+            return self.chunks.popleft() if self.chunks else None
+
+    def record(self, mirror, chunk, wrote, elapsed, error=None):
+        """
+        Record the outcome of a chunk downloaded from a mirror
+
+        The bytes of the chunk which were not written are put back at the
+        front of the queue.
+
+        Returns
+        -------
+        ok : bool
+            True, if the chunk was downloaded completely.
+        """
+        start, end = chunk
+        ok = error is None and start + wrote > end
+        with self.lock:
+            mirror.downloaded += wrote
+            mirror.busy += elapsed
+            if not ok:
+                self.chunks.appendleft((start + wrote, end))
+                mirror.failures += 1
+                if mirror.active and mirror.failures >= self.max_failures:
+                    self.drop(mirror, f"{mirror.failures} failures ({error})")
+                return False
+
+            mirror.chunks += 1
+            mirror.failures = 0
+            measured = [m for m in self.active if m.chunks >= self.min_chunks]
+            if len(measured) > 1:
+                best = max(m.speed for m in measured)
+                for m in measured:
+                    if m.speed < self.drop_ratio * best:
+                        self.drop(m, f"{m.speed:.0f} B/s, best {best:.0f} B/s")
+            return True
+
+    def drop(self, mirror, reason):
+        """Stop using a mirror (the lock must be held)"""
+        if len(self.active) > 1 or mirror.failures >= self.max_failures:
+            mirror.active = False
+            LOGGER.info(f"Dropped mirror '{mirror.url}': {reason}.")
+
+    def run(self, index, fetch):
+        """
+        Download chunks over a connection until none is left
+
+        Parameters
+        ----------
+        index : int
+            Index of the connection.
+        fetch : function
+            Function to download a chunk, called with the URL, start and end
+            of the chunk. It should return the number of bytes written.
+
+        Returns
+        -------
+        wrote : int
+            Number of bytes written over the connection.
+        """
+        mirror = self.assign(index)
+        wrote = 0
+        while True:
+            if not mirror.active:
+                mirror = self.fastest()
+                if mirror is None:
+                    break
+            chunk = self.next_chunk()
+            if chunk is None:
+                break
+
+            started = time.perf_counter()
+            error = None
+            try:
+                chunk_wrote = fetch(mirror.url, *chunk)
+            except Exception as e:
+                chunk_wrote, error = 0, e
+                LOGGER.warning(f"Error in download from '{mirror.url}': {e}")
+            wrote += chunk_wrote
+            self.record(
+                mirror,
+                chunk,
+                chunk_wrote,
+                time.perf_counter() - started,
+                error=error,
+            )
+        return wrote
+
+
+###############################################################################
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token-bucket rate limiting for downloads
+
+A `RateLimiter` caps the aggregate bandwidth of all the downloads sharing it,
+and optionally the bandwidth and the request rate per host. The buckets
+are reserved under a lock and the caller sleeps outside it, so a single
+limiter can be shared by threads as well as by asyncio tasks.
+"""
+
+###############################################################################
+
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+from .utils import parse_size
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+# number of reservations a rate should be spread over, every second
+RESERVATIONS_PER_SECOND = 10
+
+###############################################################################
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Parameters
+    ----------
+    rate : float
+        Number of tokens added per second.
+    burst : float, optional
+        Capacity of the bucket.
+        If None, it is equal to `rate` (i.e. one second worth of tokens).
+        The default is None.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, n=1):
+        """
+        Take `n` tokens from the bucket
+
+        The bucket may go into debt, which later reservations have to wait
+        for as well, so the long-term rate never exceeds `rate`.
+
+        Returns
+        -------
+        delay : float
+            Seconds to wait before the tokens may be used.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last) * self.rate
+            )
+            self.last = now
+            self.tokens -= n
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def consume(self, n=1):
+        """Take `n` tokens from the bucket, waiting for them if required"""
+        delay = self.reserve(n)
+        if delay > 0:
+            time.sleep(delay)
+
+
+###############################################################################
+
+
+class RateLimiter:
+    """
+    Process-wide and per-host limits on bandwidth and request rate
+
+    Parameters
+    ----------
+    rate : int or str, optional
+        Maximum aggregate download rate, in bytes per second.
+        Sizes such as '500K' or '20M' are accepted.
+        If None, the aggregate rate is not limited.
+        The default is None.
+    host_rate : int or str or dict, optional
+        Maximum download rate from a single host, in bytes per second.
+        A dict maps hosts (which also cover their subdomains) to rates.
+        If None, the per-host rate is not limited.
+        The default is None.
+    host_request_rate : float or dict, optional
+        Maximum number of requests per second to a single host.
+        A dict maps hosts (which also cover their subdomains) to rates.
+        If None, the request rate is not limited.
+        The default is None.
+    """
+
+    def __init__(self, rate=None, host_rate=None, host_request_rate=None):
+        self.rate = parse_size(rate) if rate is not None else None
+        self.bucket = TokenBucket(self.rate) if self.rate else None
+        self.host_rate = host_rate
+        self.host_request_rate = host_request_rate
+        self.host_buckets = {}
+        self.host_request_buckets = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def host_limit(limits, host):
+        """Limit applicable to `host`, from a number or a dict of limits"""
+        if not isinstance(limits, dict):
+            return limits
+        parts = host.split(".")
+        for idx in range(len(parts)):
+            limit = limits.get(".".join(parts[idx:]))
+            if limit is not None:
+                return limit
+        return None
+
+    def get_bucket(self, buckets, limits, host, size=False):
+        with self.lock:
+            if host not in buckets:
+                limit = self.host_limit(limits, host)
+                if limit is not None and size:
+                    limit = parse_size(limit)
+                buckets[host] = TokenBucket(limit) if limit else None
+            return buckets[host]
+
+    def reserve(self, host, nbytes):
+        """Seconds to wait before `nbytes` may be downloaded from `host`"""
+        delay = 0.0
+        if self.bucket is not None:
+            delay = self.bucket.reserve(nbytes)
+        if self.host_rate is not None:
+            bucket = self.get_bucket(
+                self.host_buckets, self.host_rate, host, size=True
+            )
+            if bucket is not None:
+                delay = max(delay, bucket.reserve(nbytes))
+        return delay
+
+    def reserve_request(self, host):
+        """Seconds to wait before a request may be sent to `host`"""
+        if self.host_request_rate is None:
+            return 0.0
+        bucket = self.get_bucket(
+            self.host_request_buckets, self.host_request_rate, host
+        )
+        if bucket is None:
+            return 0.0
+        return bucket.reserve(1)
+
+    def throttle(self, host, nbytes):
+        """Wait till `nbytes` may be downloaded from `host`"""
+        delay = self.reserve(host, nbytes)
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttle_request(self, host):
+        """Wait till a request may be sent to `host`"""
+        delay = self.reserve_request(host)
+        if delay > 0:
+            LOGGER.debug(f"Delaying request to '{host}' by {delay:.2f}s.")
+            time.sleep(delay)
+
+    def max_block_size(self, host):
+        """
+        Largest block size which keeps the transfer from `host` smooth
+
+        Returns None, if the bandwidth is not limited.
+        """
+        rates = [self.rate]
+        if self.host_rate is not None:
+            rates.append(self.host_limit(self.host_rate, host))
+        rates = [parse_size(rate) for rate in rates if rate]
+        if not rates:
+            return None
+        return max(1, min(rates) // RESERVATIONS_PER_SECOND)
+
+
+def get_rate_limiter(rate_limit):
+    """Get a `RateLimiter` from a rate (in bytes per second) or a limiter"""
+    if rate_limit is None or isinstance(rate_limit, RateLimiter):
+        return rate_limit
+    return RateLimiter(rate=rate_limit)
+
+
+def get_host(url):
+    """Host of a URL, as used for the per-host limits"""
+    return (urlparse(url).hostname or "").lower()
+
+
+def host_semaphores(limit, semaphore=threading.BoundedSemaphore):
+    """
+    Get a function which maps a URL to the semaphore of its host
+
+    Parameters
+    ----------
+    limit : int
+        Value of every semaphore, i.e. the maximum number of concurrent
+        operations per host.
+    semaphore : type, optional
+        Semaphore class, e.g. `asyncio.Semaphore` for tasks.
+        The default is `threading.BoundedSemaphore`.
+
+    Returns
+    -------
+    host_semaphore : function
+        Function returning the semaphore of the host of a URL (as given by
+        `get_host()`), created on first use.
+    """
+    semaphores = {}
+    lock = threading.Lock()
+
+    def host_semaphore(url):
+        host = get_host(url)
+        with lock:
+            if host not in semaphores:
+                semaphores[host] = semaphore(limit)
+            return semaphores[host]
+
+    return host_semaphore
+
+
+###############################################################################
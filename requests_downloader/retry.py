@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retry policy for requests and interrupted transfers
+
+Failed requests and transfers interrupted midway are retried with an
+exponential backoff (with jitter). An interrupted transfer is resumed with a
+`Range` request from the last byte written, so the bytes already fetched are
+not downloaded again.
+"""
+
+###############################################################################
+
+import time
+import random
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+###############################################################################
+
+
+def parse_retry_after(value):
+    """
+    Parse the value of a `Retry-After` header
+
+    Returns the delay in seconds, or None if the value could not be parsed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    When and after how long to retry a failed request or transfer
+
+    Parameters
+    ----------
+    retries : int, optional
+        Maximum number of retries.
+        The default is 5.
+    backoff : float, optional
+        Delay, in seconds, before the first retry. The delay is doubled for
+        every subsequent retry.
+        The default is 0.5.
+    max_backoff : float, optional
+        Maximum delay, in seconds, between two attempts.
+        The default is 60.
+    jitter : bool, optional
+        Randomize the delays (between half and the full delay), so that
+        simultaneous downloads do not retry in lockstep.
+        The default is True.
+    status_codes : tuple, optional
+        HTTP status codes which are retried.
+        The default is `RETRY_STATUS_CODES`.
+    max_retry_after : float, optional
+        Maximum delay, in seconds, to honour from a `Retry-After` header.
+        Responses asking for a longer wait are not retried.
+        The default is 300.
+    """
+
+    def __init__(
+        self,
+        retries=5,
+        backoff=0.5,
+        max_backoff=60,
+        jitter=True,
+        status_codes=RETRY_STATUS_CODES,
+        max_retry_after=300,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = status_codes
+        self.max_retry_after = max_retry_after
+
+    def retryable(self, attempt, response=None, error=None):
+        """
+        Check if the `attempt`-th failure should be retried
+
+        Parameters
+        ----------
+        attempt : int
+            Number of failures so far (including this one).
+        response : object, optional
+            A `requests.Response` object, to check the status code of.
+            The default is None.
+        error : object, optional
+            The exception raised by the failed attempt.
+            The default is None.
+        """
+        if attempt > self.retries:
+            return False
+        if error is not None:
+            return isinstance(error, RETRY_EXCEPTIONS)
+        if response is not None:
+            if response.status_code not in self.status_codes:
+                return False
+            retry_after = parse_retry_after(
+                response.headers.get("retry-after")
+            )
+            return retry_after is None or retry_after <= self.max_retry_after
+        return True
+
+    def delay(self, attempt, response=None):
+        """Delay, in seconds, before retrying the `attempt`-th failure"""
+        if response is not None:
+            retry_after = parse_retry_after(
+                response.headers.get("retry-after")
+            )
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(delay / 2, delay)
+        return delay
+
+    def sleep(self, attempt, response=None):
+        """Wait before retrying the `attempt`-th failure"""
+        delay = self.delay(attempt, response)
+        LOGGER.info(f"Retrying in {delay:.2f}s (attempt {attempt}) ...")
+        time.sleep(delay)
+
+
+def get_retry_policy(retry):
+    """
+    Get a `RetryPolicy` from a policy, a number of retries or a bool
+
+    None or False disable retries, while True uses the default policy.
+    """
+    if isinstance(retry, RetryPolicy):
+        return retry
+    if retry is None or retry is False:
+        return RetryPolicy(retries=0)
+    if retry is True:
+        return RetryPolicy()
+    return RetryPolicy(retries=int(retry))
+
+
+###############################################################################
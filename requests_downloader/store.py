@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-addressed store of downloaded files
+
+Every completed download is added to the store as a blob named by its digest
+(`algorithm:hexdigest`), along with the validators (ETag, Last-Modified) of
+the URL it was downloaded from. A later download whose expected checksum, or
+whose URL and validators, match a stored blob is materialized from the store
+as a reflink or a copy (or, if opted for, a hardlink), without transferring
+the content again.
+
+The least recently used blobs are evicted once the store grows beyond its
+maximum size.
+"""
+
+###############################################################################
+
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+
+from .utils import file_hash, parse_checksum, parse_size
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+DEFAULT_ALGORITHM = "sha256"
+LINK_METHODS = ["reflink", "hardlink", "copy"]
+# hardlinks share the content with the blob, which an edit in place of the
+# file would corrupt, so they are opt-in
+DEFAULT_LINK_METHODS = ["reflink", "copy"]
+
+# ioctl to share the extents of a file (Linux: btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+###############################################################################
+
+
+def reflink(source, target):
+    """Create `target` as a copy-on-write clone of `source`, if supported"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except BaseException:
+            dst.close()
+            os.unlink(target)
+            raise
+
+
+def link_file(source, target, methods=DEFAULT_LINK_METHODS):
+    """
+    Create `target` with the content of `source`, by the first method possible
+
+    Parameters
+    ----------
+    source : str
+        Path of the existing file.
+    target : str
+        Path of the file to create. It must not exist.
+    methods : list, optional
+        Methods to try, in order, out of `LINK_METHODS` ('reflink',
+        'hardlink' and 'copy').
+        The default is `DEFAULT_LINK_METHODS`.
+
+    Returns
+    -------
+    method : str
+        The method used.
+
+    Raises
+    ------
+    OSError
+        If none of the methods succeeded.
+    """
+    error = None
+    for method in methods:
+        try:
+            if method == "reflink":
+                reflink(source, target)
+            elif method == "hardlink":
+                os.link(source, target)
+            elif method == "copy":
+                shutil.copyfile(source, target)
+            else:
+                raise ValueError(f"Unknown link method '{method}'.")
+        except OSError as e:
+            LOGGER.debug(f"Could not {method} '{source}': {e}")
+            error = e
+            continue
+        return method
+    raise error or OSError(f"Could not link '{source}' to '{target}'.")
+
+
+class ContentStore:
+    """
+    Content-addressed store of files, with an SQLite index
+
+    The store can be shared by threads and processes.
+
+    Parameters
+    ----------
+    path : str
+        Path of the directory of the store.
+    max_size : int or str, optional
+        Maximum total size of the blobs (e.g. '50G').
+        If None, blobs are never evicted.
+        The default is None.
+    link : str or list, optional
+        Method(s) to materialize the files with: 'reflink', 'hardlink' or
+        'copy', in order of preference. Note that a hardlinked file shares
+        its content with the blob, and must not be modified in place.
+        The default is `DEFAULT_LINK_METHODS` (reflink, or else copy).
+    """
+
+    def __init__(self, path, max_size=None, link=DEFAULT_LINK_METHODS):
+        self.path = path
+        self.max_size = parse_size(max_size) if max_size is not None else None
+        self.methods = [link] if isinstance(link, str) else list(link)
+        os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(path, "index.db"),
+            timeout=30,
+            check_same_thread=False,
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "digest TEXT PRIMARY KEY, size INTEGER, used REAL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "size INTEGER, digest TEXT)"
+            )
+
+    def blob_path(self, digest):
+        """Path of the blob with a digest (`algorithm:hexdigest`)"""
+        algorithm, hexdigest = parse_checksum(digest)
+        return os.path.join(
+            self.path, "blobs", algorithm, hexdigest[:2], hexdigest
+        )
+
+    def get(self, digest):
+        """
+        Find a blob in the store
+
+        Parameters
+        ----------
+        digest : str
+            Checksum of the content, as `algorithm:hexdigest` (or an md5
+            hexdigest).
+
+        Returns
+        -------
+        path : str or None
+            Path of the blob, if it is stored (and intact).
+        """
+        digest = ":".join(parse_checksum(digest))
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+        if row is None:
+            return None
+        path = self.blob_path(digest)
+        try:
+            intact = os.stat(path).st_size == row[0]
+        except FileNotFoundError:
+            intact = False
+        if not intact:
+            LOGGER.warning(f"Blob '{digest}' is missing or modified.")
+            self.remove(digest)
+            return None
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE blobs SET used = ? WHERE digest = ?",
+                (time.time(), digest),
+            )
+        return path
+
+    def find_url(self, url, size, etag=None, last_modified=None):
+        """
+        Digest of the content last downloaded from a URL, if it is unchanged
+
+        The content is considered unchanged if the size and the (strong)
+        ETag, or the Last-Modified date in the absence of an ETag, match.
+
+        Parameters
+        ----------
+        url : str
+            URL of the download.
+        size : int
+            Size of the content sent by the server.
+        etag : str, optional
+            ETag sent by the server.
+        last_modified : str, optional
+            Last-Modified sent by the server.
+
+        Returns
+        -------
+        digest : str or None
+            Digest of the content, if it is known.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, size, digest FROM urls "
+                "WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None or not size or row[2] != size:
+            return None
+        if etag or row[0]:
+            unchanged = etag == row[0] and not etag.startswith("W/")
+        else:
+            unchanged = last_modified is not None and last_modified == row[1]
+        return row[3] if unchanged else None
+
+    def materialize(self, digest, target):
+        """
+        Create a file with the content of a blob, if it is stored
+
+        Parameters
+        ----------
+        digest : str
+            Checksum of the content, as `algorithm:hexdigest`.
+        target : str
+            Path of the file to create. An existing file is replaced.
+
+        Returns
+        -------
+        method : str or None
+            The method used to create the file, if the blob is stored.
+        """
+        path = self.get(digest)
+        if path is None:
+            return None
+        directory = os.path.dirname(os.path.abspath(target))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.store"
+        method = link_file(path, temp_path, self.methods)
+        os.replace(temp_path, target)
+        LOGGER.info(f"Materialized '{target}' from the store ({method}).")
+        return method
+
+    def add(
+        self, path, digest=None, url=None, etag=None, last_modified=None
+    ):
+        """
+        Add a file to the store
+
+        Parameters
+        ----------
+        path : str
+            Path of the file.
+        digest : str, optional
+            Checksum of the file, as `algorithm:hexdigest`.
+            If None, it is computed with `DEFAULT_ALGORITHM`.
+        url : str, optional
+            URL the file was downloaded from, to be recorded with its
+            validators.
+        etag : str, optional
+            ETag sent by the server.
+        last_modified : str, optional
+            Last-Modified sent by the server.
+
+        Returns
+        -------
+        digest : str
+            Digest of the file.
+        """
+        if digest is None:
+            hexdigest = file_hash(path, DEFAULT_ALGORITHM).hexdigest()
+            digest = f"{DEFAULT_ALGORITHM}:{hexdigest}"
+        digest = ":".join(parse_checksum(digest))
+        size = os.stat(path).st_size
+
+        if self.get(digest) is None:
+            blob_path = self.blob_path(digest)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}"
+            link_file(path, temp_path, self.methods)
+            os.replace(temp_path, blob_path)
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)",
+                    (digest, size, time.time()),
+                )
+            LOGGER.debug(f"Stored '{path}' as '{digest}'.")
+        if url is not None:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, size, digest),
+                )
+        self.evict()
+        return digest
+
+    def remove(self, digest):
+        """Remove a blob from the store"""
+        try:
+            os.unlink(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM blobs WHERE digest = ?", (digest,)
+            )
+            self.connection.execute(
+                "DELETE FROM urls WHERE digest = ?", (digest,)
+            )
+
+    def size(self):
+        """Total size of the blobs in the store"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+        return row[0]
+
+    def evict(self):
+        """
+        Remove the least recently used blobs, until the store fits its size
+
+        Note that the disk space of a hardlinked blob is only freed once the
+        files linked to it are removed too.
+
+        Returns
+        -------
+        evicted : list
+            Digests of the removed blobs.
+        """
+        if self.max_size is None:
+            return []
+        excess = self.size() - self.max_size
+        evicted = []
+        if excess <= 0:
+            return evicted
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT digest, size FROM blobs ORDER BY used"
+            ).fetchall()
+        for digest, size in rows:
+            if excess <= 0:
+                break
+            self.remove(digest)
+            evicted.append(digest)
+            excess -= size
+        LOGGER.debug(f"Evicted {len(evicted)} blobs from the store.")
+        return evicted
+
+    def close(self):
+        self.connection.close()
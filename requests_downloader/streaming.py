@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helpers for streaming the response content efficiently
+"""
+
+###############################################################################
+
+import time
+import threading
+
+import requests
+from urllib3.exceptions import (
+    DecodeError,
+    ProtocolError,
+    ReadTimeoutError,
+    SSLError,
+)
+
+###############################################################################
+
+MAX_BLOCK_SIZE = 4 * 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.1
+
+###############################################################################
+
+
+class AdaptiveBlockSize:
+    """
+    Block size which adapts to the measured throughput
+
+    The block size is doubled when a block arrives much faster than the
+    `target` interval (in seconds) and halved when it takes much longer,
+    staying within the [`block_size`, `max_block_size`] limits. This keeps
+    the number of iterations per second low on fast links, while slow links
+    still get timely updates.
+    """
+
+    def __init__(
+        self, block_size=65536, max_block_size=MAX_BLOCK_SIZE, target=0.05
+    ):
+        self.min_size = block_size
+        self.max_size = max(block_size, max_block_size)
+        self.target = target
+        self.size = block_size
+
+    def update(self, nbytes, elapsed):
+        """Adjust the block size after reading `nbytes` in `elapsed` secs"""
+        if nbytes < self.size:
+            return
+        if elapsed < self.target / 2:
+            self.size = min(self.size * 2, self.max_size)
+        elif elapsed > self.target * 2:
+            self.size = max(self.size // 2, self.min_size)
+
+
+class ThrottledProgress:
+    """
+    Accumulate progress updates and pass them on at most once per `interval`
+
+    Updates are thread-safe, so a single instance can be shared by workers.
+    """
+
+    def __init__(self, progress, interval=PROGRESS_INTERVAL):
+        self.progress = progress
+        self.interval = interval
+        self.pending = 0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, n):
+        with self.lock:
+            self.pending += n
+            now = time.monotonic()
+            if now - self.last >= self.interval:
+                self.progress.update(self.pending)
+                self.pending = 0
+                self.last = now
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self.progress.update(self.pending)
+                self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+###############################################################################
+
+
+def read_block(r, size):
+    """
+    Read (upto) `size` bytes of decoded content from a streaming response
+
+    Errors are translated the same way as `requests.Response.iter_content`.
+    """
+    try:
+        return r.raw.read(size, decode_content=True)
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+    except SSLError as e:
+        raise requests.exceptions.SSLError(e)
+
+
+def iter_blocks(
+    r, block_size=65536, max_block_size=MAX_BLOCK_SIZE, limit=None
+):
+    """
+    Iterate over the content of a streaming response in adaptive blocks
+
+    Parameters
+    ----------
+    r : object
+        A `requests.Response` object, requested with `stream=True`.
+    block_size : int, optional
+        Initial (and minimum) block size, in bytes.
+        The default is 65536.
+    max_block_size : int, optional
+        Maximum block size, in bytes.
+        If equal to `block_size`, the block size is fixed.
+        The default is `MAX_BLOCK_SIZE`.
+    limit : int, optional
+        Maximum number of bytes to read.
+        If None, the content is read till the end.
+        The default is None.
+
+    Yields
+    ------
+    data : bytes
+        Block of content.
+    """
+    sizer = AdaptiveBlockSize(block_size, max_block_size)
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = sizer.size if remaining is None else min(sizer.size, remaining)
+        start = time.monotonic()
+        data = read_block(r, size)
+        if not data:
+            break
+        sizer.update(len(data), time.monotonic() - start)
+        if remaining is not None:
+            remaining -= len(data)
+        yield data
+
+
+###############################################################################
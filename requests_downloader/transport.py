@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pluggable HTTP transports
+
+A transport creates the session which `download()` sends its requests with.
+The default transport is `requests` (HTTP/1.1, a connection per request in
+flight). The `http2` transport uses `httpx` (installed with the `http2`
+extra), and multiplexes the requests to a host as streams on a single
+connection, which suits workloads of many small files from the same host.
+
+Sessions of other transports follow the subset of the `requests.Session`
+API used by the package, and raise `requests.exceptions`, so that the rest
+of the download logic (filenames, resume, verification) is unchanged.
+"""
+
+###############################################################################
+
+import time
+import logging
+import datetime
+
+import requests
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+TRANSPORTS = {}
+DEFAULT_TRANSPORT = "requests"
+
+###############################################################################
+
+
+def register_transport(name):
+    """
+    Register a transport, as a decorator of its session factory
+
+    The factory is called with the keyword arguments `pool_connections`
+    (number of hosts to keep connections to) and `pool_maxsize` (maximum
+    connections per host), and should return a session object following the
+    `requests.Session` API (`headers`, `get()`, `head()` and `close()`).
+
+    Parameters
+    ----------
+    name : str
+        Name of the transport.
+
+    Returns
+    -------
+    decorator : function
+        Decorator which registers (and returns) the factory.
+    """
+
+    def decorator(factory):
+        TRANSPORTS[name] = factory
+        return factory
+
+    return decorator
+
+
+def get_transport(transport=None):
+    """
+    Get the session factory of a transport
+
+    Parameters
+    ----------
+    transport : str or function, optional
+        Name of a registered transport, or a session factory.
+        If None, `DEFAULT_TRANSPORT` is used.
+        The default is None.
+
+    Returns
+    -------
+    factory : function
+        Session factory of the transport.
+
+    Raises
+    ------
+    ValueError
+        If the transport is not registered.
+    """
+    if transport is None:
+        transport = DEFAULT_TRANSPORT
+    if callable(transport):
+        return transport
+    if transport not in TRANSPORTS:
+        raise ValueError(
+            f"Unknown transport '{transport}' "
+            f"(available: {', '.join(sorted(TRANSPORTS))})."
+        )
+    return TRANSPORTS[transport]
+
+
+###############################################################################
+
+
+@register_transport("requests")
+def requests_session(
+    pool_connections=requests.adapters.DEFAULT_POOLSIZE,
+    pool_maxsize=requests.adapters.DEFAULT_POOLSIZE,
+):
+    """A `requests.Session` with pooled connections"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@register_transport("http2")
+def http2_session(
+    pool_connections=requests.adapters.DEFAULT_POOLSIZE,
+    pool_maxsize=requests.adapters.DEFAULT_POOLSIZE,
+):
+    """An `HTTPXSession` with HTTP/2 (negotiated over TLS)"""
+    # the same overall limit as the requests pools, though with HTTP/2, a
+    # single connection per host carries all the streams
+    return HTTPXSession(
+        http2=True, max_connections=pool_connections * pool_maxsize
+    )
+
+
+###############################################################################
+
+
+def translate_error(error):
+    """Equivalent `requests.exceptions` of an `httpx` exception"""
+    import httpx
+
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(error)
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(error)
+    if isinstance(error, httpx.RemoteProtocolError):
+        return requests.exceptions.ChunkedEncodingError(error)
+    if isinstance(error, httpx.DecodingError):
+        return requests.exceptions.ContentDecodingError(error)
+    if isinstance(error, httpx.TransportError):
+        return requests.exceptions.ConnectionError(error)
+    if isinstance(error, httpx.TooManyRedirects):
+        return requests.exceptions.TooManyRedirects(error)
+    if isinstance(error, (httpx.InvalidURL, httpx.UnsupportedProtocol)):
+        return requests.exceptions.InvalidURL(error)
+    return requests.exceptions.RequestException(error)
+
+
+class HTTPXRaw:
+    """Reader of the decoded content of a streaming `httpx.Response`"""
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = None
+        self.buffer = bytearray()
+        self.error = None
+
+    def read(self, size=-1, decode_content=True):
+        import httpx
+
+        if self.chunks is None:
+            self.chunks = self.response.iter_bytes()
+        try:
+            while size < 0 or len(self.buffer) < size:
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    break
+                self.buffer += chunk
+        except httpx.HTTPError as e:
+            if self.buffer:
+                # return what was read, and fail on the next read
+                self.chunks = iter(())
+                self.error = e
+            else:
+                raise translate_error(e)
+        if not self.buffer and self.error is not None:
+            error, self.error = self.error, None
+            raise translate_error(error)
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class HTTPXResponse:
+    """A streaming `httpx.Response`, with the `requests.Response` API"""
+
+    def __init__(self, response, elapsed):
+        self.response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+        self.http_version = response.http_version
+        self.raw = HTTPXRaw(response)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        return self.response.read()
+
+    @property
+    def text(self):
+        self.response.read()
+        return self.response.text
+
+    @property
+    def cookies(self):
+        return self.response.cookies
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        while True:
+            data = self.raw.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} {self.reason} for url: {self.url}",
+                response=self,
+            )
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HTTPXSession:
+    """
+    Session of the `http2` transport, with the `requests.Session` API
+
+    Requests to the same host share a single HTTP/2 connection (if the server
+    supports it), as concurrent streams. The session can be shared by threads.
+
+    Parameters
+    ----------
+    http1 : bool, optional
+        Allow HTTP/1.1. If False, HTTP/2 is used even without TLS (h2c with
+        prior knowledge).
+        The default is True.
+    http2 : bool, optional
+        Allow HTTP/2.
+        The default is True.
+    max_connections : int, optional
+        Maximum number of open connections.
+        The default is 100.
+    **client_kwargs
+        Other keyword arguments are passed on to `httpx.Client`.
+    """
+
+    def __init__(
+        self, http1=True, http2=True, max_connections=100, **client_kwargs
+    ):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "The 'http2' transport requires httpx: "
+                "pip install 'requests_downloader[http2]'"
+            )
+
+        self.headers = requests.structures.CaseInsensitiveDict()
+        self.client = httpx.Client(
+            http1=http1,
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections),
+            **client_kwargs,
+        )
+
+    def request(
+        self,
+        method,
+        url,
+        headers=None,
+        timeout=None,
+        stream=False,
+        allow_redirects=True,
+    ):
+        import httpx
+
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+        started = time.monotonic()
+        try:
+            request = self.client.build_request(
+                method, url, headers=request_headers, timeout=timeout
+            )
+            response = self.client.send(
+                request, stream=True, follow_redirects=allow_redirects
+            )
+        except httpx.HTTPError as e:
+            raise translate_error(e)
+        LOGGER.debug(f"{method} {url}: {response.http_version}")
+        r = HTTPXResponse(response, time.monotonic() - started)
+        if not stream:
+            try:
+                response.read()
+            except httpx.HTTPError as e:
+                raise translate_error(e)
+            finally:
+                response.close()
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
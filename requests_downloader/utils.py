@@ -2,10 +2,144 @@
 # -*- coding: utf-8 -*-
 """Utility Functions"""
 
+import os
+import re
+import json
+import mmap
+import time
 import hashlib
+import threading
+from collections import OrderedDict
 
 ###############################################################################
 
+DEFAULT_HASH_ALGORITHM = "md5"
+MMAP_VIEW_SIZE = 64 * 1024 * 1024
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+###############################################################################
+
+
+def parse_checksum(checksum):
+    """Parse a checksum specification into algorithm and hexdigest
+
+    Parameters
+    ----------
+    checksum : str
+        Either a plain hexdigest (md5) or `algorithm:hexdigest`,
+        e.g. `sha256:9f86d08...`.
+
+    Returns
+    -------
+    algorithm : str
+        Name of the hash algorithm.
+    hexdigest : str
+        Expected hexadecimal digest, in lowercase.
+
+    Raises
+    ------
+    ValueError
+        If the algorithm is not supported by `hashlib`.
+    """
+    algorithm, _, hexdigest = checksum.strip().rpartition(":")
+    algorithm = algorithm.lower().replace("-", "") or DEFAULT_HASH_ALGORITHM
+    if algorithm not in hashlib.algorithms_available:
+        raise ValueError(f"Unsupported hash algorithm '{algorithm}'.")
+    return algorithm, hexdigest.lower()
+
+
+def parse_size(size):
+    """Parse a size such as `500K` or `20M` (binary units) into bytes
+
+    Parameters
+    ----------
+    size : int or float or str
+        Number of bytes, optionally followed by a unit (K, M, G or T).
+        A trailing `B`, `iB` or `/s` is ignored.
+
+    Returns
+    -------
+    nbytes : int
+        Number of bytes.
+
+    Raises
+    ------
+    ValueError
+        If the size could not be parsed.
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(
+        r"\s*(\d+(?:\.\d*)?)\s*([kmgt]?)(?:i?b)?(?:/s)?\s*", size.lower()
+    )
+    if match is None:
+        raise ValueError(f"Invalid size '{size}'.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def file_hash(
+    file, algorithm=DEFAULT_HASH_ALGORITHM, block_size=1048576, size=None
+):
+    """Compute the hash of (the beginning of) a file.
+
+    The file is memory-mapped and hashed in large views, without copying
+    it through Python-level buffers. Files which can not be memory-mapped
+    are hashed with `hashlib.file_digest` (Python 3.11+) or read in blocks.
+
+    Parameters
+    ----------
+    file : str
+        Filename.
+    algorithm : str
+        Name of the hash algorithm.
+    block_size : int
+        Block size to use when reading, if the file is not memory-mapped.
+    size : int
+        Number of bytes to hash from the beginning of the file.
+        If None, the whole file is hashed.
+
+    Returns
+    -------
+    hash : object
+        A `hashlib` hash object, which can be updated further.
+    """
+    h = hashlib.new(algorithm)
+    if size == 0:
+        return h
+
+    with open(file, "rb") as f:
+        length = os.fstat(f.fileno()).st_size
+        if size is not None:
+            length = min(length, size)
+        if length == 0:
+            return h
+        try:
+            with mmap.mmap(
+                f.fileno(), length, access=mmap.ACCESS_READ
+            ) as m, memoryview(m) as view:
+                for offset in range(0, length, MMAP_VIEW_SIZE):
+                    h.update(view[offset:][:MMAP_VIEW_SIZE])
+            return h
+        except (ValueError, OverflowError, OSError):
+            # e.g. special files, or files too large for the address space
+            pass
+
+        if size is None and hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, lambda: h)
+
+        remaining = size
+        buffer = bytearray(block_size)
+        with memoryview(buffer) as view:
+            while remaining is None or remaining > 0:
+                n = f.readinto(view)
+                if not n:
+                    break
+                if remaining is not None:
+                    n = min(n, remaining)
+                    remaining -= n
+                h.update(view[:n])
+    return h
+
 
 def md5sum(file, block_size=4096):
     """Calculate the md5sum for a file.
@@ -15,21 +149,101 @@ def md5sum(file, block_size=4096):
     file : str
         Filename.
     block_size : int
-        Block size to use when reading.
+        Block size to use when reading, if the file is not memory-mapped.
 
     Returns
     -------
     checksum : str
         The hexadecimal md5 checksum of the file.
     """
-    md5 = hashlib.md5()
-    with open(file, "rb") as f:
-        while True:
-            data = f.read(block_size)
-            if not data:
-                break
-            md5.update(data)
-    return md5.hexdigest()
+    return file_hash(file, "md5", block_size=block_size).hexdigest()
+
+
+###############################################################################
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries. The least recently used entries are
+        evicted first.
+    ttl : float
+        Time-to-live of an entry, in seconds.
+    path : str
+        If provided, the cache is loaded from and saved to this JSON file.
+        Values must be JSON-serializable.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        if path is not None:
+            self.load()
+
+    def get(self, key, default=None):
+        """Get the value for `key`, if present and not expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expiry, value = entry
+            if expiry < time.time():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Set the value for `key`, evicting old entries if required"""
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        if self.path is not None:
+            self.save()
+
+    def delete(self, key):
+        """Remove the entry for `key`, if present"""
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.path is not None:
+            self.save()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        """Load the (unexpired) entries from `path`"""
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        now = time.time()
+        with self.lock:
+            for key, (expiry, value) in entries:
+                if expiry >= now:
+                    self.entries[key] = (expiry, value)
+
+    def save(self):
+        """Atomically save the entries to `path`"""
+        with self.lock:
+            entries = list(self.entries.items())
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
 
 
 ###############################################################################
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verify downloaded files against a manifest of checksums
+
+A manifest has a `path digest` line per file, where the digest is an md5
+hexdigest or `algorithm:hexdigest`. The `digest  path` lines written by
+`md5sum` and `sha256sum` are accepted as well. Relative paths are resolved
+against the directory of the manifest.
+
+The files are hashed in parallel on a process pool, each of them through a
+memory map (see `file_hash()`), so that the verification is bound by the
+disk rather than by the interpreter.
+"""
+
+###############################################################################
+
+import os
+import re
+import sys
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import file_hash, parse_checksum
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+DIGEST_PATTERN = re.compile(r"(?:[\w-]+:)?[0-9a-fA-F]{8,}")
+
+###############################################################################
+
+
+def parse_manifest(manifest):
+    """
+    Parse a manifest of checksums
+
+    Parameters
+    ----------
+    manifest : str
+        Path of the manifest.
+
+    Returns
+    -------
+    entries : list
+        List of (path, checksum) pairs.
+    """
+    directory = os.path.dirname(os.path.abspath(manifest))
+    entries = []
+    with open(manifest) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if len(line.split()) < 2:
+                LOGGER.warning(f"Ignoring invalid manifest line '{line}'.")
+                continue
+            path, checksum = line.rsplit(None, 1)
+            if not DIGEST_PATTERN.fullmatch(checksum):
+                # `digest  path` (as written by md5sum)
+                checksum, path = line.split(None, 1)
+                path = path.lstrip("*")
+            entries.append((os.path.join(directory, path), checksum))
+    return entries
+
+
+def verify_file(path, checksum):
+    """
+    Verify a file against a checksum
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    checksum : str
+        Expected checksum, as md5 hexdigest or `algorithm:hexdigest`.
+
+    Returns
+    -------
+    path : str
+        Path of the file.
+    ok : bool
+        True, if the file matches the checksum.
+    detail : str
+        The computed hexdigest, or the error which occurred.
+    """
+    try:
+        algorithm, expected_digest = parse_checksum(checksum)
+        digest = file_hash(path, algorithm).hexdigest()
+    except (OSError, ValueError) as e:
+        return path, False, str(e)
+    return path, digest == expected_digest, digest
+
+
+def _verify_entry(entry):
+    return verify_file(*entry)
+
+
+def verify_files(entries, workers=None):
+    """
+    Verify several files in parallel
+
+    Parameters
+    ----------
+    entries : list
+        List of (path, checksum) pairs.
+    workers : int, optional
+        Number of worker processes.
+        If 1, the files are verified in the current process.
+        If None, the number of CPUs is used.
+        The default is None.
+
+    Yields
+    ------
+    result : tuple
+        Return values of `verify_file()`, in the same order as `entries`.
+    """
+    entries = list(entries)
+    if workers == 1 or len(entries) < 2:
+        for entry in entries:
+            yield verify_file(*entry)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_verify_entry, entries):
+            yield result
+
+
+###############################################################################
+
+
+def main(argv=None):
+    """CLI to verify files against a manifest (`smart-dl verify`)"""
+    parser = argparse.ArgumentParser(prog="smart-dl verify")
+    parser.add_argument(
+        "manifest", help="Manifest with a 'path digest' line per file"
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of files to verify in parallel (default: CPU count)",
+        default=None,
+    )
+    parser.add_argument(
+        "--quiet", help="Only report the failures", action="store_true"
+    )
+    args = vars(parser.parse_args(argv))
+
+    workers = int(args["workers"]) if args["workers"] else None
+    entries = parse_manifest(args["manifest"])
+    failures = 0
+    for path, ok, detail in verify_files(entries, workers=workers):
+        if not ok:
+            failures += 1
+            print(f"{path}: FAILED ({detail})")
+        elif not args["quiet"]:
+            print(f"{path}: OK")
+
+    if failures:
+        print(f"{failures} of {len(entries)} files did not match.")
+        return 1
+    return 0
+
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Writers for the downloaded content
+
+A writer writes blocks at given offsets of a file, so that the ranges of a
+segmented download can be written out of order through a single writer
+shared by the threads. Files of a known size are preallocated, so that they
+are not fragmented on disk, and a full disk is detected before the transfer.
+"""
+
+###############################################################################
+
+import os
+import errno
+import shutil
+import logging
+import threading
+
+from .streaming import WRITE_BUFFER_SIZE
+
+###############################################################################
+
+LOGGER = logging.getLogger(__name__)
+
+###############################################################################
+
+
+def free_space(path):
+    """Free space, in bytes, on the filesystem where `path` would be"""
+    directory = os.path.dirname(os.path.abspath(path))
+    return shutil.disk_usage(directory).free
+
+
+def preallocate_file(path, size, sparse=False):
+    """
+    Create (or resize) a file of `size` bytes
+
+    Parameters
+    ----------
+    path : str
+        Path of the file. Its existing content is preserved.
+    size : int
+        Size of the file, in bytes.
+    sparse : bool, optional
+        Only set the size of the file, without allocating the disk blocks.
+        The blocks are always allocated lazily if `posix_fallocate` is not
+        supported (by the platform or the filesystem).
+        The default is False.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if os.fstat(fd).st_size > size:
+            os.ftruncate(fd, size)
+        if not sparse and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+                LOGGER.debug(f"posix_fallocate not supported: {e}")
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+###############################################################################
+
+
+class Writer:
+    """
+    Write blocks at given offsets of an existing file
+
+    Writers are thread-safe and are used as context managers. Every writer
+    has `flush()` and `fileno()`, so that it can be checkpointed by a
+    `Journal`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file, which must exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write_at(self, offset, data):
+        """Write `data` at `offset`, returning the number of bytes written"""
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def fileno(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SeekWriter(Writer):
+    """
+    Buffered writer which seeks before writing out of order
+
+    Sequential writes are coalesced in a buffer of `buffer_size` bytes.
+    """
+
+    def __init__(self, path, buffer_size=WRITE_BUFFER_SIZE):
+        super().__init__(path)
+        self.file = open(path, "r+b", buffering=buffer_size)
+        self.lock = threading.Lock()
+
+    def write_at(self, offset, data):
+        with self.lock:
+            if self.file.tell() != offset:
+                self.file.seek(offset)
+            return self.file.write(data)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class PositionalWriter(Writer):
+    """
+    Unbuffered writer using `os.pwrite`
+
+    Writes do not share a file position, so threads can write their ranges
+    through the same file descriptor without locking.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.fd = os.open(path, os.O_RDWR)
+
+    def write_at(self, offset, data):
+        view = memoryview(data)
+        wrote = 0
+        while wrote < len(view):
+            wrote += os.pwrite(self.fd, view[wrote:], offset + wrote)
+        return wrote
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        os.close(self.fd)
+
+
+DEFAULT_WRITER = PositionalWriter if hasattr(os, "pwrite") else SeekWriter
+
+###############################################################################
@@ -10,12 +10,18 @@ with open('README.rst') as readme_file:
 with open('HISTORY.rst') as history_file:
     history = history_file.read()
 
-requirements = ["requests", "tqdm", "beautifulsoup4"]
+requirements = ["requests", "tqdm"]
 
 setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest>=3', ]
 
+extra_requirements = {
+    'async': ['aiohttp'],
+    'http2': ['httpx[http2]'],
+    'lxml': ['lxml'],
+}
+
 setup(
     author="Hrishikesh Terdalkar",
     author_email='hrishikeshrt@linuxmail.org',
@@ -39,6 +45,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="GNU General Public License v3",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
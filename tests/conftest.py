@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Fixtures for `requests_downloader` tests."""
+
+import re
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+###############################################################################
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serve in-memory files, with support for byte ranges"""
+
+    files = {}
+    content_types = {}
+    accept_ranges = True
+    fail_after = None
+    errors = []
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_content(self, body):
+        content = self.files.get(self.path.split("?")[0])
+        if content is None:
+            self.send_error(404)
+            return
+
+        status = 200
+        start, end = 0, len(content) - 1
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        range_match = re.match(
+            r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")
+        )
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range != etag:
+            range_match = None
+        if self.accept_ranges and range_match:
+            start = int(range_match.group(1))
+            if range_match.group(2):
+                end = min(int(range_match.group(2)), end)
+            status = 206
+
+        if start >= len(content):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(content)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        path = self.path.split("?")[0]
+        content_type = self.content_types.get(path, "application/octet-stream")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{end}/{len(content)}"
+            )
+        self.end_headers()
+        if body:
+            content = content[start:][: end - start + 1]
+            if self.fail_after is not None:
+                content = content[: self.fail_after]
+                self.close_connection = True
+            self.wfile.write(content)
+
+    def do_HEAD(self):
+        self.requests.append(("HEAD", self.path, dict(self.headers)))
+        self.send_content(body=False)
+
+    def do_GET(self):
+        self.requests.append(("GET", self.path, dict(self.headers)))
+        if self.errors:
+            self.send_response(self.errors.pop(0))
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_content(body=True)
+
+
+@pytest.fixture
+def http_server():
+    """Local HTTP server serving the files in `server.files`"""
+    handler = type(
+        "TestFileHandler",
+        (FileHandler,),
+        {"files": {}, "content_types": {}, "errors": [], "requests": []},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.handler = handler
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
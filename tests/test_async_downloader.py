@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.async_downloader`."""
+
+import os
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from requests_downloader.async_downloader import (  # noqa: E402
+    async_download,
+    async_download_many,
+)
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+def test_async_download(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    path = asyncio.run(
+        async_download(f"{http_server.url}/data.bin", download_dir=tmp_path)
+    )
+    assert open(path, "rb").read() == CONTENT
+
+
+def test_async_download_resume(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    (tmp_path / "data.bin").write_bytes(CONTENT[:40_000])
+    path = asyncio.run(
+        async_download(f"{http_server.url}/data.bin", download_dir=tmp_path)
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert http_server.handler.requests[-1][2]["Range"] == "bytes=40000-"
+
+
+def test_async_download_many(http_server, tmp_path):
+    files = {f"/file-{idx}.bin": os.urandom(1000 + idx) for idx in range(20)}
+    http_server.handler.files.update(files)
+    urls = [f"{http_server.url}{name}" for name in files]
+    results = asyncio.run(
+        async_download_many(
+            urls, concurrency=5, per_host_limit=2, download_dir=tmp_path
+        )
+    )
+    for content, path in zip(files.values(), results):
+        assert open(path, "rb").read() == content
+
+
+def test_async_download_longer_file(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    (tmp_path / "data.bin").write_bytes(CONTENT + b"garbage")
+    path = asyncio.run(
+        async_download(f"{http_server.url}/data.bin", download_dir=tmp_path)
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert http_server.handler.requests[-1][2]["Range"] == "bytes=0-"
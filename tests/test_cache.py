@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.cache`."""
+
+import os
+
+from requests_downloader.cache import MetadataCache
+from requests_downloader.downloader import download
+
+###############################################################################
+
+
+def test_metadata_cache(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.db"))
+    assert cache.get("http://example.com/a") is None
+    cache.set("http://example.com/a", "a", 10, etag='"x"')
+    entry = cache.get("http://example.com/a")
+    assert entry["etag"] == '"x"'
+    assert entry["size"] == 10
+    assert entry["path"] == os.path.abspath("a")
+    cache.remove("http://example.com/a")
+    assert cache.get("http://example.com/a") is None
+
+
+def test_download_not_modified(http_server, tmp_path):
+    content = os.urandom(10_000)
+    http_server.handler.files["/data.bin"] = content
+    url = f"{http_server.url}/data.bin"
+    cache = str(tmp_path / "cache.db")
+    kwargs = {"download_dir": tmp_path, "show_progress": False, "cache": cache}
+
+    path = download(url, **kwargs)
+    assert download(url, **kwargs) == path
+    assert http_server.handler.requests[-1][2]["If-None-Match"]
+
+    # same size, but modified
+    changed = os.urandom(10_000)
+    http_server.handler.files["/data.bin"] = changed
+    assert download(url, **kwargs) == path
+    assert open(path, "rb").read() == changed
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.cli`."""
+
+import sys
+import subprocess
+from collections import OrderedDict
+
+import requests_downloader
+from requests_downloader.cli import main
+from requests_downloader.handlers import (
+    HANDLERS,
+    RESOLUTION_CACHE,
+    DriveHandler,
+)
+
+###############################################################################
+
+
+def test_lazy_imports():
+    code = (
+        "import sys, requests_downloader.cli; "
+        "print(','.join(m for m in ('requests', 'tqdm', 'lxml', 'sqlite3') "
+        "if m in sys.modules))"
+    )
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stdout.strip()
+    assert loaded == ""
+
+    from requests_downloader import DownloadResult, download
+
+    assert download is requests_downloader.downloader.download
+    assert DownloadResult is requests_downloader.metrics.DownloadResult
+    assert "handle_url" in dir(requests_downloader)
+
+
+def test_cli_drive_confirm(http_server, tmp_path, monkeypatch, capsys):
+    content = b"large file" * 1000
+    http_server.handler.files["/uc"] = (
+        b'<html><form id="download-form" action="/download" method="get">'
+        b'<input type="hidden" name="id" value="abc">'
+        b'<input type="hidden" name="confirm" value="t"></form></html>'
+    )
+    http_server.handler.content_types["/uc"] = "text/html; charset=utf-8"
+    http_server.handler.files["/download"] = content
+    monkeypatch.setitem(HANDLERS, "127.0.0.1", [DriveHandler()])
+    monkeypatch.setattr(RESOLUTION_CACHE, "entries", OrderedDict())
+
+    path = str(tmp_path / "file.bin")
+    url = f"{http_server.url}/uc?id=abc&export=download"
+    monkeypatch.setattr(
+        sys, "argv", ["smart-dl", url, "--download_path", path, "--progress"]
+    )
+    assert main() == 0
+    assert open(path, "rb").read() == content
+    assert f"File saved to '{path}'." in capsys.readouterr().out
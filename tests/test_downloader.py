@@ -2,8 +2,159 @@
 # -*- coding: utf-8 -*-
 """Tests for `requests_downloader.downloader`."""
 
-from requests_downloader.downloader import download
+import os
+import hashlib
 
+from requests_downloader.downloader import (
+    download,
+    download_many,
+    split_ranges,
+)
 
-def test_download():
-    assert True
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+def test_download(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+    )
+    assert open(path, "rb").read() == CONTENT
+
+
+def test_download_single_request(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+    )
+    assert [r[0] for r in http_server.handler.requests] == ["GET"]
+
+
+def test_download_resume(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    (tmp_path / "data.bin").write_bytes(CONTENT[:40_000])
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_file="data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert len(http_server.handler.requests) == 1
+    assert http_server.handler.requests[0][2]["Range"] == "bytes=40000-"
+
+    # already downloaded
+    for download_file in [None, "data.bin"]:
+        assert download(
+            f"{http_server.url}/data.bin",
+            download_file=download_file,
+            download_dir=tmp_path,
+            show_progress=False,
+        )
+    assert len(http_server.handler.requests) == 3
+    assert http_server.handler.requests[-1][2]["Range"] == "bytes=100000-"
+
+
+def test_download_complete_without_ranges(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    http_server.handler.accept_ranges = False
+    (tmp_path / "data.bin").write_bytes(CONTENT)
+    result = download(
+        f"{http_server.url}/data.bin",
+        download_file="data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+    )
+    assert result.skipped and result.transferred == 0
+    assert open(result, "rb").read() == CONTENT
+
+
+def test_download_checksum(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    (tmp_path / "data.bin").write_bytes(CONTENT[:40_000])
+    checksum = f"sha256:{hashlib.sha256(CONTENT).hexdigest()}"
+    assert download(
+        f"{http_server.url}/data.bin",
+        download_file="data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        checksum=checksum,
+    )
+    os.unlink(tmp_path / "data.bin")
+    assert not download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        checksum=hashlib.md5(CONTENT[1:]).hexdigest(),
+    )
+
+
+def test_split_ranges():
+    assert split_ranges(10, 3) == [(0, 3), (4, 7), (8, 9)]
+    assert split_ranges(2, 4) == [(0, 0), (1, 1)]
+
+
+def test_download_segmented(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        connections=4,
+    )
+    assert open(path, "rb").read() == CONTENT
+    ranges = [
+        headers["Range"]
+        for method, _, headers in http_server.handler.requests
+        if method == "GET"
+    ]
+    assert len(ranges) == 4
+    assert "bytes=0-" in ranges
+    assert "bytes=75000-99999" in ranges
+
+
+def test_download_segmented_fallback(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    http_server.handler.accept_ranges = False
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        connections=4,
+    )
+    assert open(path, "rb").read() == CONTENT
+
+
+def test_download_many(http_server, tmp_path):
+    files = {f"/file-{idx}.bin": os.urandom(1000 + idx) for idx in range(10)}
+    http_server.handler.files.update(files)
+    urls = [f"{http_server.url}{name}" for name in files]
+    urls.append(f"{http_server.url}/missing.bin")
+    results = download_many(
+        urls, workers=4, download_dir=tmp_path, show_progress=False
+    )
+    assert len(results) == len(urls)
+    assert not results[-1]
+    for (name, content), path in zip(files.items(), results):
+        assert os.path.basename(path) == name.lstrip("/")
+        assert open(path, "rb").read() == content
+
+
+def test_download_many_duplicates(http_server, tmp_path):
+    http_server.handler.files["/file.bin"] = CONTENT
+    url = f"{http_server.url}/file.bin"
+    results = download_many(
+        [url, f"{url}#copy", url], download_dir=tmp_path, show_progress=False
+    )
+    assert results[0] == results[1] == results[2]
+    assert open(results[0], "rb").read() == CONTENT
+    gets = [r for r in http_server.handler.requests if r[0] == "GET"]
+    assert len(gets) == 1
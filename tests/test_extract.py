@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.extract`."""
+
+import io
+import os
+import gzip
+import tarfile
+import zipfile
+
+import pytest
+
+from requests_downloader.downloader import download
+from requests_downloader.extract import (
+    ExtractionError,
+    archive_format,
+    get_extractor,
+)
+
+###############################################################################
+
+CONTENT = os.urandom(50_000)
+
+###############################################################################
+
+
+def make_tarball(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def test_archive_format():
+    assert archive_format("data.tar.gz") == ("tar", ".tar.gz")
+    assert archive_format("data.TGZ") == ("tar", ".tgz")
+    assert archive_format("data.gz") == ("gz", ".gz")
+    assert archive_format("data.bin") == (None, None)
+    assert archive_format(".gz") == (None, None)
+
+
+def test_stream_decompressor(tmp_path):
+    compressed = gzip.compress(CONTENT[:20_000]) + gzip.compress(
+        CONTENT[20_000:]
+    )
+    extractor = get_extractor(str(tmp_path / "data.bin.gz"))
+    for idx in range(0, len(compressed), 1000):
+        extractor.write(compressed[idx:][:1000])
+    extractor.close()
+    assert (tmp_path / "data.bin").read_bytes() == CONTENT
+
+    extractor = get_extractor(str(tmp_path / "truncated.gz"))
+    extractor.write(compressed[:5000])
+    with pytest.raises(ExtractionError):
+        extractor.close()
+    assert not (tmp_path / "truncated").exists()
+
+
+def test_download_extract_tarball(http_server, tmp_path):
+    http_server.handler.files["/bundle.tar.gz"] = make_tarball(
+        {"a/data.bin": CONTENT, "b.txt": b"b", "../escape.txt": b"escape"}
+    )
+    result = download(
+        f"{http_server.url}/bundle.tar.gz",
+        download_path=str(tmp_path / "bundle.tar.gz"),
+        show_progress=False,
+        extract=True,
+    )
+    assert result.path == str(tmp_path / "bundle")
+    assert (tmp_path / "bundle" / "a" / "data.bin").read_bytes() == CONTENT
+    assert (tmp_path / "bundle" / "b.txt").read_bytes() == b"b"
+    assert not (tmp_path / "escape.txt").exists()
+    assert not (tmp_path / "bundle.tar.gz").exists()
+
+
+def test_download_extract_zip(http_server, tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("data.bin", CONTENT)
+    http_server.handler.files["/bundle.zip"] = buffer.getvalue()
+    result = download(
+        f"{http_server.url}/bundle.zip",
+        download_path=str(tmp_path / "bundle.zip"),
+        show_progress=False,
+        connections=2,
+        extract=str(tmp_path / "out"),
+        keep_archive=True,
+    )
+    assert result.path == str(tmp_path / "out")
+    assert (tmp_path / "out" / "data.bin").read_bytes() == CONTENT
+    assert (tmp_path / "bundle.zip").read_bytes() == buffer.getvalue()
+
+
+def test_download_extract_verified(http_server, tmp_path):
+    tarball = make_tarball({"data.bin": CONTENT})
+    http_server.handler.files["/bundle.tar.gz"] = tarball
+    url = f"{http_server.url}/bundle.tar.gz"
+    path = str(tmp_path / "bundle.tar.gz")
+
+    # nothing is extracted from an archive which fails the verification
+    result = download(
+        url,
+        download_path=path,
+        show_progress=False,
+        checksum="sha256:" + "0" * 64,
+        extract=True,
+    )
+    assert not result
+    assert not (tmp_path / "bundle").exists()
+    assert not (tmp_path / "bundle.part").exists()
+
+    # an archive already downloaded is extracted too
+    (tmp_path / "bundle.tar.gz").write_bytes(tarball)
+    result = download(
+        url, download_path=path, show_progress=False, extract=True
+    )
+    assert result.skipped and result.path == str(tmp_path / "bundle")
+    assert (tmp_path / "bundle" / "data.bin").read_bytes() == CONTENT
+    assert not (tmp_path / "bundle.tar.gz").exists()
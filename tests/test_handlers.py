@@ -1,7 +1,27 @@
 #!/usr/bin/env python
 """Tests for `requests_downloader.handlers`."""
 
-from requests_downloader.handlers import handle_url
+import time
+import threading
+import importlib.metadata
+from collections import OrderedDict
+
+import requests
+
+from requests_downloader import download, handlers
+from requests_downloader.handlers import (
+    HANDLERS,
+    RESOLUTION_CACHE,
+    DriveHandler,
+    Handler,
+    get_handlers,
+    register_handler,
+    DirectoryListingParser,
+    handle_url,
+    parse_directory_listing,
+    resolve_many,
+)
+from requests_downloader.utils import TTLCache
 
 
 def test_handle_url():
@@ -24,3 +44,188 @@ def test_handle_url():
     }
     for url, url_result in url_result.items():
         assert handle_url(url) == (url_result, 0)
+
+
+LISTING = """
+<html><body>
+<div class="container download-directory-listing">
+<table>
+<tr><td><a href="../">Go to parent directory</a></td></tr>
+<tr><td><a href="book.pdf">book.pdf</a></td></tr>
+<tr><td><a href="book.zip">book.zip</a></td>
+<td><a href="book.zip/">View Contents</a></td></tr>
+<tr><td><a href="audio.mp3">audio.mp3</a></td></tr>
+</table>
+</div>
+<div><a href="other.pdf">other.pdf</a></div>
+</body></html>
+"""
+
+
+class ListingSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = LISTING.encode()
+        response.encoding = "utf-8"
+        return response
+
+
+def test_directory_listing_parser():
+    parser = DirectoryListingParser()
+    parser.feed(LISTING)
+    assert parser.links == [
+        ["../", "Go to parent directory"],
+        ["book.pdf", "book.pdf"],
+        ["book.zip", "book.zip"],
+        ["book.zip/", "View Contents"],
+        ["audio.mp3", "audio.mp3"],
+    ]
+    assert parse_directory_listing(LISTING) == parser.links
+
+
+def test_handle_url_archive():
+    session = ListingSession()
+    cache = TTLCache()
+    for url in [
+        "https://archive.org/details/book",
+        "https://archive.org/download/book/book.pdf",
+    ]:
+        urls, idx = handle_url(url, session=session, cache=cache)
+        assert urls == [
+            ("all", "https://archive.org/compress/book"),
+            ("pdf", "https://archive.org/download/book/book.pdf"),
+            ("zip", "https://archive.org/download/book/book.zip"),
+            ("mp3", "https://archive.org/download/book/audio.mp3"),
+        ]
+        assert idx == 1
+    assert session.calls == 1
+
+
+def test_register_handler():
+    @register_handler
+    class ExampleHandler(Handler):
+        name = "example"
+        hosts = ("example.org",)
+        pattern = r"https://(?:www\.)?example\.org/f/(\w+)"
+
+        def resolve(self, url, match, session=None, timeout=60, cache=None):
+            dl_url = f"https://cdn.example.org/{match.group(1)}"
+            return [("example", dl_url)], 0
+
+    try:
+        assert handle_url("https://WWW.Example.org/f/abc#top") == (
+            [("example", "https://cdn.example.org/abc")],
+            0,
+        )
+        assert handle_url("https://example.org/other") == (
+            [("direct", "https://example.org/other")],
+            0,
+        )
+        assert handle_url("https://example.com/f/abc")[0][0][0] == "direct"
+    finally:
+        HANDLERS.pop("example.org")
+
+
+def test_drive_confirm(http_server, tmp_path, monkeypatch):
+    content = b"large file" * 1000
+    http_server.handler.files["/uc"] = (
+        b'<html><form id="download-form" action="/download" method="get">'
+        b'<input type="hidden" name="id" value="abc">'
+        b'<input type="hidden" name="export" value="download">'
+        b'<input type="hidden" name="confirm" value="t">'
+        b'<input type="submit" value="Download anyway"></form></html>'
+    )
+    http_server.handler.content_types["/uc"] = "text/html; charset=utf-8"
+    http_server.handler.files["/download"] = content
+    monkeypatch.setitem(HANDLERS, "127.0.0.1", [DriveHandler()])
+    monkeypatch.setattr(RESOLUTION_CACHE, "entries", OrderedDict())
+
+    path = str(tmp_path / "file.bin")
+    url = f"{http_server.url}/uc?id=abc&export=download"
+    assert download(url, download_path=path, show_progress=False) == path
+    assert open(path, "rb").read() == content
+    requests_made = http_server.handler.requests
+    gets = [p for method, p, _ in requests_made if method == "GET"]
+    confirmed_path = "/download?id=abc&export=download&confirm=t"
+    assert gets == ["/uc?id=abc&export=download", confirmed_path]
+
+    confirmed = f"{http_server.url}{confirmed_path}"
+    assert RESOLUTION_CACHE.get("drive-confirm:abc") == (url, confirmed)
+    drive_url = "https://drive.google.com/file/d/abc/view"
+    assert handle_url(drive_url) == ([("drive", confirmed)], 0)
+
+    # an expired confirmation is evicted, and the download confirmed afresh
+    expired = f"{http_server.url}/expired?id=abc&confirm=old"
+    RESOLUTION_CACHE.set("drive-confirm:abc", (url, expired))
+    path = str(tmp_path / "again.bin")
+    assert download(expired, download_path=path, show_progress=False)
+    assert open(path, "rb").read() == content
+    assert RESOLUTION_CACHE.get("drive-confirm:abc") == (url, confirmed)
+
+
+def test_load_entry_point_handlers(monkeypatch):
+    class PluginHandler(Handler):
+        name = "plugin"
+        hosts = ("plugin.example.org",)
+
+    class SlowEntryPoint:
+        name = "plugin"
+        value = "plugin:PluginHandler"
+
+        def load(self):
+            time.sleep(0.2)
+            return PluginHandler
+
+    monkeypatch.setattr(handlers, "HANDLERS", {})
+    monkeypatch.setattr(handlers, "_entry_points_loaded", False)
+    monkeypatch.setattr(
+        importlib.metadata,
+        "entry_points",
+        lambda: {handlers.ENTRY_POINT_GROUP: [SlowEntryPoint()]},
+    )
+
+    # concurrent callers all see the handler, once it is registered
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(get_handlers("plugin.example.org"))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [len(result) for result in results] == [1, 1, 1, 1]
+
+
+def test_resolve_many(monkeypatch):
+    class SlowHandler(Handler):
+        name = "slow"
+        hosts = ("slow.example.org",)
+
+        def resolve(self, url, match, session=None, timeout=60, cache=None):
+            time.sleep(0.2)
+            if url.endswith("/bad"):
+                raise requests.exceptions.ConnectionError("unreachable")
+            return [("slow", url.replace("slow.", "cdn."))], 0
+
+    monkeypatch.setitem(HANDLERS, "slow.example.org", [SlowHandler()])
+    urls = [f"https://slow.example.org/{idx}" for idx in range(4)]
+    urls += ["https://SLOW.example.org/0#top", "https://slow.example.org/bad"]
+
+    start = time.perf_counter()
+    results = dict(resolve_many(urls, workers=8, per_host_limit=None))
+    assert time.perf_counter() - start < 0.6
+    assert sorted(results) == sorted(urls[:4] + urls[-1:])
+    assert results[urls[1]] == ([("slow", "https://cdn.example.org/1")], 0)
+    assert isinstance(results[urls[-1]], requests.exceptions.ConnectionError)
+
+    start = time.perf_counter()
+    assert len(dict(resolve_many(urls[:4], per_host_limit=1))) == 4
+    assert time.perf_counter() - start >= 0.8
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.jobs`."""
+
+import os
+import hashlib
+
+from requests_downloader.jobs import (
+    DONE,
+    FAILED,
+    PENDING,
+    RUNNING,
+    JobQueue,
+    main,
+    run_queue,
+)
+
+###############################################################################
+
+
+def test_job_queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    queue.add("http://example.com/a")
+    assert (
+        queue.add_many(
+            [
+                {"url": "http://example.com/a"},
+                {"url": "http://example.com/b", "priority": 5},
+            ]
+        )
+        == 1
+    )
+    assert queue.status()[PENDING] == 2
+
+    job = queue.claim()
+    assert job["url"] == "http://example.com/b"
+    assert job["state"] == RUNNING
+    queue.fail(job["id"], "boom", max_attempts=2, backoff=60)
+    # backing off
+    assert queue.claim()["url"] == "http://example.com/a"
+    assert queue.claim() is None
+    assert 0 < queue.next_due() <= 60
+
+    # an interrupted run is resumed
+    queue.close()
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    assert queue.status()[RUNNING] == 1
+    assert queue.requeue() == 1
+    job = queue.claim()
+    assert job["url"] == "http://example.com/a"
+    queue.complete(job["id"], str(tmp_path / "a"))
+
+    queue.requeue(PENDING)
+    job = queue.claim()
+    assert job["url"] == "http://example.com/b" and job["attempts"] == 1
+    queue.fail(job["id"], "boom", max_attempts=2)
+    assert queue.status() == {PENDING: 0, RUNNING: 0, DONE: 1, FAILED: 1}
+    assert queue.failures()[0]["error"] == "boom"
+    assert queue.requeue(FAILED) == 1
+    assert queue.claim()["attempts"] == 0
+
+
+def test_run_queue(http_server, tmp_path, capsys):
+    contents = {f"/file{idx}.bin": os.urandom(5000) for idx in range(5)}
+    http_server.handler.files.update(contents)
+    manifest = tmp_path / "jobs.txt"
+    manifest.write_text(
+        "\n".join(
+            f"{http_server.url}{name} {hashlib.md5(content).hexdigest()}"
+            for name, content in contents.items()
+        )
+        + f"\n{http_server.url}/missing.bin\n"
+    )
+    database = str(tmp_path / "queue.db")
+    download_dir = str(tmp_path / "downloads")
+    assert (
+        main(
+            ["add", database, "--input-file", str(manifest)]
+            + ["--download_dir", download_dir]
+        )
+        == 0
+    )
+    assert "Added 6 of 6 jobs." in capsys.readouterr().out
+
+    status = run_queue(database, workers=3, max_attempts=1, retry=False)
+    assert status == {PENDING: 0, RUNNING: 0, DONE: 5, FAILED: 1}
+    for name, content in contents.items():
+        with open(os.path.join(download_dir, name[1:]), "rb") as f:
+            assert f.read() == content
+
+    assert main(["status", database, "--failures"]) == 0
+    assert "/missing.bin: " in capsys.readouterr().out
+
+
+def test_run_queue_legacy(http_server, tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    queue.add(f"{http_server.url}/missing.bin", str(tmp_path))
+    status = run_queue(
+        queue, max_attempts=1, retry=False, legacy=True, show_progress=False
+    )
+    assert status[FAILED] == 1
+    assert queue.failures()[0]["error"] == "Download failed"
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.journal`."""
+
+import os
+import hashlib
+
+from requests_downloader.downloader import download
+from requests_downloader.journal import Journal, journal_path, part_path
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+def test_journal_ranges(tmp_path):
+    download_path = str(tmp_path / "data.bin")
+    journal = Journal(
+        download_path, content_length=100, ranges=[[50, 60], [0, 10]]
+    )
+    assert journal.missing() == [(10, 49), (60, 99)]
+    with open(part_path(download_path), "wb") as f:
+        journal.checkpoint(f, 10, 50)
+    assert journal.offset == 60
+    assert journal.completed == 60
+    assert Journal.load(download_path).ranges == [[0, 60]]
+    journal.remove()
+    assert Journal.load(download_path) is None
+
+
+def test_download_interrupted(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    http_server.handler.fail_after = 30_000
+    url = f"{http_server.url}/data.bin"
+    download_path = str(tmp_path / "data.bin")
+    assert not download(
+        url,
+        download_path=download_path,
+        show_progress=False,
+        block_size=1024,
+        max_block_size=1024,
+        retry=False,
+    )
+    assert not os.path.exists(download_path)
+    offset = Journal.load(download_path).offset
+    assert 0 < offset <= 30_000
+
+    http_server.handler.fail_after = None
+    assert download(url, download_path=download_path, show_progress=False)
+    assert open(download_path, "rb").read() == CONTENT
+    assert not os.path.exists(part_path(download_path))
+    assert not os.path.exists(journal_path(download_path))
+    headers = http_server.handler.requests[-1][2]
+    assert headers["Range"] == f"bytes={offset}-"
+    assert headers["If-Range"] == f'"{hashlib.md5(CONTENT).hexdigest()}"'
+
+
+def test_download_partial_inferred(http_server, tmp_path):
+    # a partial file without a journal, at the inferred path
+    http_server.handler.files["/data.bin"] = CONTENT
+    (tmp_path / "data.bin").write_bytes(CONTENT[:40_000])
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_dir=str(tmp_path),
+        show_progress=False,
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert http_server.handler.requests[-1][2]["Range"] == "bytes=40000-"
+    assert not os.path.exists(journal_path(path))
+
+
+def test_download_changed(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    download_path = str(tmp_path / "data.bin")
+    with open(part_path(download_path), "wb") as f:
+        f.write(b"x" * 1000)
+    Journal(
+        download_path,
+        content_length=len(CONTENT),
+        etag='"stale"',
+        ranges=[[0, 1000]],
+    ).save()
+    assert download(
+        f"{http_server.url}/data.bin",
+        download_path=download_path,
+        show_progress=False,
+    )
+    assert open(download_path, "rb").read() == CONTENT
+
+
+def test_download_segmented_resume(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    download_path = str(tmp_path / "data.bin")
+    with open(part_path(download_path), "wb") as f:
+        f.write(CONTENT[:60_000])
+    Journal(
+        download_path,
+        content_length=len(CONTENT),
+        ranges=[[0, 10_000], [50_000, 60_000]],
+    ).save()
+    assert download(
+        f"{http_server.url}/data.bin",
+        download_path=download_path,
+        show_progress=False,
+        connections=4,
+    )
+    assert open(download_path, "rb").read() == CONTENT
+    requested = [
+        headers["Range"] for _, _, headers in http_server.handler.requests
+    ]
+    assert requested[0] == "bytes=10000-"
+    assert all(not r.startswith("bytes=0-") for r in requested)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.metrics`."""
+
+import os
+import json
+
+from requests_downloader.downloader import download
+from requests_downloader.metrics import (
+    Hooks,
+    JSONLinesExporter,
+    PrometheusExporter,
+    TransferMetrics,
+)
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+def test_hooks():
+    calls = []
+
+    class Exporter:
+        def on_complete(self, metrics):
+            calls.append("complete")
+
+    hooks = Hooks([{"on_start": lambda m: calls.append("start")}, Exporter()])
+    assert hooks
+    hooks.dispatch("on_start", None)
+    hooks.dispatch("on_complete", None)
+    hooks.dispatch("on_error", None, None)
+    assert calls == ["start", "complete"]
+    assert not Hooks()
+
+
+def test_download_hooks(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    (tmp_path / "data.bin").write_bytes(CONTENT[:40_000])
+    events = []
+    metrics = TransferMetrics(f"{http_server.url}/data.bin")
+    exporter = PrometheusExporter()
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_file="data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        hooks=[
+            {
+                "on_start": lambda m: events.append("start"),
+                "on_chunk": lambda m, n: events.append(n),
+                "on_complete": lambda m: events.append("complete"),
+            },
+            exporter,
+            JSONLinesExporter(str(tmp_path / "metrics.jsonl")),
+        ],
+        metrics=metrics,
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert events[0] == "start" and events[-1] == "complete"
+    assert sum(events[1:-1]) == metrics.downloaded
+    assert metrics.success and metrics.status == 206
+    assert metrics.ttfb is not None and metrics.size == len(CONTENT)
+    assert (metrics.resumed, metrics.downloaded) == (40_000, 60_000)
+
+    record = json.loads((tmp_path / "metrics.jsonl").read_text())
+    assert record["path"] == path and record["success"]
+    assert 'result="success"} 1' in exporter.render()
+
+
+def test_download_hooks_error(http_server, tmp_path):
+    errors = []
+    assert not download(
+        f"{http_server.url}/missing.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        hooks={"on_error": lambda m, e: errors.append(m.status)},
+    )
+    assert errors == [404]
+
+
+def test_download_result(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    url = f"{http_server.url}/data.bin"
+    result = download(url, download_dir=tmp_path, show_progress=False)
+    assert result and result == str(tmp_path / "data.bin")
+    assert open(result, "rb").read() == CONTENT
+    assert (result.transferred, result.resumed_from) == (len(CONTENT), 0)
+    assert result.status == 206 and result.url == url
+    assert result.throughput > 0 and not result.skipped
+
+    result = download(url, download_dir=tmp_path, show_progress=False)
+    assert result.skipped and result.transferred == 0
+
+    result = download(
+        f"{http_server.url}/missing.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+    )
+    assert not result and result.path is None
+    assert result.error == "HTTP Error: 404 Not Found"
+    assert (
+        download(url, download_dir=tmp_path, show_progress=False, legacy=True)
+        == str(tmp_path / "data.bin")
+    )
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.mirrors`."""
+
+import os
+
+from requests_downloader import mirrors
+from requests_downloader.downloader import download
+from requests_downloader.mirrors import MirrorScheduler
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+def test_mirror_scheduler():
+    scheduler = MirrorScheduler(
+        ["http://fast.example.com/f", "http://slow.example.com/f"],
+        [(0, 999), (2000, 2499)],
+        chunk_size=100,
+    )
+    assert len(scheduler.chunks) == 15
+    assert scheduler.chunks[-1] == (2400, 2499)
+
+    fast, slow = scheduler.mirrors
+    for _ in range(2):
+        assert scheduler.record(fast, scheduler.next_chunk(), 100, 0.01)
+        assert scheduler.record(slow, scheduler.next_chunk(), 100, 1.0)
+    assert fast.active and not slow.active
+    assert scheduler.fastest() is fast
+
+    # failed chunks are re-queued, and failing mirrors dropped
+    chunk = scheduler.next_chunk()
+    for start in (440, 480):
+        assert not scheduler.record(fast, chunk, 40, 0.01)
+        chunk = scheduler.next_chunk()
+        assert chunk == (start, 499)
+    assert not scheduler.record(fast, chunk, 0, 0.01, error=OSError())
+    assert not scheduler.active and scheduler.fastest() is None
+
+
+def test_download_mirrored(http_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(mirrors, "MIN_CHUNK_SIZE", 10_000)
+    http_server.handler.files.update(
+        {
+            "/origin/data.bin": CONTENT,
+            "/mirror/data.bin": CONTENT,
+            "/stale/data.bin": CONTENT[:-1],
+        }
+    )
+    path = download(
+        f"{http_server.url}/origin/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        connections=4,
+        mirrors=[
+            f"{http_server.url}/mirror/data.bin",
+            f"{http_server.url}/stale/data.bin",
+            f"{http_server.url}/missing/data.bin",
+        ],
+    )
+    assert open(path, "rb").read() == CONTENT
+
+    served = {}
+    for method, request_path, headers in http_server.handler.requests:
+        if headers.get("Range") != "bytes=0-0":
+            mirror = request_path.split("/")[1]
+            served[mirror] = served.get(mirror, 0) + 1
+    assert set(served) == {"origin", "mirror"}
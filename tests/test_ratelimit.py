@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.ratelimit`."""
+
+import os
+import time
+
+from requests_downloader.downloader import download
+from requests_downloader.ratelimit import (
+    RateLimiter,
+    TokenBucket,
+    host_semaphores,
+)
+
+###############################################################################
+
+
+def test_token_bucket():
+    bucket = TokenBucket(1000)
+    assert bucket.reserve(1000) == 0
+    # the bucket goes into debt, which the next reservations wait for
+    assert 0.45 < bucket.reserve(500) <= 0.5
+    assert 0.95 < bucket.reserve(500) <= 1.0
+
+
+def test_rate_limiter_hosts():
+    limiter = RateLimiter(host_rate={"example.org": "1K"}, host_request_rate=2)
+    assert limiter.max_block_size("other.org") is None
+    assert limiter.max_block_size("www.example.org") == 102
+    assert limiter.reserve("www.example.org", 1024) == 0
+    assert limiter.reserve("www.example.org", 512) > 0
+    assert limiter.reserve("other.org", 10**6) == 0
+    assert limiter.reserve_request("a.org") == 0
+    assert limiter.reserve_request("a.org") == 0
+    assert limiter.reserve_request("a.org") > 0
+
+
+def test_host_semaphores():
+    host_semaphore = host_semaphores(2)
+    semaphore = host_semaphore("http://Example.org/a")
+    assert host_semaphore("https://example.org:8080/b") is semaphore
+    assert host_semaphore("http://other.org/") is not semaphore
+    assert semaphore.acquire(blocking=False)
+    assert semaphore.acquire(blocking=False)
+    assert not semaphore.acquire(blocking=False)
+
+
+def test_download_rate_limit(http_server, tmp_path):
+    content = os.urandom(100_000)
+    http_server.handler.files["/data.bin"] = content
+    start = time.monotonic()
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        rate_limit="50K",
+    )
+    # the first second worth of bytes is the burst allowance
+    assert time.monotonic() - start > 0.8
+    assert open(path, "rb").read() == content
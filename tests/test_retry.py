@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.retry`."""
+
+import os
+
+import requests
+
+from requests_downloader.downloader import download
+from requests_downloader.retry import RetryPolicy, parse_retry_after
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+FAST = RetryPolicy(backoff=0.01)
+
+###############################################################################
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_policy():
+    policy = RetryPolicy(retries=2, backoff=1, jitter=False)
+    error = requests.exceptions.ConnectionError()
+    assert policy.retryable(1, error=error)
+    assert not policy.retryable(3, error=error)
+    assert not policy.retryable(1, error=ValueError())
+    assert [policy.delay(attempt) for attempt in [1, 2, 3]] == [1, 2, 4]
+
+    response = requests.Response()
+    response.status_code = 503
+    response.headers["Retry-After"] = "7"
+    assert policy.retryable(1, response=response)
+    assert policy.delay(1, response=response) == 7
+    response.status_code = 404
+    assert not policy.retryable(1, response=response)
+
+
+def test_download_retry_status(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    http_server.handler.errors = [503, 429]
+    path = download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+        retry=FAST,
+    )
+    assert open(path, "rb").read() == CONTENT
+    assert len(http_server.handler.requests) == 3
+
+
+def test_download_retry_interrupted(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    http_server.handler.fail_after = 30_000
+    for connections in [1, 2]:
+        http_server.handler.requests.clear()
+        path = download(
+            f"{http_server.url}/data.bin",
+            download_path=str(tmp_path / f"data{connections}.bin"),
+            show_progress=False,
+            connections=connections,
+            block_size=1024,
+            max_block_size=1024,
+            retry=FAST,
+        )
+        assert open(path, "rb").read() == CONTENT
+        # every attempt continues from where the previous one stopped
+        starts = [
+            int(r[2]["Range"][6:].split("-")[0])
+            for r in http_server.handler.requests
+        ]
+        assert len(starts) == len(set(starts))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.store`."""
+
+import os
+import hashlib
+
+from requests_downloader.downloader import download
+from requests_downloader.store import ContentStore, link_file
+
+###############################################################################
+
+CONTENT = os.urandom(50_000)
+DIGEST = f"sha256:{hashlib.sha256(CONTENT).hexdigest()}"
+
+###############################################################################
+
+
+def test_link_file(tmp_path):
+    source = tmp_path / "source"
+    source.write_bytes(CONTENT)
+    method = link_file(str(source), str(tmp_path / "target"))
+    assert method in ("reflink", "hardlink", "copy")
+    assert (tmp_path / "target").read_bytes() == CONTENT
+    assert link_file(str(source), str(tmp_path / "copy"), ["copy"]) == "copy"
+    assert os.stat(tmp_path / "copy").st_ino != os.stat(source).st_ino
+
+
+def test_store(tmp_path):
+    store = ContentStore(str(tmp_path / "store"), max_size=120_000)
+    for idx in range(3):
+        path = tmp_path / f"file-{idx}"
+        path.write_bytes(bytes([idx]) * 50_000)
+        url = f"http://example.org/{idx}"
+        digest = store.add(str(path), url=url, etag=f'"{idx}"')
+        assert digest.startswith("sha256:")
+        if idx == 0:
+            first = digest
+        if idx == 1:
+            assert store.get(first) is not None  # now the most recently used
+    assert store.size() == 100_000
+    assert store.get(first) is not None
+    assert store.find_url("http://example.org/1", 50_000, '"1"') is None
+    assert store.find_url("http://example.org/2", 50_000, '"2"') is not None
+    assert store.find_url("http://example.org/2", 50_000, '"x"') is None
+    assert store.find_url("http://example.org/2", 50_000) is None
+
+    target = tmp_path / "target" / "file"
+    assert store.materialize(first, str(target)) in ("reflink", "copy")
+    assert target.read_bytes() == bytes([0]) * 50_000
+    # the file can be edited without corrupting the store
+    assert os.stat(target).st_ino != os.stat(store.get(first)).st_ino
+    store.close()
+
+
+def test_download_store(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    url = f"{http_server.url}/data.bin"
+    store = ContentStore(str(tmp_path / "store"))
+
+    path = str(tmp_path / "a.bin")
+    result = download(
+        url, download_path=path, show_progress=False, store=store
+    )
+    assert result and result.digest == DIGEST
+    assert store.get(DIGEST) is not None
+
+    # unchanged URL: the response headers suffice
+    requests = len(http_server.handler.requests)
+    path = str(tmp_path / "b.bin")
+    result = download(
+        url, download_path=path, show_progress=False, store=store
+    )
+    assert result.skipped and result.digest == DIGEST
+    assert open(path, "rb").read() == CONTENT
+    assert len(http_server.handler.requests) == requests + 1
+
+    # known checksum: no request at all
+    path = str(tmp_path / "c.bin")
+    result = download(
+        f"{http_server.url}/other.bin",
+        download_path=path,
+        show_progress=False,
+        checksum=DIGEST,
+        store=store,
+    )
+    assert result.skipped
+    assert open(path, "rb").read() == CONTENT
+    assert len(http_server.handler.requests) == requests + 1
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.streaming`."""
+
+from requests_downloader.streaming import AdaptiveBlockSize, ThrottledProgress
+
+###############################################################################
+
+
+class Counter:
+    def __init__(self):
+        self.n = 0
+        self.calls = 0
+
+    def update(self, n):
+        self.n += n
+        self.calls += 1
+
+
+def test_adaptive_block_size():
+    sizer = AdaptiveBlockSize(1024, 8192, target=0.05)
+    for _ in range(10):
+        sizer.update(sizer.size, 0.001)
+    assert sizer.size == 8192
+    for _ in range(10):
+        sizer.update(sizer.size, 1)
+    assert sizer.size == 1024
+
+
+def test_throttled_progress():
+    counter = Counter()
+    with ThrottledProgress(counter, interval=60) as progress:
+        for _ in range(1000):
+            progress.update(10)
+    assert counter.n == 10000
+    assert counter.calls <= 2
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.transport`."""
+
+import os
+import re
+import socket
+import hashlib
+import threading
+
+import pytest
+import requests
+
+from requests_downloader.downloader import download, download_many
+from requests_downloader.transport import (
+    TRANSPORTS,
+    get_transport,
+    register_transport,
+    requests_session,
+)
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+class H2Server:
+    """Minimal HTTP/2 (h2c, prior knowledge) server of in-memory files"""
+
+    def __init__(self, files):
+        self.files = files
+        self.connections = 0
+        self.streams = 0
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen()
+        self.url = f"http://127.0.0.1:{self.socket.getsockname()[1]}"
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                break
+            self.connections += 1
+            threading.Thread(
+                target=self.handle, args=(connection,), daemon=True
+            ).start()
+
+    def handle(self, connection):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        config = h2.config.H2Configuration(
+            client_side=False, header_encoding="utf-8"
+        )
+        h2_connection = h2.connection.H2Connection(config=config)
+        h2_connection.initiate_connection()
+        connection.sendall(h2_connection.data_to_send())
+        with connection:
+            while True:
+                data = connection.recv(65535)
+                if not data:
+                    break
+                for event in h2_connection.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        self.respond(h2_connection, event)
+                connection.sendall(h2_connection.data_to_send())
+
+    def respond(self, h2_connection, event):
+        self.streams += 1
+        headers = dict(event.headers)
+        content = self.files[headers[":path"].split("?")[0]]
+        match = re.match(r"bytes=(\d+)-(\d*)", headers.get("range", ""))
+        start, end, status = 0, len(content) - 1, "200"
+        if match:
+            start, status = int(match.group(1)), "206"
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+        response_headers = [
+            (":status", status),
+            ("content-type", "application/octet-stream"),
+            ("content-length", str(end - start + 1)),
+            ("accept-ranges", "bytes"),
+        ]
+        if status == "206":
+            response_headers.append(
+                ("content-range", f"bytes {start}-{end}/{len(content)}")
+            )
+        h2_connection.send_headers(event.stream_id, response_headers)
+        body = content[start:][: end - start + 1]
+        size = h2_connection.max_outbound_frame_size
+        for offset in range(0, len(body), size):
+            h2_connection.send_data(event.stream_id, body[offset:][:size])
+        h2_connection.end_stream(event.stream_id)
+
+    def close(self):
+        self.socket.close()
+
+
+###############################################################################
+
+
+def test_get_transport():
+    assert get_transport() is requests_session
+    assert get_transport(requests_session) is requests_session
+    with pytest.raises(ValueError):
+        get_transport("carrier-pigeon")
+
+
+def test_register_transport(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    sessions = []
+
+    @register_transport("counting")
+    def counting_session(**pool_kwargs):
+        sessions.append(requests_session(**pool_kwargs))
+        return sessions[-1]
+
+    try:
+        path = str(tmp_path / "data.bin")
+        result = download(
+            f"{http_server.url}/data.bin",
+            download_path=path,
+            show_progress=False,
+            transport="counting",
+        )
+        assert result and open(path, "rb").read() == CONTENT
+        assert len(sessions) == 1
+    finally:
+        TRANSPORTS.pop("counting")
+
+
+def test_http2_transport(http_server, tmp_path):
+    pytest.importorskip("httpx")
+    http_server.handler.files["/data.bin"] = CONTENT
+    http_server.handler.errors.append(503)
+    checksum = f"sha256:{hashlib.sha256(CONTENT).hexdigest()}"
+
+    # HTTP/1.1 server: the same semantics (retries, ranges, checksums)
+    path = str(tmp_path / "data.bin")
+    result = download(
+        f"{http_server.url}/data.bin",
+        download_path=path,
+        show_progress=False,
+        connections=4,
+        checksum=checksum,
+        transport="http2",
+    )
+    assert result and open(path, "rb").read() == CONTENT
+    # the failed request, then the first range and the other three ranges
+    gets = [r for r in http_server.handler.requests if r[0] == "GET"]
+    assert len(gets) == 5
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        get_transport("http2")().get("http://127.0.0.1:1/", timeout=5)
+
+
+def test_http2_multiplexing(tmp_path):
+    pytest.importorskip("h2")
+    pytest.importorskip("httpx")
+    from requests_downloader.transport import HTTPXSession
+
+    files = {f"/file-{idx}.bin": os.urandom(1000 + idx) for idx in range(20)}
+    server = H2Server(files)
+    try:
+        with HTTPXSession(http1=False) as session:
+            results = download_many(
+                [f"{server.url}{name}" for name in files],
+                workers=8,
+                session=session,
+                download_dir=str(tmp_path),
+                show_progress=False,
+            )
+    finally:
+        server.close()
+    for (name, content), path in zip(files.items(), results):
+        assert open(path, "rb").read() == content
+    assert server.connections == 1
+    assert server.streams == len(files)
@@ -2,7 +2,19 @@
 # -*- coding: utf-8 -*-
 """Tests for `requests_downloader.utils`."""
 
-from requests_downloader.utils import md5sum
+import os
+import hashlib
+
+import pytest
+
+from requests_downloader import utils
+from requests_downloader.utils import (
+    TTLCache,
+    file_hash,
+    md5sum,
+    parse_checksum,
+    parse_size,
+)
 
 ###############################################################################
 
@@ -11,3 +23,53 @@ def test_md5sum(tmp_path):
     tmp_file = tmp_path / "test.txt"
     tmp_file.write_text("hello world\n")
     assert "6f5902ac237024bdd0c176cb93063dc4" == md5sum(tmp_file)
+
+
+def test_parse_checksum():
+    assert parse_checksum("ABC") == ("md5", "abc")
+    assert parse_checksum("sha256:abc") == ("sha256", "abc")
+    assert parse_checksum("SHA-1:abc") == ("sha1", "abc")
+    with pytest.raises(ValueError):
+        parse_checksum("nohash:abc")
+
+
+def test_file_hash(tmp_path):
+    tmp_file = tmp_path / "test.txt"
+    tmp_file.write_text("hello world\n")
+    h = file_hash(tmp_file, "sha256", size=6)
+    h.update(b"world\n")
+    assert h.hexdigest() == hashlib.sha256(b"hello world\n").hexdigest()
+
+
+def test_ttl_cache(tmp_path):
+    cache = TTLCache(maxsize=2, ttl=60, path=str(tmp_path / "cache.json"))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert TTLCache(path=str(tmp_path / "cache.json")).get("c") == 3
+
+    cache = TTLCache(ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_parse_size():
+    assert parse_size(1000) == 1000
+    assert parse_size("500") == 500
+    assert parse_size("20M") == 20 * 1024 * 1024
+    assert parse_size("1.5kB/s") == 1536
+    with pytest.raises(ValueError):
+        parse_size("fast")
+
+
+def test_file_hash_large(tmp_path, monkeypatch):
+    content = os.urandom(100_000)
+    (tmp_path / "data.bin").write_bytes(content)
+    monkeypatch.setattr(utils, "MMAP_VIEW_SIZE", 4096)
+    for size in [None, 5000, 200_000]:
+        assert (
+            file_hash(str(tmp_path / "data.bin"), "sha1", size=size).digest()
+            == hashlib.sha1(content[:size]).digest()
+        )
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.verify`."""
+
+import os
+import hashlib
+
+from requests_downloader.verify import main, parse_manifest, verify_files
+
+###############################################################################
+
+
+def test_verify_files(tmp_path, capsys):
+    contents = {f"file{idx}.bin": os.urandom(10_000 * idx) for idx in range(4)}
+    for name, content in contents.items():
+        (tmp_path / name).write_bytes(content)
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(
+        "\n".join(
+            [
+                f"file0.bin {hashlib.md5(b'').hexdigest()}",
+                f"file1.bin\tsha256:"
+                f"{hashlib.sha256(contents['file1.bin']).hexdigest()}",
+                # md5sum format
+                f"{hashlib.md5(contents['file2.bin']).hexdigest()} *file2.bin",
+                f"file3.bin {hashlib.md5(b'corrupt').hexdigest()}",
+                f"missing.bin {hashlib.md5(b'').hexdigest()}",
+            ]
+        )
+    )
+    entries = parse_manifest(str(manifest))
+    assert [os.path.basename(path) for path, _ in entries] == [
+        "file0.bin",
+        "file1.bin",
+        "file2.bin",
+        "file3.bin",
+        "missing.bin",
+    ]
+    results = list(verify_files(entries, workers=2))
+    assert [ok for _, ok, _ in results] == [True, True, True, False, False]
+    assert results[3][2] == hashlib.md5(contents["file3.bin"]).hexdigest()
+
+    assert main([str(manifest), "--quiet", "--workers", "1"]) == 1
+    output = capsys.readouterr().out
+    assert "file3.bin: FAILED" in output and "file1.bin" not in output
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for `requests_downloader.writers`."""
+
+import os
+
+import pytest
+
+from requests_downloader import downloader
+from requests_downloader.writers import (
+    PositionalWriter,
+    SeekWriter,
+    preallocate_file,
+)
+
+###############################################################################
+
+CONTENT = os.urandom(100_000)
+
+###############################################################################
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_preallocate_file(tmp_path, sparse):
+    path = str(tmp_path / "data.bin")
+    with open(path, "wb") as f:
+        f.write(b"abc")
+    preallocate_file(path, 1000, sparse=sparse)
+    assert os.path.getsize(path) == 1000
+    assert open(path, "rb").read(3) == b"abc"
+    preallocate_file(path, 2, sparse=sparse)
+    assert open(path, "rb").read() == b"ab"
+
+
+@pytest.mark.parametrize("writer", [SeekWriter, PositionalWriter])
+def test_writer(tmp_path, writer):
+    path = str(tmp_path / "data.bin")
+    preallocate_file(path, 6)
+    with writer(path) as f:
+        assert f.write_at(3, b"def") == 3
+        assert f.write_at(0, b"abc") == 3
+        f.flush()
+        os.fsync(f.fileno())
+    assert open(path, "rb").read() == b"abcdef"
+
+
+def test_download_writers(http_server, tmp_path):
+    http_server.handler.files["/data.bin"] = CONTENT
+    for idx, (writer, connections) in enumerate(
+        [(PositionalWriter, 1), (SeekWriter, 4)]
+    ):
+        result = downloader.download(
+            f"{http_server.url}/data.bin",
+            download_path=str(tmp_path / f"data{idx}.bin"),
+            show_progress=False,
+            connections=connections,
+            writer=writer,
+        )
+        assert open(result, "rb").read() == CONTENT
+
+
+def test_download_disk_full(http_server, tmp_path, monkeypatch):
+    http_server.handler.files["/data.bin"] = CONTENT
+    monkeypatch.setattr(downloader, "free_space", lambda path: 1000)
+    result = downloader.download(
+        f"{http_server.url}/data.bin",
+        download_dir=tmp_path,
+        show_progress=False,
+    )
+    assert not result and result.error == "Insufficient disk space"
+    assert not os.listdir(tmp_path)